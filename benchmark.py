@@ -0,0 +1,559 @@
+"""
+benchmark.py
+
+This script measures how much traffic the serial -> parse -> plot pipeline can sustain,
+without real hardware or a display. Synthetic traffic is written into a pseudo-terminal
+(a virtual serial device) or an in-memory loopback port, read by the real reader
+thread of a session, and consumed by a headless copy of the update_plot loop that parses, buffers,
+decimates and renders to an offscreen Agg canvas.
+
+Every generated line or frame carries a sequence number and its generation time, so
+the report can show the sustained rate, the lines lost to overruns and the latency
+from generation to rendering.
+
+The startup benchmark measures the cold start of the application in fresh interpreters
+and fails (exit status 1) when it exceeds its time budget or loads matplotlib before a
+plot is opened. tests/test_startup.py checks the same properties automatically.
+
+Usage:
+    python benchmark.py pipeline --transport pty --rate 50000 --columns 4 --seconds 10
+    python benchmark.py pipeline --format slip --rate 0
+    python benchmark.py stages --lines 100000 --columns 4
+    python benchmark.py startup --window --budget 0.5
+
+Functions:
+    - make_lines: Builds synthetic tab-separated lines.
+    - make_frames: Builds synthetic binary frames.
+    - generate_traffic: Writes synthetic traffic at a fixed rate.
+    - open_transport: Opens the virtual serial device the pipeline reads from.
+    - consume: Runs the headless update_plot loop.
+    - run_pipeline: Measures the end-to-end pipeline.
+    - run_stages: Measures the parse, append and render stages on their own.
+    - run_startup: Measures the application's cold start against a time budget.
+    - main: Parses the command line and runs a benchmark.
+
+Classes:
+    - LoopbackPort: An in-memory serial port with a bounded receive buffer.
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import serial_handler
+import ui_context as ctx
+from session import Session
+from data_parser import parse_batch, project_samples
+from decimation import DECIMATION_METHODS, decimate
+from framing import DELIMITERS, cobs_encode, slip_encode
+from handler_config import plot_config, settings
+from plot_handler import update_graph
+
+# Size of the kernel-side buffer emulated by the loopback port, like a UART FIFO plus driver buffer
+LOOPBACK_CAPACITY = 1 << 16
+# Lines or frames per write when the rate is unlimited
+UNLIMITED_BATCH = 1000
+# Width of the offscreen plot in pixels
+PLOT_WIDTH = 800
+# Cold-start budget in seconds, from interpreter launch to a built main window
+STARTUP_BUDGET = 0.5
+# Slowest imports listed in the startup report
+STARTUP_SLOWEST = 10
+# Run in a fresh interpreter to time the cold start; prints its measurements as JSON
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import main
+result = {"import_seconds": time.perf_counter() - start}
+if sys.argv[1] == "window":
+    import tkinter as tk
+    from ui_setup import setup_ui
+    from session import start_connect, disconnect_serial
+    root = tk.Tk()
+    setup_ui(root, start_connect, disconnect_serial)
+    root.update()
+    result["window_seconds"] = time.perf_counter() - start
+    root.destroy()
+result["matplotlib_loaded"] = "matplotlib" in sys.modules
+print(json.dumps(result))
+"""
+
+
+class LoopbackPort:
+    """
+    An in-memory serial port with a bounded receive buffer. Bytes written while the
+    buffer is full are dropped, like an overrun UART, and counted in dropped_bytes.
+
+    Args:
+        capacity (int): The size of the receive buffer in bytes.
+        timeout (float): How long read() waits for data.
+    """
+
+    def __init__(self, capacity=LOOPBACK_CAPACITY, timeout=1.0):
+        self.capacity = capacity
+        self.timeout = timeout
+        self.buffer = bytearray()
+        self.dropped_bytes = 0
+        self.is_open = True
+        self._ready = threading.Condition()
+
+    @property
+    def in_waiting(self):
+        return len(self.buffer)
+
+    def feed(self, data):
+        """
+        Makes data available to read, dropping whatever does not fit.
+
+        Args:
+            data (bytes): The data "received" by the port.
+        """
+        with self._ready:
+            room = self.capacity - len(self.buffer)
+            if len(data) > room:
+                self.dropped_bytes += len(data) - room
+                data = data[:room]
+            self.buffer += data
+            self._ready.notify()
+
+    def read(self, size=1):
+        with self._ready:
+            if not self.buffer:
+                self._ready.wait(self.timeout)
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            return data
+
+    def write(self, data):
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+
+
+def make_lines(first, count, columns):
+    """
+    Builds synthetic tab-separated lines: sequence number, generation time, then
+    columns random values.
+
+    Args:
+        first (int): The sequence number of the first line.
+        count (int): The number of lines.
+        columns (int): The number of value columns.
+
+    Returns:
+        bytes: The encoded lines.
+    """
+    now = time.perf_counter()
+    values = np.random.standard_normal((count, columns))
+    rows = ['\t'.join([str(first + i), f"{now:.6f}"] + [f"{v:.4f}" for v in row]) for i, row in enumerate(values)]
+    return ('\n'.join(rows) + '\n').encode()
+
+
+def make_frames(first, count, columns, framing):
+    """
+    Builds synthetic binary frames with the layout <Qd followed by columns floats:
+    sequence number, generation time, values.
+
+    Args:
+        first (int): The sequence number of the first frame.
+        count (int): The number of frames.
+        columns (int): The number of value columns.
+        framing (str): "cobs" or "slip".
+
+    Returns:
+        bytes: The encoded, delimited frames.
+    """
+    now = time.perf_counter()
+    layout = struct.Struct('<Qd' + 'f' * columns)
+    values = np.random.standard_normal((count, columns)).tolist()
+    encode = cobs_encode if framing == "cobs" else slip_encode
+    delimiter = DELIMITERS[framing]
+    return b''.join(encode(layout.pack(first + i, now, *row)) + delimiter for i, row in enumerate(values))
+
+
+def generate_traffic(write, args, stop_event, counters):
+    """
+    Writes synthetic traffic at the requested rate until the duration is over.
+
+    Args:
+        write (function): Delivers bytes to the virtual device.
+        args (argparse.Namespace): The benchmark options.
+        stop_event (threading.Event): Set to stop early.
+        counters (dict): Receives the generated line and byte counts.
+    """
+    per_write = UNLIMITED_BATCH if args.rate <= 0 else max(1, args.rate // 1000)
+    interval = 0 if args.rate <= 0 else per_write / args.rate
+    sequence = 0
+    start = time.perf_counter()
+    while not stop_event.is_set() and time.perf_counter() - start < args.seconds:
+        if args.format == "text":
+            data = make_lines(sequence, per_write, args.columns)
+        else:
+            data = make_frames(sequence, per_write, args.columns, args.format)
+        write(data)
+        sequence += per_write
+        counters["bytes"] += len(data)
+        if interval:
+            delay = start + sequence / args.rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    counters["lines"] = sequence
+
+
+def open_transport(kind, baudrate):
+    """
+    Opens the virtual serial device the pipeline reads from.
+
+    Args:
+        kind (str): "pty" for a pseudo-terminal, "loopback" for an in-memory port.
+        baudrate (int): The baud rate to configure on the port.
+
+    Returns:
+        tuple: The port for read_serial, a function writing to the device side, and a
+        function returning the number of bytes lost so far.
+    """
+    if kind == "loopback":
+        port = LoopbackPort()
+        return port, port.feed, lambda: port.dropped_bytes
+
+    import serial
+    master, slave = os.openpty()
+    port = serial.Serial(os.ttyname(slave), baudrate=baudrate, timeout=1)
+    os.set_blocking(master, False)
+    lost = [0]
+
+    def write(data):
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(master, view)
+            except BlockingIOError:
+                # The pty buffer is full: the reader did not keep up, like an overrun UART
+                lost[0] += len(view)
+                return
+            view = view[written:]
+
+    return port, write, lambda: lost[0]
+
+
+def consume(session, lines_axes, stop_event, results):
+    """
+    Runs the headless update_plot loop: drains the session's data_queue once per frame,
+    parses the batch, appends it to the session's plot data and renders the decimated
+    plot offscreen.
+
+    Args:
+        session (Session): The session being measured.
+        lines_axes (tuple): The plot lines, axis and figure.
+        stop_event (threading.Event): Set to stop after the queue is drained.
+        results (dict): Receives the consumed line count, latencies and stage timings.
+    """
+    lines, ax, fig = lines_axes
+    interval = 1.0 / settings["max_fps"]
+    while True:
+        frame_start = time.perf_counter()
+        text, samples = [], []
+        for timestamp, batch in session.data_queue.drain():
+            if isinstance(batch, list):
+                text.extend(batch)
+            else:
+                samples.append(batch)
+        if not text and not samples:
+            if stop_event.is_set():
+                break
+            time.sleep(interval)
+            continue
+
+        parse_start = time.perf_counter()
+        x, y = parse_batch(text, session.plot_config) if text else project_samples(np.hstack(samples), session.plot_config)
+        block = np.vstack((x, y))
+        session.append(x, y, timestamp)
+        draw_start = time.perf_counter()
+        update_graph([session], lines, ax, fig)
+        fig.canvas.draw()
+        shown = time.perf_counter()
+
+        results["lines"] += block.shape[1]
+        results["parse"].append(draw_start - parse_start)
+        results["draw"].append(shown - draw_start)
+        results["latency"].append(shown - block[1][~np.isnan(block[1])])
+        delay = interval - (time.perf_counter() - frame_start)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def make_figure():
+    """
+    Creates the offscreen figure standing in for the Tk plot window. Its lines are
+    created by the first update_graph call.
+
+    Returns:
+        tuple: The plot lines, axis and figure.
+    """
+    fig = Figure(figsize=(PLOT_WIDTH / 100, 4.8), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    return [], ax, fig
+
+
+def configure(args):
+    """
+    Points the plot configuration and decoder settings at the synthetic traffic:
+    x is the sequence number, the first y column the generation time.
+
+    Args:
+        args (argparse.Namespace): The benchmark options.
+    """
+    plot_config["x_column"] = 0
+    plot_config["y_columns"] = list(range(1, args.columns + 2))
+    settings["decode_mode"] = args.format
+    settings["frame_format"] = '<Qd' + 'f' * args.columns
+    settings["frame_crc"] = "none"
+    settings["max_fps"] = args.fps
+    settings["decimation"] = args.decimation
+    settings["queue_policy"] = args.queue_policy
+    settings["plot_capacity"] = args.capacity
+    settings["serial_engine"] = args.engine
+    ctx.decimation_key = None
+    ctx.line_layout = None
+
+
+def run_pipeline(args):
+    """
+    Measures the end-to-end pipeline: generator -> virtual device -> session reader ->
+    data_queue -> parse -> ring buffer -> decimation -> offscreen render.
+
+    Args:
+        args (argparse.Namespace): The benchmark options.
+
+    Returns:
+        dict: The measured results.
+    """
+    configure(args)
+    port, write, lost_bytes = open_transport(args.transport, args.baudrate)
+    session = Session(args.transport, args.baudrate)
+    figure = make_figure()
+
+    consumer_stop = threading.Event()
+    generated = {"lines": 0, "bytes": 0}
+    results = {"lines": 0, "parse": [], "draw": [], "latency": []}
+    consumer = threading.Thread(target=consume, args=(session, figure, consumer_stop, results), daemon=True)
+    session.start(port)
+    consumer.start()
+
+    start = time.perf_counter()
+    generate_traffic(write, args, session.stop_event, generated)
+    # Give the pipeline a moment to deliver what is still in flight
+    deadline = time.perf_counter() + 2.0
+    while results["lines"] < generated["lines"] and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    session.stop_event.set()
+    if session.thread is not None:
+        session.thread.join()
+    session.close()
+    consumer_stop.set()
+    consumer.join()
+
+    latency = np.concatenate(results["latency"]) if results["latency"] else np.zeros(1)
+    return {
+        "transport": args.transport,
+        "engine": "selector" if session.thread is None else "threads",
+        "format": args.format,
+        "columns": args.columns,
+        "target_rate": args.rate,
+        "generated_lines": generated["lines"],
+        "received_lines": results["lines"],
+        "dropped_lines": generated["lines"] - results["lines"],
+        "dropped_bytes": lost_bytes(),
+        "queue_dropped_lines": session.data_queue.dropped,
+        "frame_errors": session.frame_errors,
+        "lines_per_second": results["lines"] / elapsed,
+        "megabytes_per_second": generated["bytes"] / elapsed / 1e6,
+        "latency_ms": {f"p{p}": float(np.percentile(latency, p) * 1000) for p in (50, 90, 99, 100)},
+        "parse_ms_per_frame": float(np.mean(results["parse"]) * 1000) if results["parse"] else 0.0,
+        "draw_ms_per_frame": float(np.mean(results["draw"]) * 1000) if results["draw"] else 0.0,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_stages(args):
+    """
+    Measures the parse, append, decimate and render stages on their own, each on the
+    same batch of synthetic lines.
+
+    Args:
+        args (argparse.Namespace): The benchmark options.
+
+    Returns:
+        dict: Lines per second sustained by each stage.
+    """
+    configure(args)
+    data = make_lines(0, args.lines, args.columns)
+    decoder = serial_handler.LineDecoder()
+    session = Session("stages")
+    store = session.data_store
+    lines, ax, fig = make_figure()
+    results = {}
+
+    def measure(name, function, count=args.lines):
+        start = time.perf_counter()
+        value = function()
+        results[name] = count / (time.perf_counter() - start)
+        return value
+
+    text = measure("split_lines", lambda: decoder.feed(data))
+    x, y = measure("parse_batch", lambda: parse_batch(text, session.plot_config))
+    measure("ring_buffer_append", lambda: session.append(x, y, time.time()))
+    measure("decimate", lambda: decimate(store.column(0), store.column(2), PLOT_WIDTH, args.decimation), len(store))
+    measure("update_graph", lambda: (update_graph([session], lines, ax, fig), fig.canvas.draw()), len(store))
+    return {"lines": args.lines, "columns": args.columns, "lines_per_second": results,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def time_startup(window):
+    """
+    Starts the application in a fresh interpreter and measures its cold start.
+
+    Args:
+        window (bool): Whether to build the main window as well, which needs a display.
+
+    Returns:
+        dict: The total process time, the time to import main, the time to a built
+        window if requested, and whether matplotlib was loaded.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    finished = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, "window" if window else "import"],
+                              cwd=here, capture_output=True, text=True, check=True)
+    result = json.loads(finished.stdout.strip().splitlines()[-1])
+    result["process_seconds"] = time.perf_counter() - start
+    return result
+
+
+def slowest_imports(count):
+    """
+    Lists the modules that take longest to import when main is imported.
+
+    Args:
+        count (int): The number of modules to list.
+
+    Returns:
+        dict: Import time in milliseconds, excluding submodules, by module name.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    finished = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                              cwd=here, capture_output=True, text=True, check=True)
+    times = {}
+    for row in finished.stderr.splitlines():
+        fields = row.split("|")
+        if len(fields) == 3 and fields[0].strip().split()[-1].isdigit():
+            times[fields[2].strip()] = int(fields[0].split()[-1]) / 1000
+    return dict(sorted(times.items(), key=lambda item: item[1], reverse=True)[:count])
+
+
+def run_startup(args):
+    """
+    Measures the application's cold start over several runs and compares the median
+    with the budget: the time to a built window with --window, otherwise the time of
+    the whole process importing main. Loading matplotlib during startup always fails.
+
+    Args:
+        args (argparse.Namespace): The benchmark options.
+
+    Returns:
+        dict: The measured results, with "within_budget" telling whether they passed.
+    """
+    runs = [time_startup(args.window) for _ in range(args.runs)]
+    measured = "window_seconds" if args.window else "process_seconds"
+    median = {name: statistics.median(run[name] for run in runs)
+              for name in ("process_seconds", "import_seconds", "window_seconds") if name in runs[0]}
+    matplotlib_loaded = any(run["matplotlib_loaded"] for run in runs)
+    return {
+        "runs": args.runs,
+        "budget_seconds": args.budget,
+        **{f"median_{name}": value for name, value in median.items()},
+        "matplotlib_loaded": matplotlib_loaded,
+        "within_budget": median[measured] <= args.budget and not matplotlib_loaded,
+        "slowest_imports_ms": slowest_imports(STARTUP_SLOWEST),
+    }
+
+
+def main(argv=None):
+    """
+    Parses the command line, runs the requested benchmark and prints its report.
+
+    Args:
+        argv (list): The command line arguments, defaults to sys.argv[1:].
+
+    Returns:
+        int: The exit status; 1 if the startup benchmark exceeded its budget.
+    """
+    # Options every benchmark takes, given after its name
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--columns", type=int, default=4, help="value columns per line")
+    common.add_argument("--capacity", type=int, default=settings["plot_capacity"], help="ring buffer capacity")
+    common.add_argument("--decimation", default="minmax", choices=list(DECIMATION_METHODS))
+    common.add_argument("--fps", type=float, default=20, help="frames per second of the headless update_plot loop")
+    common.add_argument("--engine", default=settings["serial_engine"], choices=["selector", "threads"],
+                        help="read ports from one selector thread or one thread per port")
+    common.add_argument("--queue-policy", default=settings["queue_policy"], choices=["block", "drop_oldest", "drop_newest"])
+    common.add_argument("--json", action="store_true", help="print the report as JSON")
+
+    parser = argparse.ArgumentParser(description="Serial -> parse -> plot throughput benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    pipeline = commands.add_parser("pipeline", parents=[common], help="measure the end-to-end pipeline")
+    pipeline.add_argument("--transport", default="pty", choices=["pty", "loopback"])
+    pipeline.add_argument("--format", default="text", choices=["text", "cobs", "slip"])
+    pipeline.add_argument("--rate", type=int, default=20000, help="lines per second, 0 for unlimited")
+    pipeline.add_argument("--seconds", type=float, default=5.0)
+    pipeline.add_argument("--baudrate", type=int, default=921600)
+
+    stages = commands.add_parser("stages", parents=[common], help="measure each stage on its own")
+    stages.add_argument("--lines", type=int, default=100000)
+    stages.set_defaults(format="text")
+
+    startup = commands.add_parser("startup", parents=[common], help="measure the cold start against a time budget")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--budget", type=float, default=STARTUP_BUDGET, help="seconds allowed for the median cold start")
+    startup.add_argument("--window", action="store_true", help="also build the main window (needs a display)")
+
+    args = parser.parse_args(argv)
+    if args.command == "startup":
+        report = run_startup(args)
+    else:
+        report = run_pipeline(args) if args.command == "pipeline" else run_stages(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            if isinstance(value, dict):
+                print(f"{key}:")
+                for name, number in value.items():
+                    print(f"    {name:<22} {number:,.1f}")
+            elif isinstance(value, float):
+                print(f"{key:<26} {value:,.2f}")
+            else:
+                print(f"{key:<26} {value}")
+    if report.get("within_budget") is False:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
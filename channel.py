@@ -0,0 +1,151 @@
+"""
+channel.py
+
+This module provides the bounded channel that carries received batches from the serial
+thread to the UI. Its capacity is counted in lines (or binary samples), not batches, so
+memory stays bounded however the data is chunked. When the channel is full, the
+configured policy decides what gives way:
+    - "block": the reader waits until the UI catches up.
+    - "drop_oldest": the oldest queued batches are discarded to make room.
+    - "drop_newest": the incoming batch is discarded.
+Every discarded line is counted, so overload is visible instead of silent.
+
+Classes:
+    - BoundedChannel: A thread-safe, bounded queue of weighted items.
+"""
+
+import threading
+from collections import deque
+from pipeline_stats import count
+
+POLICIES = ("block", "drop_oldest", "drop_newest")
+# How often a blocked put re-checks its stop event
+BLOCK_POLL = 0.1
+
+
+class BoundedChannel:
+    """
+    A thread-safe queue of items, each with a weight (its number of lines), holding at
+    most capacity weight at a time. A single item heavier than the capacity is still
+    accepted into an empty channel, so progress is always possible.
+
+    Args:
+        capacity (int): The maximum total weight of the queued items.
+        policy (str): What to do when full: "block", "drop_oldest" or "drop_newest".
+        counter (str): The pipeline statistics counter that discarded weight is added to.
+    """
+
+    def __init__(self, capacity, policy="drop_oldest", counter="lines_dropped"):
+        self.counter = counter
+        self._items = deque()
+        self._ready = threading.Condition()
+        self.size = 0
+        self.dropped = 0
+        self.configure(capacity, policy)
+
+    def configure(self, capacity, policy):
+        """
+        Changes the capacity and the overflow policy.
+
+        Args:
+            capacity (int): The maximum total weight of the queued items.
+            policy (str): What to do when full: "block", "drop_oldest" or "drop_newest".
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy: {policy}")
+        with self._ready:
+            self.capacity = max(int(capacity), 1)
+            self.policy = policy
+            self._ready.notify_all()
+
+    def _drop(self, weight):
+        self.dropped += weight
+        count(self.counter, weight)
+
+    def put(self, item, weight=1, stop_event=None):
+        """
+        Adds an item, applying the overflow policy if the channel is full.
+
+        Args:
+            item (object): The item to add.
+            weight (int): The number of lines the item carries.
+            stop_event (threading.Event): With the "block" policy, stops waiting when set.
+
+        Returns:
+            bool: True if the item was queued, False if it was dropped.
+        """
+        with self._ready:
+            while self._items and self.size + weight > self.capacity:
+                if self.policy == "drop_newest":
+                    self._drop(weight)
+                    return False
+                if self.policy == "drop_oldest":
+                    _, oldest = self._items.popleft()
+                    self.size -= oldest
+                    self._drop(oldest)
+                    continue
+                if stop_event is not None and stop_event.is_set():
+                    self._drop(weight)
+                    return False
+                self._ready.wait(BLOCK_POLL)
+            self._items.append((item, weight))
+            self.size += weight
+            self._ready.notify_all()
+            return True
+
+    def get(self):
+        """
+        Removes and returns the oldest item.
+
+        Returns:
+            object: The oldest item.
+
+        Raises:
+            IndexError: If the channel is empty.
+        """
+        with self._ready:
+            item, weight = self._items.popleft()
+            self.size -= weight
+            self._ready.notify_all()
+            return item
+
+    def wait(self, timeout=None):
+        """
+        Waits until an item is queued.
+
+        Args:
+            timeout (float): The longest wait in seconds, or None to wait indefinitely.
+
+        Returns:
+            bool: True if an item is queued, False if the wait timed out.
+        """
+        with self._ready:
+            return bool(self._ready.wait_for(lambda: self._items, timeout))
+
+    def drain(self):
+        """
+        Removes and returns all queued items at once.
+
+        Returns:
+            list: The items, oldest first.
+        """
+        with self._ready:
+            items = [item for item, weight in self._items]
+            self._items.clear()
+            self.size = 0
+            self._ready.notify_all()
+            return items
+
+    def empty(self):
+        """
+        Returns:
+            bool: True if no items are queued.
+        """
+        return not self._items
+
+    def qsize(self):
+        """
+        Returns:
+            int: The number of queued items.
+        """
+        return len(self._items)
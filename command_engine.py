@@ -0,0 +1,324 @@
+"""
+command_engine.py
+
+This module sends commands as request/response exchanges. Each command is written to
+the port and the lines that come back are matched to it, so a script can push a
+sequence of commands at full link speed and still know which reply belongs to which
+command and how long it took.
+
+The device answers in order, so responses are matched to the oldest command still
+waiting. Up to command_window commands may be in flight at once; further ones are
+queued and written as soon as a reply, or a timeout, frees a slot. A response starts
+with the first line matching the response_start pattern (any line if it is empty)
+and ends with the first line matching response_end (the first line of the response
+if it is empty). "{command}" in a pattern stands for the command text, so
+"^{command}$" matches a device that echoes its commands. Lines that arrive while no
+command waits, or before its response has started, are left alone: they are still
+displayed and plotted like any other line.
+
+Many devices never answer their commands. So unless response patterns are configured
+(or the caller asks for responses, as run does), a command is simply written, without
+taking a slot in the window, waiting for a response or timing out.
+
+Commands are written by the session's writer thread, behind whatever was queued before
+them, such as a file being sent. A command's timeout and round-trip time count from
+when the writer starts writing it, not from when it was queued, and a command whose
+write fails or is cancelled finishes with that error. Lines are only matched to a
+command once it is being written, and are timed by when the reader received them,
+which for a worker process is earlier than when the UI gets to them.
+
+Round-trip times are recorded per command name (its first word) as "rtt <name>"
+timers in the pipeline statistics; timeouts are counted as command_timeouts.
+
+Classes:
+    - Command: One command and its response.
+    - CommandEngine: Writes commands and matches their responses.
+"""
+
+import collections
+import re
+import threading
+import time
+from handler_config import settings
+from pipeline_stats import count, observe
+
+# How often wait checks for timeouts while no data arrives
+WAIT_POLL = 0.05
+# Finished commands kept for take_finished
+FINISHED_KEPT = 1000
+
+
+def compile_pattern(pattern, command):
+    """
+    Compiles a response pattern for one command.
+
+    Args:
+        pattern (str): The pattern, in which "{command}" stands for the command text.
+        command (str): The command text.
+
+    Returns:
+        re.Pattern: The compiled pattern, or None for an empty pattern.
+    """
+    if not pattern:
+        return None
+    return re.compile(pattern.replace("{command}", re.escape(command.strip())))
+
+
+class Command:
+    """
+    One command and its response.
+
+    Args:
+        text (str): The command as sent.
+        start (str): The pattern of the first response line, empty for any line.
+        end (str): The pattern of the last response line, empty for the first line.
+        timeout (float): Seconds the response may take.
+    """
+
+    def __init__(self, text, start, end, timeout):
+        self.text = text
+        self.name = text.split()[0] if text.split() else text
+        self.start = compile_pattern(start, text)
+        self.end = compile_pattern(end, text)
+        self.timeout = timeout
+        self.sent_at = None  # When the writer started writing it
+        self.started = False
+        self.lines = []
+        self.rtt = None  # Seconds from sending to the last response line
+        self.error = None  # "timeout", "closed" or the write error if no complete response came
+        self.done = threading.Event()
+
+    def accept(self, line):
+        """
+        Offers the command a received line.
+
+        Args:
+            line (str): The line.
+
+        Returns:
+            bool: True if the line completes the response.
+        """
+        if not self.started:
+            if self.start is not None and not self.start.search(line):
+                return False
+            self.started = True
+        self.lines.append(line)
+        return self.end is None or bool(self.end.search(line))
+
+
+class CommandEngine:
+    """
+    Writes commands to one port and matches their responses. Lines are fed from the
+    reader, and commands submitted from any thread.
+
+    Args:
+        write (function): Queues bytes for the port, like Session.write: takes the bytes
+            and on_start and on_done callbacks, and returns the WriteJob, or None if
+            the port is not connected.
+    """
+
+    def __init__(self, write):
+        self.write = write
+        self._lock = threading.Lock()
+        self._queued = collections.deque()
+        self._in_flight = collections.deque()
+        self._finished = collections.deque(maxlen=FINISHED_KEPT)
+
+    def submit(self, text, start=None, end=None, timeout=None, expect=None):
+        """
+        Queues a command, and writes it right away if a slot is free. A command that
+        expects no response is written at once and finishes once it has been written.
+
+        Args:
+            text (str): The command to send.
+            start (str): The response_start pattern for this command, or None for the setting.
+            end (str): The response_end pattern for this command, or None for the setting.
+            timeout (float): The command_timeout for this command, or None for the setting.
+            expect (bool): Whether to wait for a response, or None to wait only if a
+                response pattern is set.
+
+        Returns:
+            Command: The command; its done event is set once it has finished.
+        """
+        start = settings["response_start"] if start is None else start
+        end = settings["response_end"] if end is None else end
+        command = Command(text, start, end, float(settings["command_timeout"] if timeout is None else timeout))
+        if not (bool(start or end) if expect is None else expect):
+            self._send_only(command)
+            return command
+        with self._lock:
+            self._queued.append(command)
+            self._expire(time.monotonic())
+            self._pump()
+        return command
+
+    def feed(self, lines, arrived=None):
+        """
+        Matches received lines to the commands in flight.
+
+        Args:
+            lines (list): The received lines.
+            arrived (float): The time.monotonic() at which the reader received them, or
+                None for now.
+        """
+        if not self._in_flight:
+            return
+        now = time.monotonic() if arrived is None else arrived
+        with self._lock:
+            self._expire(now)
+            for line in lines:
+                if not self._in_flight:
+                    break
+                command = self._in_flight[0]
+                if command.sent_at is None or now < command.sent_at:
+                    break  # Received before it was written, so the line cannot be its response
+                if command.accept(line):
+                    self._in_flight.popleft()
+                    command.rtt = now - command.sent_at
+                    observe(f"rtt {command.name}", command.rtt)
+                    self._finish(command)
+            self._pump()
+
+    def poll(self):
+        """
+        Fails the commands whose response is overdue and writes queued commands into the
+        freed slots. Called regularly so timeouts fire even when no data arrives.
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+            self._pump()
+
+    def wait(self, command):
+        """
+        Waits until a command has finished.
+
+        Args:
+            command (Command): A submitted command.
+
+        Returns:
+            Command: The command.
+        """
+        while not command.done.wait(WAIT_POLL):
+            self.poll()
+        return command
+
+    def run(self, texts):
+        """
+        Sends a sequence of commands, keeping the window full, and waits for all of them.
+
+        Args:
+            texts (list): The commands to send.
+
+        Returns:
+            list: The finished Command objects, in the order given.
+        """
+        commands = [self.submit(text, expect=True) for text in texts]
+        return [self.wait(command) for command in commands]
+
+    def take_finished(self):
+        """
+        Removes and returns the commands that finished since the last call.
+
+        Returns:
+            list: The finished commands, in the order they finished.
+        """
+        with self._lock:
+            finished = list(self._finished)
+            self._finished.clear()
+        return finished
+
+    @property
+    def pending(self):
+        """
+        int: The number of commands queued or in flight.
+        """
+        return len(self._queued) + len(self._in_flight)
+
+    def close(self):
+        """
+        Fails every queued and in-flight command, as the port is closing.
+        """
+        with self._lock:
+            for command in list(self._in_flight) + list(self._queued):
+                command.error = "closed"
+                self._finish(command)
+            self._in_flight.clear()
+            self._queued.clear()
+
+    def _expire(self, now):
+        """
+        Fails the in-flight commands whose timeout has passed. Holds the lock.
+        """
+        overdue = [
+            command for command in self._in_flight
+            if command.sent_at is not None and now - command.sent_at > command.timeout
+        ]
+        for command in overdue:
+            self._in_flight.remove(command)
+            command.error = "timeout"
+            count("command_timeouts")
+            self._finish(command)
+
+    def _pump(self):
+        """
+        Hands queued commands to the writer while fewer than command_window are in
+        flight. Holds the lock, so commands go out in the order they are matched.
+        """
+        window = max(int(settings["command_window"]), 1)
+        while self._queued and len(self._in_flight) < window:
+            command = self._queued.popleft()
+            job = self.write(
+                command.text.encode(),
+                on_start=lambda job, command=command: self._started(command),
+                on_done=lambda job, command=command: self._written(command, job)
+            )
+            if job is None:
+                command.error = "closed"
+                self._finish(command)
+                continue
+            self._in_flight.append(command)
+
+    def _send_only(self, command):
+        """
+        Writes a command that expects no response, outside the window.
+        """
+        def written(job):
+            command.error = job.error
+            command.done.set()
+
+        job = self.write(
+            command.text.encode(),
+            on_start=lambda job: setattr(command, "sent_at", time.monotonic()),
+            on_done=written
+        )
+        if job is None:
+            command.error = "closed"
+            command.done.set()
+
+    def _started(self, command):
+        """
+        Starts a command's clock as the writer thread begins writing it.
+        """
+        with self._lock:
+            command.sent_at = time.monotonic()
+
+    def _written(self, command, job):
+        """
+        Fails a command whose write failed or was cancelled, as the writer thread
+        finishes it.
+        """
+        if job.error is None:
+            return
+        with self._lock:
+            if command in self._in_flight:
+                self._in_flight.remove(command)
+                command.error = job.error
+                self._finish(command)
+            self._pump()
+
+    def _finish(self, command):
+        """
+        Marks a command as finished. Holds the lock.
+        """
+        self._finished.append(command)
+        command.done.set()
@@ -0,0 +1,462 @@
+"""
+data_buffer.py
+
+This module provides the fixed-capacity storage for plotted samples. Samples are kept
+column-oriented in a preallocated NumPy array, so appending a batch is a vectorized
+write and the plot can read the stored series without converting Python lists.
+
+The array and the buffer state can also live in an external buffer, such as a
+multiprocessing.shared_memory block, so one process can append while another reads
+views of the same memory (see parse_worker.py).
+
+A ring buffer in its own memory also keeps a pyramid of its y columns: the minimum,
+maximum and mean of each block at several resolutions, updated with each append. The
+plot reads the coarsest level that still fills the axis width, so drawing a whole
+capture costs about the same for a minute or a day of data.
+
+Classes:
+    - RingBuffer: A fixed-capacity, column-oriented ring buffer of float samples.
+    - MinMaxPyramid: Per-block minimum, maximum and mean of a ring buffer's y columns.
+"""
+
+import numpy as np
+
+# Indices into the ring buffer state array
+HEAD = 0     # Slot the next sample is written to
+SIZE = 1     # Number of samples currently stored
+TOTAL = 2    # Number of samples appended since the last clear
+VERSION = 3  # Incremented before and after every change; odd while a change is in progress
+# Size of the state array at the start of an external buffer
+STATE_BYTES = 4 * 8
+# Samples per block at the finest pyramid level
+PYRAMID_BASE = 64
+# Blocks of one pyramid level that make up a block of the next
+PYRAMID_FACTOR = 8
+
+
+class RingBuffer:
+    """
+    A fixed-capacity, column-oriented ring buffer of float samples. Once full, each
+    append overwrites the oldest samples.
+
+    Every sample is stored twice, at its slot and at slot + capacity. The stored
+    samples therefore always form one contiguous block of the underlying array, and
+    column() can return a view of them instead of a copy. The sample with absolute
+    index i (counted from the last clear) is kept at slot i % capacity.
+
+    The first column is x and the last the arrival time; the columns in between are
+    the y columns, which the pyramid aggregates.
+
+    Args:
+        columns (int): The number of columns (values per sample).
+        capacity (int): The maximum number of samples kept.
+        buffer (buffer): External memory of at least buffer_size bytes to keep the
+            samples in, or None to allocate it.
+        initialize (bool): Whether to empty an external buffer; done once, by its creator.
+    """
+
+    def __init__(self, columns, capacity, buffer=None, initialize=False):
+        self.columns = columns
+        self.capacity = max(int(capacity), 1)
+        self.pyramid = None
+        if buffer is None:
+            self._data = np.full((columns, 2 * self.capacity), np.nan)
+            self._state = np.zeros(4, dtype=np.int64)
+            if columns > 2 and self.capacity >= PYRAMID_BASE * PYRAMID_FACTOR:
+                self.pyramid = MinMaxPyramid(columns - 2, self.capacity)
+            return
+        self._state = np.ndarray(4, dtype=np.int64, buffer=buffer)
+        self._data = np.ndarray((columns, 2 * self.capacity), dtype=float, buffer=buffer, offset=STATE_BYTES)
+        if initialize:
+            self._state[:] = 0
+            self._data.fill(np.nan)
+
+    @staticmethod
+    def buffer_size(columns, capacity):
+        """
+        Returns the size of the external buffer needed for a ring buffer.
+
+        Args:
+            columns (int): The number of columns.
+            capacity (int): The maximum number of samples kept.
+
+        Returns:
+            int: The size in bytes.
+        """
+        return STATE_BYTES + columns * 2 * max(int(capacity), 1) * 8
+
+    def __len__(self):
+        return int(self._state[SIZE])
+
+    @property
+    def total(self):
+        """
+        int: The number of samples appended since the last clear, including overwritten ones.
+        """
+        return int(self._state[TOTAL])
+
+    @property
+    def first_index(self):
+        """
+        int: The absolute index of the oldest stored sample.
+        """
+        return int(self._state[TOTAL]) - int(self._state[SIZE])
+
+    @property
+    def version(self):
+        """
+        int: A counter that changes whenever the stored samples change. It is odd while
+        another process is in the middle of a change.
+        """
+        return int(self._state[VERSION])
+
+    def clear(self):
+        """
+        Discards all stored samples. The storage itself is kept, so this is O(1).
+        """
+        self._state[VERSION] += 1
+        self._state[HEAD] = 0
+        self._state[SIZE] = 0
+        self._state[TOTAL] = 0
+        if self.pyramid is not None:
+            self.pyramid.clear()
+        self._state[VERSION] += 1
+
+    def append(self, block):
+        """
+        Appends a batch of samples.
+
+        Args:
+            block (array-like): The samples, shaped (columns, n).
+        """
+        block = np.asarray(block, dtype=float)
+        count = block.shape[1]
+        if count == 0:
+            return
+        self._state[VERSION] += 1
+        head = int(self._state[HEAD])
+        if count > self.capacity:
+            # Only the newest samples survive; skip the slots the rest would have used
+            head = (head + count - self.capacity) % self.capacity
+            block = block[:, -self.capacity:]
+        slots = (head + np.arange(block.shape[1])) % self.capacity
+        self._data[:, slots] = block
+        self._data[:, slots + self.capacity] = block
+        self._state[HEAD] = (head + block.shape[1]) % self.capacity
+        self._state[SIZE] = min(int(self._state[SIZE]) + count, self.capacity)
+        self._state[TOTAL] += count
+        if self.pyramid is not None:
+            self.pyramid.update(self, int(self._state[TOTAL]) - block.shape[1], int(self._state[TOTAL]))
+        self._state[VERSION] += 1
+
+    def column(self, index):
+        """
+        Returns the stored values of a column, oldest first.
+
+        Args:
+            index (int): The column index.
+
+        Returns:
+            numpy.ndarray: A read-only view into the buffer. It is only valid until the next append.
+        """
+        size = int(self._state[SIZE])
+        start = (int(self._state[HEAD]) - size) % self.capacity
+        view = self._data[index, start:start + size]
+        view.flags.writeable = False
+        return view
+
+    def values(self, index, first, last):
+        """
+        Returns the stored values of a column for a range of absolute sample indices.
+
+        Args:
+            index (int): The column index.
+            first (int): The absolute index of the first sample, not older than first_index.
+            last (int): The absolute index after the last sample.
+
+        Returns:
+            numpy.ndarray: A read-only view into the buffer. It is only valid until the next append.
+        """
+        start = first % self.capacity
+        view = self._data[index, start:start + max(last - first, 0)]
+        view.flags.writeable = False
+        return view
+
+    def at(self, index, positions):
+        """
+        Returns the stored values of a column at absolute sample indices.
+
+        Args:
+            index (int): The column index.
+            positions (numpy.ndarray): Absolute indices, none older than first_index.
+
+        Returns:
+            numpy.ndarray: The values.
+        """
+        return self._data[index, np.asarray(positions, dtype=np.int64) % self.capacity]
+
+    def overview(self, x_index, y_index, first, last, width, method="minmax"):
+        """
+        Reduces a y column over a range of absolute sample indices from the coarsest
+        pyramid level that still has a block per pixel. Its blocks are merged down to
+        one per pixel. With "minmax", each gives its minimum and maximum at their own x
+        values, in the order they arrived, so about two points per pixel; with "mean",
+        it gives its mean at the x value of its middle sample. The partial blocks at
+        both ends are reduced the same way from finer levels, down to the samples
+        themselves.
+
+        Args:
+            x_index (int): The column plotted as x.
+            y_index (int): The y column to reduce.
+            first (int): The absolute index of the first sample, not older than first_index.
+            last (int): The absolute index after the last sample.
+            width (float): The axis width in pixels.
+            method (str): "minmax" or "mean".
+
+        Returns:
+            tuple: The reduced x and y arrays, or None if there is no pyramid or the
+            range is too short for it; the samples are then few enough to reduce directly.
+        """
+        if self.pyramid is None or self.pyramid.level_for(last - first, width) is None:
+            return None
+        positions, y = self._reduce(y_index, first, last, width, method)
+        return self.at(x_index, positions), y
+
+    def _reduce(self, y_index, first, last, width, method):
+        """
+        Returns the absolute sample indices and values that overview draws for a range.
+        """
+        level = self.pyramid.level_for(last - first, width)
+        if level is not None:
+            size = self.pyramid.sizes[level]
+            begin, end = -(-first // size), last // size
+        if level is None or end <= begin:
+            return np.arange(first, last), self.values(y_index, first, last)
+        share = width / (last - first)
+        buckets = max(int(np.ceil((end - begin) * size * share)), 1)
+        if method == "mean":
+            positions, y = self.pyramid.means(level, y_index - 1, begin, end, buckets)
+        else:
+            low, high, low_at, high_at = self.pyramid.blocks(level, y_index - 1, begin, end, buckets)
+            ascending = low_at <= high_at
+            positions = np.empty(2 * len(low), dtype=np.int64)
+            positions[0::2] = np.where(ascending, low_at, high_at)
+            positions[1::2] = np.where(ascending, high_at, low_at)
+            y = np.empty(2 * len(low))
+            y[0::2] = np.where(ascending, low, high)
+            y[1::2] = np.where(ascending, high, low)
+        head = self._reduce(y_index, first, begin * size, (begin * size - first) * share, method)
+        tail = self._reduce(y_index, end * size, last, (last - end * size) * share, method)
+        return np.concatenate((head[0], positions, tail[0])), np.concatenate((head[1], y, tail[1]))
+
+class MinMaxPyramid:
+    """
+    Per-block minimum, maximum and mean of the y columns of a ring buffer, at several
+    resolutions. Level 0 has blocks of PYRAMID_BASE samples, and each further level
+    blocks of PYRAMID_FACTOR blocks of the level below, up to the buffer capacity.
+
+    Each level is a ring of blocks, indexed by absolute block number like the samples.
+    An append recomputes only the blocks it touched: from the samples for level 0,
+    and from the blocks below for every other level, so its cost does not depend on
+    how much data is stored. Blocks are kept per y column as their minimum, maximum,
+    the absolute sample indices of both, the sum of their values and the count of
+    values present. Samples missing a value are NaN and left out; a block without
+    values has an infinite minimum.
+
+    Args:
+        columns (int): The number of y columns.
+        capacity (int): The capacity of the ring buffer.
+    """
+
+    def __init__(self, columns, capacity):
+        self.columns = columns
+        self.sizes = []
+        size = PYRAMID_BASE
+        while size * PYRAMID_FACTOR <= capacity or not self.sizes:
+            self.sizes.append(size)
+            size *= PYRAMID_FACTOR
+        self.levels = []
+        for size in self.sizes:
+            slots = capacity // size + PYRAMID_FACTOR + 3
+            self.levels.append({
+                "low": np.full((columns, slots), np.inf),
+                "high": np.full((columns, slots), -np.inf),
+                "low_at": np.zeros((columns, slots), dtype=np.int64),
+                "high_at": np.zeros((columns, slots), dtype=np.int64),
+                "sum": np.zeros((columns, slots)),
+                "count": np.zeros((columns, slots), dtype=np.int64),
+            })
+        self.total = 0
+
+    def clear(self):
+        """
+        Forgets all blocks.
+        """
+        self.total = 0
+
+    def level_for(self, samples, width):
+        """
+        Picks the coarsest level that still has at least one block per pixel.
+
+        Args:
+            samples (int): The number of samples shown.
+            width (float): The axis width in pixels.
+
+        Returns:
+            int: The level, or None if even level 0 has fewer blocks than pixels.
+        """
+        found = None
+        for level, size in enumerate(self.sizes):
+            if samples / size < max(width, 1):
+                break
+            found = level
+        return found
+
+    def blocks(self, level, column, begin, end, buckets=None):
+        """
+        Returns the blocks of one level and y column, optionally merged into at most
+        buckets groups of consecutive blocks.
+
+        Args:
+            level (int): The level.
+            column (int): The y column, counted from 0.
+            begin (int): The absolute number of the first block.
+            end (int): The absolute number after the last block.
+            buckets (int): The most blocks to return, or None for all of them.
+
+        Returns:
+            tuple: The minimum, maximum, the absolute sample index of the minimum and of
+            the maximum of each block. Blocks without values have NaN minimum and maximum.
+        """
+        arrays = self.levels[level]
+        slots = np.arange(begin, end) % arrays["low"].shape[1]
+        low = arrays["low"][column, slots]
+        empty = np.isposinf(low)
+        low = np.where(empty, np.nan, low)
+        high = np.where(empty, np.nan, arrays["high"][column, slots])
+        low_at, high_at = arrays["low_at"][column, slots], arrays["high_at"][column, slots]
+        if buckets is None or len(low) <= buckets:
+            return low, high, low_at, high_at
+        size = -(-len(low) // buckets)
+        groups = -(-len(low) // size)
+        pad = groups * size - len(low)
+        offsets = np.arange(groups) * size
+        lows = np.concatenate((np.where(empty, np.inf, low), np.full(pad, np.inf))).reshape(groups, size)
+        highs = np.concatenate((np.where(empty, -np.inf, high), np.full(pad, -np.inf))).reshape(groups, size)
+        low_pick = lows.argmin(axis=1) + offsets
+        high_pick = highs.argmax(axis=1) + offsets
+        return low[low_pick], high[high_pick], low_at[low_pick], high_at[high_pick]
+
+    def means(self, level, column, begin, end, buckets=None):
+        """
+        Returns the mean of the blocks of one level and y column, optionally merged into
+        at most buckets groups of consecutive blocks.
+
+        Args:
+            level (int): The level.
+            column (int): The y column, counted from 0.
+            begin (int): The absolute number of the first block.
+            end (int): The absolute number after the last block.
+            buckets (int): The most means to return, or None for one per block.
+
+        Returns:
+            tuple: The absolute sample index of the middle of each block or group, and
+            its mean, NaN where it has no values.
+        """
+        arrays = self.levels[level]
+        size = self.sizes[level]
+        slots = np.arange(begin, end) % arrays["low"].shape[1]
+        total = arrays["sum"][column, slots]
+        present = arrays["count"][column, slots]
+        starts = np.arange(begin, end) * size
+        if buckets is not None and len(total) > buckets:
+            groups = np.arange(0, len(total), -(-len(total) // buckets))
+            total = np.add.reduceat(total, groups)
+            present = np.add.reduceat(present, groups)
+            starts = starts[groups]
+        stops = np.append(starts[1:], end * size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(present > 0, total / np.maximum(present, 1), np.nan)
+        return (starts + stops) // 2, mean
+
+    def update(self, ring, first, last):
+        """
+        Recomputes the blocks touched by newly appended samples.
+
+        Args:
+            ring (RingBuffer): The ring buffer, with the samples already stored.
+            first (int): The absolute index of the first new sample.
+            last (int): The absolute index after the last new sample.
+        """
+        self.total = last
+        oldest = ring.first_index
+        first = max(first, oldest)
+        size = self.sizes[0]
+        begin, end = first // size, (last - 1) // size + 1
+        start = max(begin * size, oldest)
+        values = ring._data[1:1 + self.columns, start % ring.capacity:start % ring.capacity + last - start]
+        padded = np.full((self.columns, (end - begin) * size), np.nan)
+        padded[:, start - begin * size:last - begin * size] = values
+        self._store(0, begin, end, *self._aggregate(padded.reshape(self.columns, end - begin, size), begin * size, size))
+        for level in range(1, len(self.sizes)):
+            below_begin, below_end = begin, end
+            begin, end = below_begin // PYRAMID_FACTOR, (below_end - 1) // PYRAMID_FACTOR + 1
+            self._store(level, begin, end, *self._combine(level - 1, begin, end, below_begin, below_end))
+
+    @staticmethod
+    def _aggregate(samples, offset, size):
+        """
+        Aggregates samples shaped (columns, blocks, size) whose first sample has the
+        absolute index offset.
+        """
+        missing = np.isnan(samples)
+        low_index = np.where(missing, np.inf, samples).argmin(axis=2)
+        high_index = np.where(missing, -np.inf, samples).argmax(axis=2)
+        starts = offset + np.arange(samples.shape[1]) * size
+        return (
+            np.where(missing, np.inf, samples).min(axis=2),
+            np.where(missing, -np.inf, samples).max(axis=2),
+            starts + low_index,
+            starts + high_index,
+            np.where(missing, 0.0, samples).sum(axis=2),
+            (~missing).sum(axis=2),
+        )
+
+    def _combine(self, below, begin, end, below_begin, below_end):
+        """
+        Aggregates the blocks of the level below into blocks begin to end; blocks below
+        outside below_begin to below_end are taken as already stored, or empty past
+        below_end.
+        """
+        arrays = self.levels[below]
+        numbers = np.arange(begin * PYRAMID_FACTOR, end * PYRAMID_FACTOR)
+        slots = numbers % arrays["low"].shape[1]
+        exists = numbers < below_end
+        shape = (self.columns, end - begin, PYRAMID_FACTOR)
+        low = np.where(exists, arrays["low"][:, slots], np.inf).reshape(shape)
+        high = np.where(exists, arrays["high"][:, slots], -np.inf).reshape(shape)
+        low_child = low.argmin(axis=2)[..., None]
+        high_child = high.argmax(axis=2)[..., None]
+        low_at = arrays["low_at"][:, slots].reshape(shape)
+        high_at = arrays["high_at"][:, slots].reshape(shape)
+        return (
+            np.take_along_axis(low, low_child, 2)[..., 0],
+            np.take_along_axis(high, high_child, 2)[..., 0],
+            np.take_along_axis(low_at, low_child, 2)[..., 0],
+            np.take_along_axis(high_at, high_child, 2)[..., 0],
+            np.where(exists, arrays["sum"][:, slots], 0.0).reshape(shape).sum(axis=2),
+            np.where(exists, arrays["count"][:, slots], 0).reshape(shape).sum(axis=2),
+        )
+
+    def _store(self, level, begin, end, low, high, low_at, high_at, total, present):
+        """
+        Stores blocks begin to end of a level.
+        """
+        arrays = self.levels[level]
+        slots = np.arange(begin, end) % arrays["low"].shape[1]
+        arrays["low"][:, slots] = low
+        arrays["high"][:, slots] = high
+        arrays["low_at"][:, slots] = low_at
+        arrays["high_at"][:, slots] = high_at
+        arrays["sum"][:, slots] = total
+        arrays["count"][:, slots] = present
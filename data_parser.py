@@ -0,0 +1,152 @@
+"""
+data_parser.py
+
+This module turns received text lines into plottable numbers. Lines are tab-separated;
+the first number found in each configured column is used.
+
+Instead of splitting every line and searching every field separately, the configured
+columns are compiled into a single regular expression that walks a whole line and
+captures the number of each needed field. A batch of lines is then parsed with one
+scan over the joined text and converted to floats into a single array.
+
+Functions:
+    - compile_schema: Builds the pattern and column projection for a column configuration.
+    - parse_batch: Parses a batch of lines into NumPy arrays.
+    - project_samples: Selects the configured columns from decoded binary samples.
+    - stamp_samples: Builds the block of plot data for parsed samples.
+"""
+
+import re
+from itertools import chain
+import numpy as np
+from handler_config import plot_config
+
+# The first number in a field, as matched by the original per-field search
+NUMBER = r'[-+]?\d*\.?\d+'
+# Any text up to the end of a field
+FIELD_REST = r'[^\t\n]*'
+
+# Samples of batches arriving further apart than this all get their batch's arrival time
+MAX_SPREAD = 1.0
+
+# Compiled schemas by the column configuration they were compiled for
+_schemas = {}
+
+def compile_schema(x_column, y_columns):
+    """
+    Builds the pattern and column projection for a column configuration.
+
+    Each needed field gets an optional capture group, and every field after the first
+    is nested inside the optional group of the one before it. The pattern therefore
+    matches every line: a field without a number, or a line that ends too early,
+    simply leaves its groups empty.
+
+    Args:
+        x_column (int or None): The column holding the x value.
+        y_columns (list): The columns holding the y values.
+
+    Returns:
+        tuple: The compiled pattern, the number of capture groups, the group index of
+        the x column (or None) and the group indices of the y columns (None for
+        columns that can never be present).
+    """
+    wanted = [x_column] + list(y_columns)
+    needed = sorted({col for col in wanted if col is not None and col >= 0})
+    pattern = '^'
+    previous = -1
+    for col in needed:
+        skipped = col - previous - 1
+        separator = '' if previous < 0 else '\\t'
+        if skipped:
+            separator += f'(?:{FIELD_REST}\\t){{{skipped}}}'
+        pattern += f'(?:{separator}(?:[^\\t\\n]*?({NUMBER}))?{FIELD_REST}'
+        previous = col
+    pattern += ')?' * len(needed)
+    groups = {col: i for i, col in enumerate(needed)}
+    return (
+        re.compile(pattern, re.MULTILINE),
+        len(needed),
+        groups.get(x_column),
+        [groups.get(col) for col in y_columns],
+    )
+
+def parse_batch(lines, config=plot_config):
+    """
+    Parses a batch of lines into NumPy arrays, using the columns from a plot
+    configuration. Each column configuration is compiled only once.
+
+    Args:
+        lines (list): The received lines, each ending with a line terminator.
+        config (dict): The plot configuration, defaults to plot_config.
+
+    Returns:
+        tuple: The x values (shape (n,)) and the y values (shape (len(y_columns), n)).
+        Values that are missing or malformed are NaN; x is all NaN when no x column
+        is configured.
+    """
+    key = (config.get("x_column"), tuple(config.get("y_columns", [])))
+    if key not in _schemas:
+        _schemas[key] = compile_schema(*key)
+    pattern, group_count, x_group, y_groups = _schemas[key]
+
+    count = len(lines)
+    values = np.full((group_count + 1, count), np.nan)
+    if group_count and count:
+        found = pattern.findall(''.join(lines))[:count]
+        fields = found if group_count == 1 else chain.from_iterable(found)
+        numbers = np.fromiter(map(float, [field or 'nan' for field in fields]), dtype=float, count=count * group_count)
+        values[:group_count] = numbers.reshape(count, group_count).T
+
+    # The extra last row stays NaN and stands in for columns that are never present
+    x = values[group_count if x_group is None else x_group]
+    y = values[[group_count if group is None else group for group in y_groups]]
+    return x, y
+
+def project_samples(samples, config=plot_config):
+    """
+    Selects the columns of a plot configuration out of decoded binary samples, where
+    column numbers refer to the fields of the sample layout.
+
+    Args:
+        samples (numpy.ndarray): The samples, shaped (fields, n).
+        config (dict): The plot configuration, defaults to plot_config.
+
+    Returns:
+        tuple: The x values and the y values, shaped like the result of parse_batch.
+    """
+    fields, count = samples.shape
+    padded = np.vstack((samples, np.full((1, count), np.nan)))
+
+    def row(col):
+        return col if col is not None and 0 <= col < fields else fields
+
+    x = padded[row(config.get("x_column"))]
+    y = padded[[row(col) for col in config.get("y_columns", [])]]
+    return x, y
+
+def stamp_samples(x, y, timestamp, previous, origin, first_index):
+    """
+    Builds the block of plot data for parsed samples: x, the y rows and the arrival
+    time of each sample. Samples without an x value are placed at their sample index.
+    The samples are spread evenly over the time since the previous batch, ending at
+    their own arrival time.
+
+    Args:
+        x (numpy.ndarray): The x values, NaN where missing.
+        y (numpy.ndarray): The y values, one row per plotted column.
+        timestamp (float): The host time at which the newest of the samples arrived.
+        previous (float): The arrival time of the previous batch, or None.
+        origin (float): The host time the time axis counts from.
+        first_index (int): The sample index of the first sample.
+
+    Returns:
+        numpy.ndarray: The block, shaped (2 + len(y), n).
+    """
+    start = timestamp
+    if previous is not None and 0 < timestamp - previous <= MAX_SPREAD:
+        start = previous
+    times = np.linspace(start, timestamp, len(x) + 1)[1:] - origin
+    block = np.vstack((x, y, times))
+    missing = np.isnan(block[0])
+    block[0, missing] = first_index + np.flatnonzero(missing)
+    return block
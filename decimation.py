@@ -0,0 +1,193 @@
+"""
+decimation.py
+
+This module reduces long data series to roughly the number of points the plot can
+actually show. The minmax and lttb reductions keep the shape of the signal, including
+short spikes, so the decimated line looks the same as the full one at screen
+resolution. The mean reduction instead averages each pixel's samples, which smooths
+out noise.
+
+Functions:
+    - visible_slice: Finds the part of a series that falls inside an x range.
+    - minmax: Keeps the minimum and maximum of each bucket.
+    - lttb: Largest-Triangle-Three-Buckets downsampling.
+    - means: Keeps the mean of each bucket.
+    - decimate: Reduces a series for a plot of a given pixel width.
+"""
+
+import numpy as np
+
+DECIMATION_METHODS = ("minmax", "mean", "lttb", "none")
+# Candidates per kept point that lttb considers in long series
+LTTB_CANDIDATES = 8
+
+
+def visible_slice(x, x_min, x_max):
+    """
+    Finds the part of a series that falls inside an x range, plus one point on each
+    side so the line still runs to the edges of the axis.
+
+    Args:
+        x (numpy.ndarray): The x values.
+        x_min (float): The lower bound of the range.
+        x_max (float): The upper bound of the range.
+
+    Returns:
+        slice: The index range covering every point inside the x range.
+    """
+    inside = (x >= x_min) & (x <= x_max)
+    if not inside.any():
+        return slice(0, 0)
+    first = int(np.argmax(inside))
+    last = len(x) - int(np.argmax(inside[::-1]))
+    return slice(max(first - 1, 0), min(last + 1, len(x)))
+
+
+def minmax(x, y, buckets):
+    """
+    Splits the series into buckets and keeps the minimum and maximum of each, in their
+    original order, together with the first and last point.
+
+    Args:
+        x (numpy.ndarray): The x values.
+        y (numpy.ndarray): The y values; NaN marks missing samples.
+        buckets (int): The number of buckets.
+
+    Returns:
+        tuple: The reduced x and y arrays.
+    """
+    count = len(y)
+    if count <= 2 * buckets:
+        return x, y
+    size = -(-count // buckets)
+    buckets = -(-count // size)
+    pad = buckets * size - count
+    nan = np.isnan(y)
+    low = np.where(nan, np.inf, y)
+    high = np.where(nan, -np.inf, y)
+    if pad:
+        low = np.concatenate((low, np.full(pad, np.inf)))
+        high = np.concatenate((high, np.full(pad, -np.inf)))
+    offsets = np.arange(buckets) * size
+    low_index = low.reshape(buckets, size).argmin(axis=1) + offsets
+    high_index = high.reshape(buckets, size).argmax(axis=1) + offsets
+    index = np.unique(np.concatenate(([0, count - 1], low_index, high_index)))
+    return x[index], y[index]
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling. Keeps the point of each bucket that
+    forms the largest triangle with the previously kept point and the average of the
+    next bucket.
+
+    Long series are first reduced to the minimum and maximum of LTTB_CANDIDATES / 2
+    buckets per kept point. The largest triangles are formed by a bucket's extremes,
+    so the result is practically the same. The next-bucket averages and the terms of
+    every candidate's area are computed for all buckets at once; only the choice of
+    each kept point, which depends on the previous one, runs bucket by bucket.
+
+    Args:
+        x (numpy.ndarray): The x values.
+        y (numpy.ndarray): The y values; NaN marks missing samples.
+        threshold (int): The number of points to keep.
+
+    Returns:
+        tuple: The reduced x and y arrays.
+    """
+    if threshold >= len(y) or threshold < 3:
+        return x, y
+    x, y = minmax(x, y, threshold * LTTB_CANDIDATES // 2)
+    count = len(y)
+    if threshold >= count:
+        return x, y
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.append(np.linspace(1, count - 1, threshold - 1).astype(int), count)
+    starts = edges[:-1]
+    sizes = np.diff(edges)
+    valid = ~np.isnan(y)
+    present = np.add.reduceat(valid.astype(float), starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = np.add.reduceat(x, starts) / sizes
+        mean_y = np.where(present > 0, np.add.reduceat(np.where(valid, y, 0.0), starts) / present, np.nan)
+    # The average of the next bucket; one without values is replaced by this bucket's
+    next_x = mean_x[1:, None]
+    next_y = np.where(np.isnan(mean_y[1:]), mean_y[:-1], mean_y[1:])[:, None]
+
+    # The candidates of each bucket, one row per bucket padded to the largest bucket
+    offsets = np.arange(sizes[:-1].max())
+    positions = np.minimum(starts[:-1, None] + offsets, count - 1)
+    usable = (offsets < sizes[:-1, None]) & valid[positions]
+    bucket_x = x[positions]
+    bucket_y = y[positions]
+    # Twice the area with the kept point (px, py) is |px * a + py * b + c|
+    with np.errstate(invalid='ignore'):
+        terms = np.stack((
+            np.where(usable, bucket_y - next_y, 0.0),
+            np.where(usable, next_x - bucket_x, 0.0),
+            np.where(usable, bucket_x * next_y - next_x * bucket_y, 0.0),
+        ), axis=1)
+    penalty = np.where(usable, 0.0, -1.0)  # Padding and missing values are never chosen over real points
+
+    index = np.empty(threshold, dtype=int)
+    index[0] = 0
+    index[-1] = count - 1
+    kept = np.array([x[0], y[0], 1.0])
+    with np.errstate(invalid='ignore'):
+        for i in range(threshold - 2):
+            j = int(np.argmax(np.abs(kept @ terms[i]) + penalty[i]))
+            index[i + 1] = positions[i, j]
+            kept[0] = bucket_x[i, j]
+            kept[1] = bucket_y[i, j]
+    return x[index], y[index]
+
+
+def means(x, y, buckets):
+    """
+    Splits the series into buckets and keeps the mean of each, at the x value of its
+    middle sample.
+
+    Args:
+        x (numpy.ndarray): The x values.
+        y (numpy.ndarray): The y values; NaN marks missing samples.
+        buckets (int): The number of buckets.
+
+    Returns:
+        tuple: The reduced x and y arrays; a bucket without values has a NaN mean.
+    """
+    count = len(y)
+    if count <= buckets:
+        return x, y
+    starts = np.arange(0, count, -(-count // buckets))
+    lengths = np.diff(np.append(starts, count))
+    valid = ~np.isnan(y)
+    present = np.add.reduceat(valid.astype(np.int64), starts)
+    total = np.add.reduceat(np.where(valid, y, 0.0), starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(present > 0, total / np.maximum(present, 1), np.nan)
+    return x[starts + lengths // 2], mean
+
+
+def decimate(x, y, width, method="minmax"):
+    """
+    Reduces a series to about two points per pixel of the plot width, or one with
+    "mean".
+
+    Args:
+        x (numpy.ndarray): The x values.
+        y (numpy.ndarray): The y values.
+        width (int): The width of the plot area in pixels.
+        method (str): One of "minmax", "mean", "lttb" or "none".
+
+    Returns:
+        tuple: The reduced x and y arrays.
+    """
+    width = max(int(width), 1)
+    if method == "minmax":
+        return minmax(x, y, width)
+    if method == "mean":
+        return means(x, y, width)
+    if method == "lttb":
+        return lttb(x, y, 2 * width)
+    return x, y
@@ -0,0 +1,200 @@
+"""
+framing.py
+
+This module decodes binary telemetry frames. Frames are delimited with COBS (a zero
+byte ends each frame) or SLIP (0xC0 ends each frame), optionally end with a CRC, and
+carry one sample laid out as a user-declared struct or NumPy dtype.
+
+Functions:
+    - cobs_encode: Encodes one frame with COBS.
+    - cobs_decode: Decodes one COBS-encoded frame.
+    - slip_encode: Encodes one frame with SLIP.
+    - slip_decode: Decodes one SLIP-encoded frame.
+    - strip_crc: Checks and removes the CRC at the end of a frame.
+    - sample_dtype: Builds the NumPy dtype for a struct format or dtype string.
+    - unpack_samples: Unpacks decoded frames into sample columns.
+"""
+
+import binascii
+import re
+import struct
+import zlib
+import numpy as np
+
+# Frame delimiter of each framing
+DELIMITERS = {
+    "cobs": b'\x00',
+    "slip": b'\xc0',
+}
+
+# Number of CRC bytes at the end of a frame
+CRC_SIZES = {
+    "none": 0,
+    "crc16": 2,
+    "crc32": 4,
+}
+
+# NumPy kind and standard size of each struct format character; native layouts ("@" or
+# no prefix) take the size from struct instead, since 'l' and 'L' are 8 bytes on LP64
+STRUCT_TYPES = {
+    'b': 'i1', 'B': 'u1', '?': 'b1',
+    'h': 'i2', 'H': 'u2',
+    'i': 'i4', 'I': 'u4', 'l': 'i4', 'L': 'u4',
+    'q': 'i8', 'Q': 'u8',
+    'e': 'f2', 'f': 'f4', 'd': 'f8',
+}
+STRUCT_ITEM = re.compile(r'(\d*)([a-zA-Z?])')
+BYTE_ORDERS = {'<': '<', '>': '>', '!': '>', '=': '=', '@': '='}
+
+def cobs_encode(frame):
+    """
+    Encodes one frame with COBS. The zero delimiter is not appended.
+
+    Args:
+        frame (bytes): The frame to encode.
+
+    Returns:
+        bytes: The encoded frame, free of zero bytes.
+    """
+    encoded = bytearray()
+    for block in frame.split(b'\x00'):
+        while len(block) >= 0xFE:
+            encoded.append(0xFF)
+            encoded += block[:0xFE]
+            block = block[0xFE:]
+        encoded.append(len(block) + 1)
+        encoded += block
+    return bytes(encoded)
+
+def cobs_decode(frame):
+    """
+    Decodes one COBS-encoded frame (without its zero delimiter).
+
+    Args:
+        frame (bytes): The encoded frame.
+
+    Returns:
+        bytes: The decoded frame.
+
+    Raises:
+        ValueError: If the frame is not valid COBS.
+    """
+    decoded = bytearray()
+    i = 0
+    length = len(frame)
+    while i < length:
+        code = frame[i]
+        end = i + code
+        if code == 0 or end > length:
+            raise ValueError("Invalid COBS frame")
+        decoded += frame[i + 1:end]
+        i = end
+        if code < 0xFF and i < length:
+            decoded.append(0)
+    return bytes(decoded)
+
+def slip_encode(frame):
+    """
+    Encodes one frame with SLIP. The END delimiter is not appended.
+
+    Args:
+        frame (bytes): The frame to encode.
+
+    Returns:
+        bytes: The encoded frame, free of END bytes.
+    """
+    return frame.replace(b'\xdb', b'\xdb\xdd').replace(b'\xc0', b'\xdb\xdc')
+
+def slip_decode(frame):
+    """
+    Decodes one SLIP-encoded frame (without its END delimiter).
+
+    Args:
+        frame (bytes): The encoded frame.
+
+    Returns:
+        bytes: The decoded frame.
+    """
+    return frame.replace(b'\xdb\xdc', b'\xc0').replace(b'\xdb\xdd', b'\xdb')
+
+def strip_crc(frame, crc):
+    """
+    Checks and removes the CRC at the end of a decoded frame. The CRC is stored
+    little-endian; crc16 is CRC-16/CCITT-FALSE and crc32 is the zlib CRC-32.
+
+    Args:
+        frame (bytes): The decoded frame.
+        crc (str): One of "none", "crc16" or "crc32".
+
+    Returns:
+        bytes: The frame without its CRC, or None if the CRC does not match.
+    """
+    size = CRC_SIZES[crc]
+    if not size:
+        return frame
+    if len(frame) < size:
+        return None
+    payload, expected = frame[:-size], int.from_bytes(frame[-size:], 'little')
+    if crc == "crc16":
+        actual = binascii.crc_hqx(payload, 0xFFFF)
+    else:
+        actual = zlib.crc32(payload)
+    return payload if actual == expected else None
+
+def sample_dtype(frame_format):
+    """
+    Builds the NumPy dtype for a sample layout. The layout is either a struct format
+    string such as "<Iff", or a comma-separated NumPy dtype such as "<u4,<f4,<f4".
+    Pad bytes ("x") are skipped; every other item becomes one column.
+
+    Args:
+        frame_format (str): The sample layout.
+
+    Returns:
+        numpy.dtype: A structured dtype with one field per column.
+
+    Raises:
+        ValueError: If the layout is not supported.
+    """
+    if ',' in frame_format:
+        return np.dtype(frame_format)
+    order = BYTE_ORDERS.get(frame_format[:1])
+    body = frame_format[1:] if order else frame_format
+    prefix = frame_format[:1] if order else '@'
+    order = order or '='
+    formats, offsets = [], []
+    preceding = ''
+    for count, code in STRUCT_ITEM.findall(body):
+        for _ in range(int(count or 1)):
+            if code != 'x':
+                if code not in STRUCT_TYPES:
+                    raise ValueError(f"Unsupported format character: {code}")
+                # A zero repeat count aligns to the item without adding it
+                offsets.append(struct.calcsize(prefix + preceding + '0' + code))
+                formats.append(f"{order}{STRUCT_TYPES[code][0]}{struct.calcsize(prefix + code)}")
+            preceding += code
+    if not formats:
+        raise ValueError(f"Format has no fields: {frame_format}")
+    return np.dtype({
+        'names': [f'f{i}' for i in range(len(formats))],
+        'formats': formats,
+        'offsets': offsets,
+        'itemsize': struct.calcsize(frame_format),
+    })
+
+def unpack_samples(payloads, dtype):
+    """
+    Unpacks decoded frames into sample columns with a single buffer conversion.
+
+    Args:
+        payloads (list): The decoded frames, each exactly dtype.itemsize bytes long.
+        dtype (numpy.dtype): The sample layout.
+
+    Returns:
+        numpy.ndarray: The samples as floats, shaped (fields, n).
+    """
+    records = np.frombuffer(b''.join(payloads), dtype=dtype)
+    columns = np.empty((len(dtype.names), len(records)))
+    for i, name in enumerate(dtype.names):
+        columns[i] = records[name]
+    return columns
@@ -3,7 +3,8 @@ handler_config.py
 
 This module handles the configuration for the Microcontroller Interface application.
 It includes functions for reading from and writing to a configuration file, and
-maintains shared variables for plot configuration and permanent command entries.
+maintains shared variables for plot configuration, tunable settings and permanent
+command entries.
 
 Functions:
     - get_executable_path: Determines the path of the executable or script.
@@ -40,6 +41,48 @@ plot_config = {
     "y_columns": []
 }
 
+# Tunable settings stored in the configuration file, with their defaults
+DEFAULT_SETTINGS = {
+    "max_fps": 20,  # Upper bound on plot redraws per second
+    "plot_capacity": 100000,  # Number of samples kept for plotting
+    "decimation": "minmax",  # How plotted series are reduced: "minmax", "mean" (smoothed), "lttb" or "none"
+    "stats_window": 1000,  # Number of most recent samples the window statistics (min, max, mean, rate) cover
+    "display_max_lines": 5000,  # Number of lines kept in the terminal display
+    "display_every": 1,  # Only every Nth received line is shown; all are still parsed and logged
+    "queue_capacity": 200000,  # Lines (or binary samples) that may wait for the UI
+    "queue_policy": "drop_oldest",  # When the queue is full: "block", "drop_oldest" or "drop_newest"
+    "serial_engine": "selector",  # How ports are read: "selector" (one thread for all) or "threads"
+    "parse_worker": False,  # Whether each port is read and parsed in a worker process
+    "connect_ready": "first_line",  # Ready signal after connecting: "first_line", "banner", "dtr_reset" or "delay"
+    "ready_banner": "",  # Text the device sends once ready, for connect_ready "banner"
+    "ready_timeout": 2.0,  # Longest wait for the ready signal, and the fixed wait of "delay"
+    "reconnect_initial": 0.5,  # Seconds before a dropped network port first tries to reconnect; doubles per failure
+    "reconnect_max": 10.0,  # Longest wait between two reconnect attempts of a network port
+    "socket_buffer_bytes": 1 << 20,  # Kernel buffer size of network port sockets; 0 keeps the default
+    "port_scan_seconds": 2.0,  # Interval between serial port scans (udev events also trigger one)
+    "auto_reconnect": False,  # Whether unplugged devices are reconnected when they come back
+    "reconnect_devices": [],  # USB serial numbers or "VID:PID" to connect whenever they appear
+    "flow_control": "none",  # Serial flow control: "none", "rtscts" (hardware) or "xonxoff" (software)
+    "write_chunk_bytes": 64,  # Sends are written in chunks of this many bytes
+    "write_chunk_gap": 0.0,  # Seconds between two written chunks, for devices with small receive buffers
+    "command_window": 4,  # Commands that may await their response at once; more are queued
+    "command_timeout": 1.0,  # Seconds a command's response may take
+    "response_start": "",  # Pattern of a response's first line, "{command}" is the command; empty for any line
+    "response_end": "",  # Pattern of a response's last line; empty when responses are one line
+    "publish_address": "",  # tcp://<host>:<port> or unix://<path> that parsed samples are served on; empty to disable
+    "publish_format": "ndjson",  # Messages sent to subscribers: "ndjson" or "binary"
+    "publish_buffer_batches": 256,  # Batches a slow subscriber may fall behind before its oldest are dropped
+    "terminal_log": True,  # Whether the terminal history is also written to a log file
+    "decode_mode": "text",  # How received bytes are decoded: "text", "cobs" or "slip"
+    "frame_format": "<If",  # Sample layout of binary frames, as a struct format or NumPy dtype
+    "frame_crc": "none",  # CRC at the end of binary frames: "none", "crc16" or "crc32"
+    "record_max_bytes": 64 << 20,  # A new capture file is started past this size
+    "record_max_seconds": 3600,  # A new capture file is started past this age
+    "stats_export_path": "",  # File that pipeline statistics are appended to; empty to disable
+    "stats_export_seconds": 10  # Interval between exported statistics snapshots
+}
+settings = dict(DEFAULT_SETTINGS)
+
 def read_config():
     """
     Reads the configuration from the configuration file.
@@ -52,6 +95,8 @@ def read_config():
             config = json.load(file)
             plot_config["x_column"] = config.get("x_column")
             plot_config["y_columns"] = config.get("y_columns", [])
+            for key, default in DEFAULT_SETTINGS.items():
+                settings[key] = config.get(key, default)
             return config
     return {}
 
@@ -0,0 +1,316 @@
+"""
+headless.py
+
+This script runs the capture pipeline without Tk, for lab servers and CI machines
+without a display. It connects to one or more ports exactly like the application,
+parses everything they send and streams the result to stdout, a file or a local
+socket. The settings, plot columns and baud rate saved in configTerminalIF.txt are
+used unless overridden on the command line.
+
+Each session has a consumer thread that sleeps until its reader queues a batch and
+then handles everything queued at once, so throughput is bounded by the port and the
+output, not by a UI timer. Sessions are always read in this process: with no UI to
+compete with, the parse_worker setting is ignored.
+
+Output formats:
+    - csv: one row per sample: x, the y columns and the arrival time, as plotted
+      (binary frames are always written this way).
+    - lines: the received text lines as they are.
+With several ports, every row or line starts with its port name.
+
+With --column-stats, the rolling statistics of every plotted column (see
+rolling_stats.py) are written to stderr as one JSON object per session and interval:
+{"source", "time", "columns": [{"column", "count", "mean", "std", "window_mean",
+"window_std", "min", "max", "rate"}, ...]}, with null where a statistic has no value.
+
+Usage:
+    python headless.py /dev/ttyUSB0 --output samples.csv
+    python headless.py /dev/ttyUSB0 /dev/ttyACM0 --format lines --output tcp://127.0.0.1:9000
+    python headless.py replay://captures/run.bin?speed=max --y-columns 1,2 --seconds 30
+    python headless.py /dev/ttyUSB0 --send "hello 3 @" --set command_timeout=2
+    python headless.py /dev/ttyUSB0 --output /dev/null --column-stats 5 --set stats_window=500
+
+Functions:
+    - open_output: Opens the stream the output is written to.
+    - consume: Runs the consumer thread of one session.
+    - column_stats_json: Describes the rolling statistics of a session as JSON.
+    - apply_overrides: Applies command line overrides to the settings.
+    - main: Parses the command line and runs the pipeline until stopped.
+
+Classes:
+    - SampleSink: Writes parsed samples or received lines to the output.
+"""
+
+import argparse
+import io
+import json
+import signal
+import socket
+import sys
+import threading
+import time
+import numpy as np
+from data_parser import parse_batch, project_samples
+from handler_config import read_config, plot_config, settings
+from session import connect_serial, disconnect_serial, get_session, run_commands
+from recorder import start_recording, stop_recording
+from publisher import start_publishing, stop_publishing
+from pipeline_stats import start_exporter, snapshot, format_snapshot
+
+# How long a consumer sleeps before re-checking whether it should stop
+CONSUME_WAIT = 0.5
+# How often the main thread checks whether the sessions are still connected
+CHECK_INTERVAL = 0.5
+
+
+def open_output(target):
+    """
+    Opens the stream the output is written to.
+
+    Args:
+        target (str): "-" for stdout, tcp://<host>:<port> or unix://<path> to connect to
+            a listening socket, otherwise a file path.
+
+    Returns:
+        file: A binary stream.
+    """
+    if target == "-":
+        return sys.stdout.buffer
+    if target.startswith("tcp://"):
+        host, _, port = target[len("tcp://"):].rpartition(":")
+        return socket.create_connection((host or "127.0.0.1", int(port))).makefile('wb')
+    if target.startswith("unix://"):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(target[len("unix://"):])
+        return connection.makefile('wb')
+    return open(target, 'wb')
+
+
+class SampleSink:
+    """
+    Writes parsed samples or received lines to the output. Consumer threads of all
+    sessions share it; each batch is written whole.
+
+    Args:
+        stream (file): The binary output stream.
+        output_format (str): "csv" or "lines".
+        prefix (bool): Whether every row or line starts with its port name.
+    """
+
+    def __init__(self, stream, output_format, prefix):
+        self.stream = stream
+        self.output_format = output_format
+        self.prefix = prefix
+        self._lock = threading.Lock()
+
+    def write_lines(self, lines, source):
+        """
+        Writes received text lines.
+
+        Args:
+            lines (list): The lines, each keeping its line terminator.
+            source (str): The port they came from.
+        """
+        start = f"{source}\t" if self.prefix else ""
+        self._write("".join(start + line for line in lines).encode(errors='replace'))
+
+    def write_samples(self, block, source):
+        """
+        Writes parsed samples as CSV rows.
+
+        Args:
+            block (numpy.ndarray): The samples, one row per column.
+            source (str): The port they came from.
+        """
+        text = io.StringIO()
+        row_format = ",".join(["%.9g"] * block.shape[0])
+        if self.prefix:
+            row_format = source.replace("%", "%%") + "," + row_format
+        np.savetxt(text, block.T, fmt=row_format)
+        self._write(text.getvalue().encode())
+
+    def _write(self, data):
+        with self._lock:
+            self.stream.write(data)
+            self.stream.flush()
+
+    def close(self):
+        """
+        Flushes the output and closes it, unless it is stdout.
+        """
+        with self._lock:
+            self.stream.flush()
+            if self.stream is not sys.stdout.buffer:
+                self.stream.close()
+
+
+def consume(session, sink, stop_event):
+    """
+    Runs the consumer thread of one session: waits for queued batches, parses them into
+    the session's samples and writes them to the sink. Once stopped, what is still
+    queued is written before the thread ends.
+
+    Args:
+        session (Session): The session to consume.
+        sink (SampleSink): Receives the output.
+        stop_event (threading.Event): Stops the thread when set.
+    """
+    while not stop_event.is_set() or not session.data_queue.empty():
+        if not session.data_queue.wait(CONSUME_WAIT):
+            continue
+        for timestamp, batch in session.data_queue.drain():
+            try:
+                if isinstance(batch, list):
+                    if sink.output_format == "lines":
+                        sink.write_lines(batch, session.name)
+                        continue
+                    x, y = parse_batch(batch, session.plot_config)
+                else:
+                    x, y = project_samples(batch, session.plot_config)
+                block = session.append(x, y, timestamp)
+                if block.shape[1]:
+                    sink.write_samples(block, session.name)
+            except (BrokenPipeError, ConnectionError) as e:
+                print(f"Output error: {e}", file=sys.stderr)
+                stop_event.set()
+                return
+            except ValueError as e:
+                print(f"ValueError: {e}", file=sys.stderr)
+
+
+def column_stats_json(session):
+    """
+    Describes the rolling statistics of a session's plotted columns as JSON.
+
+    Args:
+        session (Session): The session.
+
+    Returns:
+        str: One JSON object, without a line terminator.
+    """
+    columns = []
+    for column, stats in zip(session.plot_config["y_columns"], session.stats.results()):
+        entry = {"column": column}
+        entry.update({name: None if np.isnan(value) else value for name, value in stats.items()})
+        columns.append(entry)
+    return json.dumps({"source": session.name, "time": time.time(), "columns": columns})
+
+
+def apply_overrides(overrides):
+    """
+    Applies command line overrides to the settings.
+
+    Args:
+        overrides (list): "name=value" strings; values are read as JSON where possible.
+
+    Raises:
+        ValueError: If a name is not a known setting.
+    """
+    for override in overrides:
+        name, _, value = override.partition("=")
+        if name not in settings:
+            raise ValueError(f"Unknown setting: {name}")
+        try:
+            settings[name] = json.loads(value)
+        except json.JSONDecodeError:
+            settings[name] = value
+
+
+def main(argv=None):
+    """
+    Parses the command line, connects the ports and runs the pipeline until the time is
+    up, every port has closed, or the process is interrupted.
+
+    Args:
+        argv (list): The arguments, defaults to sys.argv[1:].
+
+    Returns:
+        int: The exit status.
+    """
+    config = read_config()
+    parser = argparse.ArgumentParser(description="Run the serial capture pipeline without a display")
+    parser.add_argument("ports", nargs="+", help="serial ports or replay:// URLs")
+    parser.add_argument("--baudrate", type=int, default=config.get("baudrate", 9600))
+    parser.add_argument("--output", default="-", help="-, a file, tcp://<host>:<port> or unix://<path>")
+    parser.add_argument("--format", default="csv", choices=["csv", "lines"])
+    parser.add_argument("--x-column", type=int, default=plot_config["x_column"])
+    parser.add_argument("--y-columns", default=",".join(str(column) for column in plot_config["y_columns"]),
+                        help="comma-separated column indices")
+    parser.add_argument("--seconds", type=float, default=0, help="stop after this long, 0 to run until stopped")
+    parser.add_argument("--send", action="append", default=[], help="command to send once connected (repeatable)")
+    parser.add_argument("--record", action="store_true", help="record captures while running")
+    parser.add_argument("--publish", default=settings["publish_address"],
+                        help="also serve parsed samples on tcp://<host>:<port> or unix://<path>")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="override a setting")
+    parser.add_argument("--stats", action="store_true", help="print pipeline statistics to stderr on exit")
+    parser.add_argument("--column-stats", type=float, default=0, metavar="SECONDS",
+                        help="print rolling column statistics to stderr at this interval, 0 to disable")
+    args = parser.parse_args(argv)
+
+    try:
+        apply_overrides(args.set)
+    except ValueError as e:
+        parser.error(str(e))
+    settings["parse_worker"] = False
+    plot_config["x_column"] = args.x_column
+    plot_config["y_columns"] = [int(column) for column in args.y_columns.split(",") if column.strip()]
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    if settings["stats_export_path"]:
+        start_exporter(settings["stats_export_path"], settings["stats_export_seconds"], stop_event)
+    if args.record:
+        start_recording()
+    if args.publish:
+        start_publishing(args.publish)
+
+    try:
+        sink = SampleSink(open_output(args.output), args.format, len(args.ports) > 1)
+    except OSError as e:
+        print(f"Output error: {e}", file=sys.stderr)
+        return 1
+
+    consumers = []
+    for port in args.ports:
+        if not connect_serial(port, args.baudrate):
+            print(f"Could not connect to {port}", file=sys.stderr)
+            continue
+        thread = threading.Thread(target=consume, args=(get_session(port), sink, stop_event), daemon=True)
+        thread.start()
+        consumers.append(thread)
+    status = 0 if consumers else 1
+
+    try:
+        for port in args.ports:
+            for command in run_commands(args.send, port):
+                outcome = command.error or f"{command.rtt * 1000:.1f} ms"
+                print(f"{port}: {command.text.strip()} -> {outcome}", file=sys.stderr)
+        started = time.monotonic()
+        reported = started
+        while consumers and not stop_event.wait(CHECK_INTERVAL):
+            if args.seconds and time.monotonic() - started >= args.seconds:
+                break
+            if args.column_stats and time.monotonic() - reported >= args.column_stats:
+                reported = time.monotonic()
+                for port in args.ports:
+                    if get_session(port) is not None:
+                        print(column_stats_json(get_session(port)), file=sys.stderr)
+            if not any(get_session(port) is not None and get_session(port).is_open for port in args.ports):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        disconnect_serial()
+        stop_event.set()
+        for thread in consumers:
+            thread.join()
+        stop_recording()
+        stop_publishing()
+        sink.close()
+        if args.stats:
+            print(format_snapshot(snapshot()), file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,45 +2,53 @@
 main.py
 
 This script sets up the main interface for the Microcontroller Interface application.
-It uses Tkinter for the GUI, threading for handling serial communication, and
+It uses Tkinter for the GUI, one reader thread per connected serial session, and
 separate modules for UI setup, plot updates, and serial handling.
 
 Modules:
     - tkinter: For GUI components.
-    - threading: For concurrent execution of the serial reading function.
+    - threading: For the event that stops background threads on exit.
     - ui_setup: Contains the setup_ui function to initialize the UI components.
     - ui_handlers: Contains the update_plot function to update the plot in the UI.
-    - serial_handler: Contains functions to read from serial, connect to serial, and disconnect from serial.
+    - session: Contains functions to connect serial sessions, each with its own reader thread, and disconnect them.
     - handler_config: Contains the write_config function and permanent_command_entries list.
     - ui_context: Contains context-specific variables for the UI, such as baudrate_entry.
 """
 
 import tkinter as tk
 import threading
+import multiprocessing
 from ui_setup import setup_ui
 from ui_handlers import update_plot
-from serial_handler import read_serial, connect_serial, disconnect_serial
-from handler_config import write_config, permanent_command_entries
+from session import start_connect, disconnect_serial
+from handler_config import write_config, permanent_command_entries, settings
+from terminal_log import close_log
+from recorder import stop_recording
+from publisher import start_publishing, stop_publishing
+from pipeline_stats import start_exporter
 import ui_context as ctx  # Ensure ui_context is imported
 
 def main():
     """
-    Main function to initialize the GUI, start the serial thread, and handle application exit.
+    Main function to initialize the GUI and handle application exit.
     """
-    global stop_event, serial_thread, root, x_column_entry, y_columns_entry
+    global stop_event, root, x_column_entry, y_columns_entry
 
     # Initialize the main window
     root = tk.Tk()
     root.title("Microcontroller Interface")
 
     # Set up the UI components
-    x_column_entry, y_columns_entry = setup_ui(root, connect_serial, disconnect_serial)
+    x_column_entry, y_columns_entry = setup_ui(root, start_connect, disconnect_serial)
 
     # Event to signal thread termination
     stop_event = threading.Event()
-    # Start the serial reading thread
-    serial_thread = threading.Thread(target=read_serial, args=(stop_event,))
-    serial_thread.start()
+    # Export pipeline statistics periodically if configured
+    if settings["stats_export_path"]:
+        start_exporter(settings["stats_export_path"], settings["stats_export_seconds"], stop_event)
+    # Serve parsed samples to other local tools if configured
+    if settings["publish_address"]:
+        start_publishing(settings["publish_address"])
 
     def save_config():
         """
@@ -61,24 +69,33 @@ def main():
         
         config["final_text"] = ctx.final_text
 
+        # Save tunable settings
+        config.update(settings)
+
         write_config(config)
 
     def on_closing():
         """
         Function to handle application exit.
         """
-        stop_event.set()  # Signal the serial thread to stop
-        disconnect_serial()  # Disconnect the serial connection
+        stop_event.set()  # Signal the background threads to stop
+        if ctx.port_watcher is not None:
+            ctx.port_watcher.stop()  # Stop scanning for ports
+        disconnect_serial()  # Disconnect every serial session
         save_config()  # Save the current configuration
+        close_log()  # Flush the terminal log
+        stop_recording()  # Flush the capture file
+        stop_publishing()  # Disconnect the subscribers
         root.quit()  # Quit the Tkinter main loop
         root.destroy()  # Destroy the Tkinter window
 
     # Set up the window close protocol
     root.protocol("WM_DELETE_WINDOW", on_closing)
     # Schedule the plot update function
-    root.after(100, lambda: update_plot(root))
+    root.after(0, lambda: update_plot(root))
     # Start the Tkinter main loop
     root.mainloop()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Lets bundled builds start parse worker processes
     main()
@@ -0,0 +1,332 @@
+"""
+net_transport.py
+
+This module reaches serial devices over the network, such as boards on a remote USB
+hub or behind a ser2net box. A NetworkPort behaves like the serial port the readers,
+the writer and wait_ready expect, so a session connects to a URL exactly as it
+connects to a local port:
+    - socket://<host>:<port>: the raw byte stream of a TCP connection (ser2net "raw"
+      or "telnet" without options, socat and the like).
+    - rfc2217://<host>:<port>: a Telnet connection with RFC 2217 port control, through
+      pyserial, so the baud rate and the modem lines are set on the remote port.
+
+A dropped link does not end the session. The port reconnects in the background of
+its reads, waiting reconnect_initial seconds before the first attempt and twice as
+long after every failed one, up to reconnect_max. Writes fail while the link is down,
+and a write the peer does not take within WRITE_TIMEOUT counts as a dropped link, so
+a stalled peer cannot hold up the writer thread for good. When a new link is made,
+on_reconnect is called, so the reader can discard the partial line or frame the lost
+link left behind.
+
+Sockets are tuned for interactive traffic: TCP_NODELAY sends small commands at once,
+socket_buffer_bytes enlarges the kernel buffers for bursts, and keepalive notices
+links that die silently. Raw sockets are read in bulk, up to READ_LIMIT at a time.
+
+A reconnect replaces the socket, so network ports have no fixed file descriptor and
+are always read by a reader thread of their own rather than the shared engine.
+
+Functions:
+    - is_network_url: Checks whether a port name is a network URL.
+    - tune_socket: Sets the socket options for serial traffic.
+
+Classes:
+    - NetworkPort: A serial port stand-in for a device reached over TCP.
+"""
+
+import select
+import socket
+import threading
+import time
+import serial
+from handler_config import settings
+from pipeline_stats import count
+
+# Port names starting with these are opened as network ports
+NETWORK_SCHEMES = ("socket://", "rfc2217://")
+# How long opening a connection may take
+CONNECT_TIMEOUT = 5.0
+# Largest read from a raw socket, so a single read stays reasonably sized
+READ_LIMIT = 65536
+# How long a write may wait for the peer before the link counts as lost
+WRITE_TIMEOUT = 5.0
+
+
+def is_network_url(port):
+    """
+    Checks whether a port name is a network URL.
+
+    Args:
+        port (str): The port name.
+
+    Returns:
+        bool: True for socket:// and rfc2217:// URLs.
+    """
+    return port.startswith(NETWORK_SCHEMES)
+
+
+def tune_socket(sock):
+    """
+    Sets the socket options for serial traffic: no Nagle delay, larger buffers and
+    keepalive.
+
+    Args:
+        sock (socket.socket): The connected socket.
+    """
+    size = int(settings["socket_buffer_bytes"])
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if size > 0:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, size)
+    except OSError as e:
+        print(f"Socket option error: {e}")
+
+
+class NetworkPort:
+    """
+    A serial port stand-in for a device reached over TCP, which reconnects with backoff
+    when the link drops. Opening fails like a serial port does if the first connection
+    cannot be made.
+
+    Args:
+        url (str): A socket:// or rfc2217:// URL.
+        baudrate (int): The baud rate, set on the remote port for rfc2217://.
+        timeout (float): How long read() waits for data, like serial.Serial.timeout.
+
+    Raises:
+        serial.SerialException: If the first connection cannot be made.
+    """
+
+    def __init__(self, url, baudrate, timeout=1.0):
+        self.port = url
+        self.url = url
+        self.baudrate = baudrate
+        self.raw = url.startswith("socket://")
+        self.is_open = False
+        self.reconnects = 0
+        self.on_reconnect = None  # Called by the reading thread before the first read of a new link
+        self._fresh = False
+        self._timeout = timeout
+        self._link = None  # The socket, or the pyserial port for rfc2217://
+        self._lock = threading.Lock()
+        self._backoff = float(settings["reconnect_initial"])
+        self._retry_at = 0.0
+        try:
+            self._connect()
+        except (OSError, ValueError, serial.SerialException) as e:
+            raise serial.SerialException(f"Could not connect to {url}: {e}")
+        self.is_open = True
+
+    def _connect(self):
+        """
+        Makes the connection and tunes its socket.
+        """
+        if self.raw:
+            address = self.url[len("socket://"):].split("?")[0].split("/")[0]
+            host, _, port = address.rpartition(":")
+            sock = socket.create_connection((host, int(port)), timeout=CONNECT_TIMEOUT)
+            sock.settimeout(WRITE_TIMEOUT)  # Reads wait in select and never hit it
+            tune_socket(sock)
+            self._link = sock
+        else:
+            link = serial.serial_for_url(self.url, baudrate=self.baudrate, timeout=self._timeout,
+                                         write_timeout=WRITE_TIMEOUT)
+            if getattr(link, "_socket", None) is not None:
+                tune_socket(link._socket)
+            self._link = link
+
+    def _drop(self, error):
+        """
+        Closes a failed link and schedules the first reconnect attempt.
+        """
+        with self._lock:
+            if self._link is None:
+                return
+            try:
+                self._link.close()
+            except (OSError, serial.SerialException):
+                pass
+            self._link = None
+            self._backoff = float(settings["reconnect_initial"])
+            self._retry_at = time.monotonic() + self._backoff
+        if self.is_open:
+            print(f"Link to {self.url} lost: {error}")
+
+    def _ensure_link(self):
+        """
+        Returns the link, reconnecting first if it is down and the backoff has passed.
+
+        Returns:
+            object: The socket or pyserial port, or None while the link is down.
+        """
+        with self._lock:
+            if self._link is not None or not self.is_open:
+                return self._link
+            if time.monotonic() < self._retry_at:
+                return None
+            try:
+                self._connect()
+            except (OSError, ValueError, serial.SerialException):
+                self._backoff = min(self._backoff * 2, float(settings["reconnect_max"]))
+                self._retry_at = time.monotonic() + self._backoff
+                return None
+            self.reconnects += 1
+            count("reconnects")
+        print(f"Reconnected to {self.url}")
+        self._fresh = True
+        return self._link
+
+    @property
+    def connected(self):
+        """
+        bool: Whether the link is currently up.
+        """
+        return self._link is not None
+
+    @property
+    def timeout(self):
+        """
+        float: How long read() waits for data.
+        """
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self._timeout = value
+        link = self._link
+        if link is not None and not self.raw:
+            link.timeout = value
+
+    @property
+    def in_waiting(self):
+        """
+        int: The bytes known to be waiting. Raw sockets report 0 and are read in bulk anyway.
+        """
+        link = self._link
+        if link is None or self.raw:
+            return 0
+        try:
+            return link.in_waiting
+        except (OSError, serial.SerialException):
+            return 0
+
+    def read(self, size=1):
+        """
+        Reads what has arrived, waiting up to the timeout for the first byte. Raw sockets
+        return everything waiting, up to READ_LIMIT, even beyond size. While the
+        link is down, waits for the next reconnect attempt and returns nothing.
+
+        Args:
+            size (int): The number of bytes wanted.
+
+        Returns:
+            bytes: The received bytes, empty if none arrived in time.
+        """
+        link = self._ensure_link()
+        if self._fresh:
+            self._fresh = False
+            if self.on_reconnect is not None:
+                self.on_reconnect()
+        if link is None:
+            time.sleep(max(min(self._timeout or 0, self._retry_at - time.monotonic()), 0.01))
+            return b''
+        try:
+            if not self.raw:
+                return link.read(max(size, link.in_waiting))
+            readable, _, _ = select.select([link], [], [], self._timeout)
+            if not readable:
+                return b''
+            data = link.recv(READ_LIMIT)
+            if not data:
+                raise ConnectionResetError("connection closed by the remote end")
+            return data
+        except (OSError, ValueError, serial.SerialException) as e:
+            self._drop(e)
+            return b''
+
+    def write(self, data):
+        """
+        Sends data to the device. A write the peer does not take within WRITE_TIMEOUT
+        drops the link, like any other failure.
+
+        Args:
+            data (bytes): The data to send.
+
+        Returns:
+            int: The number of bytes sent.
+
+        Raises:
+            serial.SerialException: If the link is down or fails.
+        """
+        link = self._ensure_link()
+        if link is None:
+            raise serial.SerialException(f"{self.url} is disconnected")
+        try:
+            if self.raw:
+                link.sendall(data)
+            else:
+                link.write(data)
+        except (OSError, serial.SerialException) as e:
+            self._drop(e)
+            raise serial.SerialException(f"Write to {self.url} failed: {e}")
+        return len(data)
+
+    def flush(self):
+        """
+        Waits until written data has been handed to the network.
+        """
+        link = self._link
+        if link is not None and not self.raw:
+            link.flush()
+
+    def reset_input_buffer(self):
+        """
+        Discards received data not read yet.
+        """
+        link = self._link
+        if link is None:
+            return
+        if not self.raw:
+            link.reset_input_buffer()
+            return
+        while select.select([link], [], [], 0)[0]:
+            if not link.recv(READ_LIMIT):
+                break
+
+    @property
+    def dtr(self):
+        """
+        bool: The DTR line of the remote port; only rfc2217:// can set it.
+        """
+        return getattr(self._link, "dtr", True)
+
+    @dtr.setter
+    def dtr(self, value):
+        if self._link is not None and not self.raw:
+            self._link.dtr = value
+
+    @property
+    def rts(self):
+        """
+        bool: The RTS line of the remote port; only rfc2217:// can set it.
+        """
+        return getattr(self._link, "rts", True)
+
+    @rts.setter
+    def rts(self, value):
+        if self._link is not None and not self.raw:
+            self._link.rts = value
+
+    def close(self):
+        """
+        Closes the connection for good.
+        """
+        self.is_open = False
+        with self._lock:
+            if self._link is not None:
+                try:
+                    self._link.close()
+                except (OSError, serial.SerialException):
+                    pass
+                self._link = None
@@ -0,0 +1,296 @@
+"""
+parse_worker.py
+
+This module moves port reading, decoding and parsing of a session out of the UI process,
+so heavy traffic does not compete with Tk and matplotlib for the GIL. It is used when
+the parse_worker setting is on.
+
+The worker process owns the port. It parses every batch and appends the samples to a
+RingBuffer kept in a multiprocessing.shared_memory block, which the UI process reads
+as a RingBuffer over the same memory: the plot takes views of it at frame time without
+any copying. Received text lines are still passed to the UI for display, through a
+bounded queue; when that queue is full, lines are left out of the display but their
+samples are plotted all the same.
+
+Commands, recording and clearing are requested through a pipe. Recording runs in the
+worker, with its own recorder, and the worker's pipeline statistics are forwarded to
+the UI process regularly.
+
+Functions:
+    - forward_stats: Sends the worker's counters to the UI process.
+    - listen: Handles requests from the UI process inside the worker.
+    - run_worker: Runs the worker process.
+
+Classes:
+    - ParseWorker: Starts and controls a worker process from the UI process.
+"""
+
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+from data_buffer import RingBuffer
+from data_parser import parse_batch, project_samples, stamp_samples
+from handler_config import settings
+from recorder import start_recording, stop_recording, record_raw, record_samples
+from serial_handler import READ_CHUNK_SIZE, open_port, wait_ready, make_decoder
+import pipeline_stats
+
+# Batches that may wait for display in the UI process
+WORKER_QUEUE_BATCHES = 1000
+# How often the worker forwards its pipeline statistics
+WORKER_STATS_INTERVAL = 0.5
+# How long starting a worker waits for it to open its port and for the device to get ready
+WORKER_OPEN_TIMEOUT = 10.0
+# How long closing a worker waits for it to exit before terminating it
+WORKER_JOIN_TIMEOUT = 2.0
+
+
+def forward_stats(messages, sent):
+    """
+    Sends the growth of the worker's counters since the last call to the UI process.
+
+    Args:
+        messages (multiprocessing.Queue): The queue to the UI process.
+        sent (dict): The counter values sent so far, updated in place.
+    """
+    current = pipeline_stats.snapshot()["counters"]
+    delta = {name: value - sent.get(name, 0) for name, value in current.items() if value != sent.get(name, 0)}
+    if delta:
+        try:
+            messages.put_nowait(("stats", delta))
+        except queue.Full:
+            return
+        sent.update(current)
+
+
+def listen(control, port, messages, stop, clear):
+    """
+    Handles requests from the UI process until asked to stop. Runs in a thread of the
+    worker, so commands are sent without waiting for the reader.
+
+    Args:
+        control (multiprocessing.connection.Connection): The request pipe.
+        port (serial.Serial): The worker's port.
+        messages (multiprocessing.Queue): The queue to the UI process.
+        stop (threading.Event): Set to stop the worker.
+        clear (threading.Event): Set to have the reader clear the plot data.
+    """
+    while not stop.is_set():
+        try:
+            request, argument = control.recv()
+        except (EOFError, OSError):
+            request, argument = "stop", None
+        if request == "send":
+            try:
+                port.write(argument)
+            except Exception as e:
+                messages.put(("error", f"Write error: {e}"))
+        elif request == "record":
+            if argument:
+                start_recording()
+            else:
+                stop_recording()
+        elif request == "clear":
+            clear.set()
+        elif request == "stop":
+            stop.set()
+            port.close()
+
+
+def run_worker(name, baudrate, config, options, memory_name, time_origin, messages, control, recording):
+    """
+    Runs the worker process: opens the port and waits for the device to get ready, then
+    reads, decodes and parses everything it receives into the shared ring buffer until asked to stop or the port fails.
+
+    Args:
+        name (str): The port to open.
+        baudrate (int): The baud rate for the serial connection.
+        config (dict): The plot configuration of the session.
+        options (dict): The settings of the UI process.
+        memory_name (str): The name of the shared memory block holding the ring buffer.
+        time_origin (float): The host time the common time axis counts from.
+        messages (multiprocessing.Queue): Receives ("opened", error), ("batch", arrival
+            time, lines, time.monotonic() of arrival), ("stats", counters) and ("error", message) tuples.
+        control (multiprocessing.connection.Connection): The request pipe.
+        recording (bool): Whether to start recording right away.
+    """
+    settings.update(options)
+    columns = 2 + len(config["y_columns"])
+    memory = shared_memory.SharedMemory(name=memory_name)
+    store = RingBuffer(columns, settings["plot_capacity"], memory.buf)
+    try:
+        port = open_port(name, baudrate)
+        ready, preamble = wait_ready(port)
+    except Exception as e:
+        messages.put(("opened", str(e)))
+        del store
+        memory.close()
+        return
+    messages.put(("opened", None))
+    if recording:
+        start_recording()
+
+    stop = threading.Event()
+    clear = threading.Event()
+    threading.Thread(target=listen, args=(control, port, messages, stop, clear), daemon=True).start()
+    decoder = make_decoder()
+    if hasattr(port, "on_reconnect"):
+        port.on_reconnect = decoder.reset  # A network port's new link starts afresh
+    last_arrival = None
+    sent = {}
+    stats_time = time.monotonic()
+    try:
+        while not stop.is_set() and port.is_open:
+            if clear.is_set():
+                clear.clear()
+                store.clear()
+                last_arrival = None
+            try:
+                chunk = preamble or port.read(min(max(port.in_waiting, 1), READ_CHUNK_SIZE))
+            except Exception as e:
+                if not stop.is_set():
+                    messages.put(("error", f"Read error: {e}"))
+                break
+            preamble = b''  # Bytes wait_ready already read are handled first
+            if chunk:
+                timestamp = time.time()
+                arrived = time.monotonic()  # For command round-trip times in the UI process
+                pipeline_stats.count("bytes_read", len(chunk))
+                record_raw(chunk, timestamp, name)
+                batch = decoder.feed(chunk)
+                if batch is not None and len(batch):
+                    lines = batch if isinstance(batch, list) else None
+                    x, y = parse_batch(lines, config) if lines else project_samples(batch, config)
+                    block = stamp_samples(x, y, timestamp, last_arrival, time_origin, store.total)
+                    store.append(block)
+                    record_samples(block[:-1], timestamp, name)
+                    last_arrival = timestamp
+                    pipeline_stats.count("lines_read", block.shape[1])
+                    try:
+                        messages.put_nowait(("batch", timestamp, lines, arrived))
+                    except queue.Full:
+                        pipeline_stats.count("lines_dropped", block.shape[1])
+            if time.monotonic() - stats_time >= WORKER_STATS_INTERVAL:
+                forward_stats(messages, sent)
+                stats_time = time.monotonic()
+    finally:
+        stop.set()
+        port.close()
+        stop_recording()
+        forward_stats(messages, sent)
+        del store
+        memory.close()
+
+
+class ParseWorker:
+    """
+    Starts and controls a worker process from the UI process. The shared memory block
+    is created, and later removed, by the UI side; data_store reads it in place.
+
+    Args:
+        name (str): The port to open.
+        baudrate (int): The baud rate for the serial connection.
+        config (dict): The plot configuration of the session.
+        time_origin (float): The host time the common time axis counts from.
+        recording (bool): Whether the worker starts recording right away.
+        previous (RingBuffer): Samples to start from, if they have the same columns.
+    """
+
+    def __init__(self, name, baudrate, config, time_origin, recording=False, previous=None):
+        columns = 2 + len(config["y_columns"])
+        capacity = int(settings["plot_capacity"])
+        self.memory = shared_memory.SharedMemory(create=True, size=RingBuffer.buffer_size(columns, capacity))
+        self.data_store = RingBuffer(columns, capacity, self.memory.buf, initialize=True)
+        if previous is not None and previous.columns == columns and len(previous):
+            self.data_store.append([previous.column(i) for i in range(columns)])
+        # Spawn rather than fork: the UI process runs Tk and several threads
+        context = multiprocessing.get_context("spawn")
+        self.messages = context.Queue(WORKER_QUEUE_BATCHES)
+        self.control, worker_control = context.Pipe()
+        # Requests come from the UI thread and from the session's writer thread
+        self.control_lock = threading.Lock()
+        self.process = context.Process(
+            target=run_worker,
+            args=(name, baudrate, config, dict(settings), self.memory.name, time_origin,
+                  self.messages, worker_control, recording),
+            name=f"parse-worker {name}",
+            daemon=True
+        )
+
+    def start(self):
+        """
+        Starts the worker process and waits until it has opened its port.
+
+        Returns:
+            str: None on success, otherwise the reason the port could not be opened.
+        """
+        self.process.start()
+        try:
+            kind, error = self.messages.get(timeout=WORKER_OPEN_TIMEOUT)
+        except queue.Empty:
+            kind, error = "opened", "Parse worker did not start"
+        return error if kind == "opened" else f"Unexpected worker message: {kind}"
+
+    @property
+    def is_alive(self):
+        """
+        bool: Whether the worker process is running.
+        """
+        return self.process.is_alive()
+
+    def request(self, request, argument=None):
+        """
+        Sends a request to the worker: ("send", bytes), ("record", bool), ("clear", None)
+        or ("stop", None).
+
+        Args:
+            request (str): The request.
+            argument (object): Its argument.
+        """
+        if self.is_alive:
+            try:
+                with self.control_lock:
+                    self.control.send((request, argument))
+            except (BrokenPipeError, OSError) as e:
+                print(f"Worker error: {e}")
+
+    def drain(self):
+        """
+        Removes and returns all waiting messages of the worker.
+
+        Returns:
+            list: The messages, oldest first.
+        """
+        found = []
+        while True:
+            try:
+                found.append(self.messages.get_nowait())
+            except queue.Empty:
+                return found
+
+    def close(self):
+        """
+        Stops the worker process and removes the shared memory block. The samples are
+        copied into a regular RingBuffer first, so they stay available.
+
+        Returns:
+            RingBuffer: The copied samples.
+        """
+        self.request("stop")
+        self.process.join(WORKER_JOIN_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        shared = self.data_store
+        copy = RingBuffer(shared.columns, shared.capacity)
+        copy.append([shared.column(i) for i in range(shared.columns)])
+        self.data_store = copy
+        del shared
+        try:
+            self.memory.close()
+        except BufferError:
+            pass  # Plot lines may still hold views; the mapping goes away with them
+        self.memory.unlink()
+        return copy
@@ -0,0 +1,194 @@
+"""
+pipeline_stats.py
+
+This module collects lightweight counters and timers from each stage of the pipeline:
+bytes and lines read by the serial thread, data_queue depth, parse time per batch,
+plot draw time and the latency from arrival to on-screen.
+
+Stages record once per batch, never per line, under a single lock, so the overhead
+stays small enough to leave on all the time. Rates are derived by comparing two
+snapshots, so any number of viewers can take snapshots independently.
+
+Functions:
+    - count: Adds to a counter.
+    - set_gauge: Sets a gauge to its current value.
+    - observe: Records the duration of one run of a stage.
+    - observe_latency: Records arrival-to-screen latencies.
+    - snapshot: Returns a copy of all statistics, with rates since a previous snapshot.
+    - format_snapshot: Formats a snapshot for display.
+    - export_snapshots: Appends a snapshot to a file at a fixed interval.
+    - start_exporter: Starts the snapshot export thread.
+"""
+
+import bisect
+import json
+import threading
+import time
+import numpy as np
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, float('inf'))
+
+_lock = threading.Lock()
+counters = {}
+gauges = {}
+timers = {}  # name -> [runs, total seconds, longest run]
+latency_histogram = [0] * len(LATENCY_BUCKETS)
+
+def count(name, amount=1):
+    """
+    Adds to a counter.
+
+    Args:
+        name (str): The counter name.
+        amount (int): The amount to add.
+    """
+    with _lock:
+        counters[name] = counters.get(name, 0) + amount
+
+def set_gauge(name, value):
+    """
+    Sets a gauge to its current value.
+
+    Args:
+        name (str): The gauge name.
+        value (float): The current value.
+    """
+    gauges[name] = value
+
+def observe(name, seconds):
+    """
+    Records the duration of one run of a stage.
+
+    Args:
+        name (str): The stage name.
+        seconds (float): How long the run took.
+    """
+    with _lock:
+        timer = timers.setdefault(name, [0, 0.0, 0.0])
+        timer[0] += 1
+        timer[1] += seconds
+        timer[2] = max(timer[2], seconds)
+
+def observe_latency(latencies):
+    """
+    Records arrival-to-screen latencies in the latency histogram.
+
+    Args:
+        latencies (array-like): The latencies in seconds.
+    """
+    buckets = np.searchsorted(LATENCY_BUCKETS, latencies)
+    found = np.bincount(buckets, minlength=len(LATENCY_BUCKETS))
+    with _lock:
+        for i, amount in enumerate(found[:len(LATENCY_BUCKETS)]):
+            latency_histogram[i] += int(amount)
+
+def latency_percentile(histogram, fraction):
+    """
+    Estimates a latency percentile from the histogram.
+
+    Args:
+        histogram (list): The bucket counts.
+        fraction (float): The percentile as a fraction, e.g. 0.99.
+
+    Returns:
+        float: The upper bound of the bucket holding the percentile, or None without samples.
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    running = np.cumsum(histogram)
+    return LATENCY_BUCKETS[bisect.bisect_left(running.tolist(), fraction * total)]
+
+def snapshot(previous=None):
+    """
+    Returns a copy of all statistics. With a previous snapshot, per-second rates of
+    every counter since that snapshot are included as well.
+
+    Args:
+        previous (dict): An earlier snapshot, or None.
+
+    Returns:
+        dict: The statistics.
+    """
+    with _lock:
+        current = {
+            "time": time.time(),
+            "counters": dict(counters),
+            "gauges": dict(gauges),
+            "timers": {name: {"runs": runs, "mean_ms": total / runs * 1000 if runs else 0.0, "max_ms": longest * 1000}
+                       for name, (runs, total, longest) in timers.items()},
+            "latency_histogram": list(latency_histogram),
+        }
+    current["latency_ms"] = {
+        f"p{int(fraction * 100)}": None if value is None else value * 1000
+        for fraction in (0.5, 0.9, 0.99)
+        for value in [latency_percentile(current["latency_histogram"], fraction)]
+    }
+    if previous:
+        elapsed = max(current["time"] - previous["time"], 1e-9)
+        current["rates"] = {
+            name: (value - previous["counters"].get(name, 0)) / elapsed
+            for name, value in current["counters"].items()
+        }
+    return current
+
+def format_snapshot(stats):
+    """
+    Formats a snapshot for display.
+
+    Args:
+        stats (dict): A snapshot.
+
+    Returns:
+        str: One statistic per line.
+    """
+    rows = []
+    rates = stats.get("rates", {})
+    for name, value in sorted(stats["counters"].items()):
+        rate = f"{rates[name]:>12,.0f}/s" if name in rates else ""
+        rows.append(f"{name:<18}{value:>14,}{rate}")
+    for name, value in sorted(stats["gauges"].items()):
+        rows.append(f"{name:<18}{value:>14,}")
+    for name, timer in sorted(stats["timers"].items()):
+        rows.append(f"{name + ' ms':<18}{timer['mean_ms']:>14.2f} avg {timer['max_ms']:>8.2f} max")
+    for name, value in stats["latency_ms"].items():
+        shown = "-" if value is None else ("> 5000" if value == float('inf') else f"<= {value:g}")
+        rows.append(f"{'latency ' + name + ' ms':<18}{shown:>14}")
+    return "\n".join(rows)
+
+def export_snapshots(path, interval, stop_event):
+    """
+    Appends a snapshot, as one JSON line, to a file every interval seconds until
+    stop_event is set.
+
+    Args:
+        path (str): The file to append to.
+        interval (float): Seconds between snapshots.
+        stop_event (threading.Event): Stops the export.
+    """
+    previous = snapshot()
+    while not stop_event.wait(interval):
+        current = snapshot(previous)
+        try:
+            with open(path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(current, default=str) + "\n")
+        except OSError as e:
+            print(f"Stats export error: {e}")
+        previous = current
+
+def start_exporter(path, interval, stop_event):
+    """
+    Starts the snapshot export thread.
+
+    Args:
+        path (str): The file to append to.
+        interval (float): Seconds between snapshots.
+        stop_event (threading.Event): Stops the export.
+
+    Returns:
+        threading.Thread: The started thread.
+    """
+    thread = threading.Thread(target=export_snapshots, args=(path, interval, stop_event), daemon=True)
+    thread.start()
+    return thread
@@ -1,51 +1,76 @@
 """
 This module handles the creation and updating of plots using Matplotlib in a Tkinter window.
-It includes functions for creating the plot window, updating the plot data, and parsing incoming data.
+It includes functions for creating the plot window and updating the plot data.
+
+With a single session, each line plots a y column against the session's x column. With
+several sessions, the lines of all sessions are plotted against their arrival time, on
+the common time axis (see session.py).
+
+With the default "minmax" decimation, or the smoothed "mean", series are reduced from
+the pyramid of their plot data (see data_buffer.py), so zooming out over hours of
+samples costs no more than a short capture.
+
+Next to the plot, a panel shows the rolling statistics of every plotted column (see
+rolling_stats.py). They are kept up to date as samples arrive, so refreshing the
+panel never looks at the plot data.
+
+Matplotlib takes long to import, so it is only loaded when the first plot window is
+opened. The figure is created directly rather than through pyplot, which would also
+load pyplot's backend machinery and keep every figure alive after its window closed.
 
 Functions:
     - create_plot_window: Creates and displays a new plot window.
     - close_plot_window: Closes the plot window and cleans up.
+    - is_graph_visible: Checks whether the plot window is currently shown on screen.
+    - mark_plot_dirty: Requests a redraw on the next frame.
+    - connect_view_callbacks: Redraws the plot when its size or x range changes.
+    - record_draw_latency: Records the latency of the batches just drawn.
+    - plot_layout: Describes the lines needed to plot a set of sessions.
+    - create_lines: Creates one line per plotted column of each session.
     - update_graph: Updates the plot with new data.
+    - update_column_stats: Shows the rolling statistics of the plotted columns.
     - update_plot_config: Updates the plot configuration and redraws the plot.
     - recreate_plot_window: Recreates the plot window if it exists.
-    - parse_data: Parses incoming data for plotting.
 """
 
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import tkinter as tk
-from handler_config import plot_config
+from handler_config import settings
+from session import all_sessions
+from decimation import decimate, visible_slice
+from pipeline_stats import observe_latency
+from rolling_stats import format_stats
+import numpy as np
+import time
 import ui_context as ctx
-import re
 
-def create_plot_window(x_coords, y_coords):
+def create_plot_window(sessions):
     """
-    Creates and displays a new plot window with the given x and y coordinates.
+    Creates and displays a new plot window with the given data.
 
     Args:
-        x_coords (list): List of x coordinates.
-        y_coords (list of lists): List of y coordinate lists for multiple lines.
+        sessions (list): The sessions to plot.
 
     Returns:
         tuple: The created plot window, canvas, lines, axis, and figure.
     """
-    fig, ax = plt.subplots()
-    lines = []
-    for i, y in enumerate(y_coords):
-        line, = ax.plot(x_coords, y, label=f"Column{plot_config['y_columns'][i]+1}")
-        lines.append(line)
-    
-    try:
-        ax.legend()
-    except Exception as e:
-        print(f"Legend Error: {e}")
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+    fig = Figure()
+    ax = fig.add_subplot()
+    lines = create_lines(ax, sessions)
+    ctx.line_layout = plot_layout(sessions)
 
     graph_window = tk.Toplevel()
     graph_window.title("Plot Window")
     
+    column_stats = tk.Label(graph_window, justify=tk.LEFT, anchor=tk.NW, font=("Courier", 9))
+    column_stats.pack(side=tk.RIGHT, fill=tk.Y, padx=5, pady=5)
+
     canvas = FigureCanvasTkAgg(fig, master=graph_window)
+    connect_view_callbacks(canvas, ax)
     canvas.draw()
-    canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+    canvas.get_tk_widget().pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
     
     graph_window.protocol("WM_DELETE_WINDOW", lambda: close_plot_window(graph_window, canvas))
     
@@ -54,6 +79,10 @@ def create_plot_window(x_coords, y_coords):
     ctx.lines = lines
     ctx.ax = ax
     ctx.fig = fig
+    ctx.column_stats = column_stats
+    ctx.column_stats_time = 0.0
+    ctx.decimation_key = None
+    mark_plot_dirty()
 
     return graph_window, canvas, lines, ax, fig
 
@@ -66,44 +95,178 @@ def close_plot_window(graph_window, canvas):
         canvas (FigureCanvasTkAgg): The canvas to clean up.
     """
     if graph_window is not None:
+        ctx.pending_arrivals.clear()
         ctx.graph_button.config(text="Show Graph")
         canvas.get_tk_widget().pack_forget()
         graph_window.destroy()
 
-def update_graph(x_coords, y_coords, lines, ax, fig):
+def is_graph_visible():
+    """
+    Checks whether the plot window exists and is currently shown on screen.
+
+    Returns:
+        bool: False if the window is closed, minimized or withdrawn, True otherwise.
+    """
+    return bool(ctx.graph_window and ctx.graph_window.winfo_exists() and ctx.graph_window.winfo_viewable())
+
+def mark_plot_dirty(*args):
+    """
+    Requests a redraw on the next frame.
+    """
+    ctx.plot_dirty = True
+
+def record_draw_latency(*args):
+    """
+    Records the arrival-to-screen latency of the batches shown by the draw that just
+    finished.
+    """
+    if ctx.pending_arrivals:
+        observe_latency(time.time() - np.array(ctx.pending_arrivals))
+        ctx.pending_arrivals.clear()
+
+def connect_view_callbacks(canvas, ax):
+    """
+    Redraws the plot when its size or x range changes, since the decimated lines
+    depend on both, and measures the latency of every finished draw.
+
+    Args:
+        canvas (FigureCanvasTkAgg): The canvas showing the plot.
+        ax (matplotlib.axes.Axes): The axis showing the plot.
+    """
+    canvas.mpl_connect('resize_event', mark_plot_dirty)
+    canvas.mpl_connect('draw_event', record_draw_latency)
+    ax.callbacks.connect('xlim_changed', mark_plot_dirty)
+
+def plot_layout(sessions):
+    """
+    Describes the lines needed to plot a set of sessions, so a change of sessions or
+    plotted columns can be detected.
+
+    Args:
+        sessions (list): The sessions to plot.
+
+    Returns:
+        tuple: The name and plotted y columns of each session.
+    """
+    return tuple((session.name, tuple(session.plot_config["y_columns"])) for session in sessions)
+
+def create_lines(ax, sessions):
     """
-    Updates the plot with new data.
+    Creates one line per plotted column of each session. Lines are labelled with their
+    session's name when there is more than one session, and the x axis then shows time.
 
     Args:
-        x_coords (list): List of x coordinates.
-        y_coords (list of lists): List of y coordinate lists for multiple lines.
+        ax (matplotlib.axes.Axes): The axis to plot on.
+        sessions (list): The sessions to plot.
+
+    Returns:
+        list: The created line objects, in session and column order.
+    """
+    lines = []
+    for session in sessions:
+        prefix = f"{session.name} " if len(sessions) > 1 else ""
+        for col in session.plot_config["y_columns"]:
+            line, = ax.plot([], [], label=f"{prefix}Column{col+1}")
+            lines.append(line)
+    ax.set_xlabel("Time (s)" if len(sessions) > 1 else "")
+
+    try:
+        ax.legend()
+    except Exception as e:
+        print(f"Legend Error: {e}")
+    return lines
+
+def update_graph(sessions, lines, ax, fig):
+    """
+    Updates the plot with new data. Each series is decimated to about two points per
+    pixel of the axis width before it is handed to its line, from the coarsest level
+    of its min/max pyramid that still fills the width when there is one. Nothing is
+    redone unless the data, the axis width or the visible x range changed since the
+    last call.
+    The lines are recreated in place when the sessions or their plotted columns changed.
+
+    The plot data of a worker process may change while it is read. Its version is odd
+    during a change, and is compared before and after reading; if the data changed,
+    the result is incomplete and the plot should be updated again on the next frame.
+
+    Args:
+        sessions (list): The sessions to plot.
         lines (list): List of line objects to update.
         ax (matplotlib.axes.Axes): The axis to update.
         fig (matplotlib.figure.Figure): The figure to update.
+
+    Returns:
+        bool: False if the plot data changed while it was read, True otherwise.
     """
-    for i, y in enumerate(y_coords):
-        if i < len(lines):
-            lines[i].set_xdata(x_coords)
-            lines[i].set_ydata(y)
+    layout = plot_layout(sessions)
+    if layout != ctx.line_layout:
+        for line in lines:
+            line.remove()
+        lines[:] = create_lines(ax, sessions)
+        ctx.line_layout = layout
+        ctx.decimation_key = None
+
+    width = ax.bbox.width
+    view = None if ax.get_autoscalex_on() else ax.get_xlim()
+    versions = tuple(session.data_store.version for session in sessions)
+    if any(version % 2 for version in versions):
+        return False
+    key = (versions, layout, int(width), view, settings["decimation"])
+    if key == ctx.decimation_key:
+        return True
+    ctx.decimation_key = key
+
+    time_axis = len(sessions) > 1
+    series = iter(lines)
+    for session in sessions:
+        store = session.data_store
+        x_index = store.columns - 1 if time_axis else 0
+        x = store.column(x_index)
+        if view is None:
+            visible = slice(0, len(x))
+        elif time_axis:
+            # Arrival times only grow, so the visible range is found by bisection
+            visible = slice(max(int(np.searchsorted(x, view[0])) - 1, 0),
+                            min(int(np.searchsorted(x, view[1], side='right')) + 1, len(x)))
+        else:
+            visible = visible_slice(x, *view)
+        first, last = store.first_index + visible.start, store.first_index + visible.stop
+        for i in range(1, store.columns - 1):
+            reduced = None
+            if settings["decimation"] in ("minmax", "mean"):
+                reduced = store.overview(x_index, i, first, last, width, settings["decimation"])
+            if reduced is None:
+                reduced = decimate(x[visible], store.column(i)[visible], width, settings["decimation"])
+            next(series).set_data(*reduced)
     ax.relim()
     ax.autoscale_view()
     fig.canvas.draw_idle()
+    if tuple(session.data_store.version for session in sessions) != versions:
+        ctx.decimation_key = None
+        return False
+    return True
+
+def update_column_stats(sessions):
+    """
+    Shows the rolling statistics of the plotted columns of each session in the panel
+    next to the plot.
+
+    Args:
+        sessions (list): The plotted sessions.
+    """
+    panels = []
+    for session in sessions:
+        if session.stats is not None and session.stats.total:
+            panels.append(format_stats(session.name, session.plot_config["y_columns"], session.stats.results()))
+    ctx.column_stats.config(text="\n\n".join(panels))
 
 def update_plot_config():
     """
     Updates the plot configuration and redraws the plot.
     """
     if ctx.graph_window and ctx.graph_window.winfo_exists():
-        ctx.ax.clear()
-        ctx.lines = []
-        for i, y in enumerate(ctx.y_coords):
-            line, = ctx.ax.plot(ctx.x_coords, y, label=f"Column{plot_config['y_columns'][i]+1}")
-            ctx.lines.append(line)
-        try:
-            ctx.ax.legend()
-        except Exception as e:
-            print(f"Legend Error: {e}")
-        ctx.fig.canvas.draw_idle()
+        ctx.line_layout = None
+        mark_plot_dirty()
 
 def recreate_plot_window():
     """
@@ -111,38 +274,4 @@ def recreate_plot_window():
     """
     if ctx.graph_window and ctx.graph_window.winfo_exists():
         close_plot_window(ctx.graph_window, ctx.canvas)  # Close existing plot window
-    ctx.graph_window, ctx.canvas, ctx.lines, ctx.ax, ctx.fig = create_plot_window(ctx.x_coords, ctx.y_coords)  # Create a new plot window
-
-def parse_data(data):
-    """
-    Parses incoming data for plotting.
-
-    Args:
-        data (str): The incoming data as a string.
-
-    Returns:
-        tuple: The parsed x value and a list of parsed y values.
-    """
-    parts = data.strip().split('\t')
-    x_column = plot_config.get("x_column")
-    y_columns = plot_config.get("y_columns", [])
-
-    def extract_number(part):
-        match = re.search(r'[-+]?\d*\.?\d+', part)
-        return float(match.group()) if match else None
-
-    if not parts:
-        return None, []
-
-    x = None
-    if x_column is not None and 0 <= x_column < len(parts):
-        x = extract_number(parts[x_column])
-
-    y_values = []
-    for col in y_columns:
-        if 0 <= col < len(parts):
-            number = extract_number(parts[col])
-            if number is not None:
-                y_values.append(number)
-
-    return x, y_values
+    ctx.graph_window, ctx.canvas, ctx.lines, ctx.ax, ctx.fig = create_plot_window(all_sessions())  # Create a new plot window
@@ -0,0 +1,146 @@
+"""
+port_watcher.py
+
+This module keeps the list of serial ports current without blocking the UI. A watcher
+thread enumerates the ports, compares them with the previous scan and queues what was
+added and removed, for the UI to apply. It rescans every port_scan_seconds, and right
+away on udev events when the optional pyudev package is installed (Linux only).
+
+Ports are identified across re-enumeration by their USB serial number or, without one,
+their VID:PID, so a board that comes back under a different device name is still
+recognized.
+
+Functions:
+    - port_identity: Returns the identity of a port's device.
+    - matches_device: Checks whether a port belongs to a wanted device.
+    - make_udev_monitor: Creates a udev monitor for tty devices, if possible.
+
+Classes:
+    - PortWatcher: Enumerates the serial ports in the background and reports changes.
+"""
+
+import queue
+import threading
+import serial.tools.list_ports
+
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+def port_identity(info):
+    """
+    Returns the identity of a port's device.
+
+    Args:
+        info (ListPortInfo): The port, as listed by serial.tools.list_ports.
+
+    Returns:
+        str: The USB serial number, else "VID:PID" in hex, else None for ports without
+        USB information.
+    """
+    if info.serial_number:
+        return info.serial_number
+    if info.vid is not None and info.pid is not None:
+        return f"{info.vid:04X}:{info.pid:04X}"
+    return None
+
+def matches_device(info, wanted):
+    """
+    Checks whether a port belongs to a wanted device.
+
+    Args:
+        info (ListPortInfo): The port.
+        wanted (str): A USB serial number or "VID:PID" in hex.
+
+    Returns:
+        bool: True if the serial number or the VID:PID of the port matches.
+    """
+    wanted = wanted.strip().upper()
+    if info.serial_number and info.serial_number.upper() == wanted:
+        return True
+    return info.vid is not None and info.pid is not None and f"{info.vid:04X}:{info.pid:04X}" == wanted
+
+def make_udev_monitor():
+    """
+    Creates a udev monitor for tty devices, if pyudev is installed and udev is usable.
+
+    Returns:
+        pyudev.Monitor: The started monitor, or None.
+    """
+    if pyudev is None:
+        return None
+    try:
+        monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+        monitor.filter_by(subsystem='tty')
+        monitor.start()
+        return monitor
+    except Exception as e:
+        print(f"udev unavailable, polling for ports: {e}")
+        return None
+
+
+class PortWatcher:
+    """
+    Enumerates the serial ports in a background thread and reports changes. Each
+    change is queued on changes as an (added, removed) tuple of ListPortInfo lists;
+    the first scan is always reported, even when no ports were found.
+
+    Args:
+        interval (float): Seconds between scans when no udev event arrives.
+    """
+
+    def __init__(self, interval):
+        self.interval = max(float(interval), 0.1)
+        self.changes = queue.Queue()
+        self.ports = {}  # device name -> ListPortInfo
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts the watcher thread.
+        """
+        self._thread = threading.Thread(target=self._run, name="port-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the watcher thread after its current wait.
+        """
+        self._stop.set()
+
+    def scan(self, first=False):
+        """
+        Lists the ports and queues the differences to the previous scan.
+
+        Args:
+            first (bool): Whether to report the scan even if nothing changed.
+        """
+        try:
+            found = {info.device: info for info in serial.tools.list_ports.comports()}
+        except Exception as e:
+            print(f"Port scan error: {e}")
+            return
+        added = [found[device] for device in sorted(found.keys() - self.ports.keys())]
+        removed = [self.ports[device] for device in sorted(self.ports.keys() - found.keys())]
+        self.ports = found
+        if added or removed or first:
+            self.changes.put((added, removed))
+
+    def _run(self):
+        """
+        Runs the watcher thread: scans, then waits for a udev event or the interval.
+        """
+        monitor = make_udev_monitor()
+        self.scan(first=True)
+        while not self._stop.is_set():
+            if monitor is not None:
+                try:
+                    monitor.poll(timeout=self.interval)
+                except Exception as e:
+                    print(f"udev error, polling for ports: {e}")
+                    monitor = None
+            elif self._stop.wait(self.interval):
+                break
+            self.scan()
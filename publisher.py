@@ -0,0 +1,298 @@
+"""
+publisher.py
+
+This module streams parsed samples to other local tools, such as notebooks, dashboards
+and scripts, while the application keeps the port. Clients connect to a TCP or Unix
+socket given by the publish_address setting and receive every batch of samples the
+parse stage produces, from every session.
+
+Producers only put batches on a bounded queue, so publishing never slows down reading,
+parsing or the UI. A publisher thread encodes each batch once and hands it to every
+subscriber. Each subscriber has its own bounded channel and sender thread: a slow
+client loses its oldest batches (counted as publish_dropped) and never holds up
+anyone else.
+
+Message formats, chosen by the publish_format setting:
+    - ndjson: one JSON object per line with "source", "time" (host time of arrival),
+      "x_column", "y_columns" and "data", a list of columns (x, the y columns and the
+      arrival time on the common time axis). Missing values are null.
+    - binary: a header followed by its payload:
+        - magic (4 bytes): b"SMPL".
+        - source length (uint16), columns (uint16), samples (uint32).
+        - time (float64): Host time of arrival.
+      then the UTF-8 source name and the samples as float64 in column order, shaped
+      (columns, samples). All numbers are little-endian.
+
+Functions:
+    - start_publishing: Starts listening for subscribers.
+    - stop_publishing: Disconnects the subscribers and stops listening.
+    - is_publishing: Checks whether the publisher is running.
+    - publish_samples: Queues parsed samples for the subscribers.
+    - encode_batch: Encodes one batch of samples as a message.
+    - open_listener: Opens the listening socket for an address.
+    - accept_subscribers: Runs the thread accepting clients.
+    - publish_batches: Runs the publisher thread.
+
+Classes:
+    - Subscriber: One connected client with its own bounded buffer.
+"""
+
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+import numpy as np
+from channel import BoundedChannel
+from handler_config import settings
+from pipeline_stats import count
+
+# Batches that may wait for the publisher thread
+PUBLISH_QUEUE_BATCHES = 1000
+# Header of a binary message: magic, source length, columns, samples, time
+BINARY_HEADER = struct.Struct('<4sHHId')
+BINARY_MAGIC = b"SMPL"
+# How long sender and accept threads wait before re-checking whether to stop
+PUBLISH_POLL = 0.5
+
+publish_queue = queue.Queue(PUBLISH_QUEUE_BATCHES)
+publisher_thread = None
+listener = None
+subscribers = []
+_subscribers_lock = threading.Lock()
+_stop = threading.Event()
+
+
+def open_listener(address):
+    """
+    Opens the listening socket for an address.
+
+    Args:
+        address (str): tcp://<host>:<port> or unix://<path>.
+
+    Returns:
+        socket.socket: The listening socket.
+
+    Raises:
+        ValueError: If the address has an unknown scheme.
+        OSError: If the socket cannot be opened.
+    """
+    if address.startswith("tcp://"):
+        host, _, port = address[len("tcp://"):].rpartition(":")
+        server = socket.create_server((host or "127.0.0.1", int(port)))
+    elif address.startswith("unix://"):
+        path = address[len("unix://"):]
+        if os.path.exists(path):
+            os.unlink(path)  # Left over from an earlier run
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen()
+    else:
+        raise ValueError(f"Unknown publish address: {address}")
+    server.settimeout(PUBLISH_POLL)
+    return server
+
+
+def encode_batch(block, timestamp, source, config, output_format):
+    """
+    Encodes one batch of samples as a message.
+
+    Args:
+        block (numpy.ndarray): The samples, one row per column.
+        timestamp (float): The host time at which they arrived.
+        source (str): The session they came from.
+        config (dict): The plot configuration they were parsed with.
+        output_format (str): "ndjson" or "binary".
+
+    Returns:
+        bytes: The message.
+    """
+    if output_format == "binary":
+        name = source.encode()
+        data = np.ascontiguousarray(block, dtype='<f8')
+        return BINARY_HEADER.pack(BINARY_MAGIC, len(name), data.shape[0], data.shape[1], timestamp) + name + data.tobytes()
+    columns = np.where(np.isnan(block), None, block).tolist() if np.isnan(block).any() else block.tolist()
+    message = {
+        "source": source,
+        "time": timestamp,
+        "x_column": config.get("x_column"),
+        "y_columns": list(config.get("y_columns", [])),
+        "data": columns,
+    }
+    return (json.dumps(message) + "\n").encode()
+
+
+class Subscriber:
+    """
+    One connected client with its own bounded buffer, emptied by a sender thread.
+
+    Args:
+        connection (socket.socket): The client's socket.
+        name (str): The client's address, for messages.
+    """
+
+    def __init__(self, connection, name):
+        self.connection = connection
+        self.name = name
+        self.messages = BoundedChannel(settings["publish_buffer_batches"], "drop_oldest", "publish_dropped")
+        self.closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"subscriber {name}", daemon=True)
+        self._thread.start()
+
+    def offer(self, message):
+        """
+        Queues a message for the client, dropping its oldest ones if its buffer is full.
+
+        Args:
+            message (bytes): The encoded batch.
+        """
+        self.messages.put(message)
+
+    def close(self):
+        """
+        Disconnects the client.
+        """
+        self.closed.set()
+        try:
+            self.connection.close()
+        except OSError:
+            pass
+
+    def _run(self):
+        """
+        Runs the sender thread: writes queued messages until the client goes away.
+        """
+        try:
+            while not self.closed.is_set():
+                if self.messages.wait(PUBLISH_POLL):
+                    data = b"".join(self.messages.drain())
+                    self.connection.sendall(data)
+                    count("bytes_published", len(data))
+        except OSError:
+            pass  # The client disconnected
+        self.close()
+
+
+def accept_subscribers(server):
+    """
+    Accepts clients until the publisher stops.
+
+    Args:
+        server (socket.socket): The listening socket.
+    """
+    while not _stop.is_set():
+        try:
+            connection, address = server.accept()
+        except socket.timeout:
+            continue
+        except OSError:
+            break
+        connection.settimeout(None)
+        subscriber = Subscriber(connection, str(address or "unix"))
+        with _subscribers_lock:
+            subscribers.append(subscriber)
+
+
+def publish_batches(batches):
+    """
+    Runs the publisher thread: encodes each queued batch once and offers it to every
+    subscriber, until a None batch arrives.
+
+    Args:
+        batches (queue.Queue): The batches, as (block, timestamp, source, config) tuples.
+    """
+    while True:
+        batch = batches.get()
+        if batch is None:
+            return
+        with _subscribers_lock:
+            subscribers[:] = [subscriber for subscriber in subscribers if not subscriber.closed.is_set()]
+            current = list(subscribers)
+        if not current:
+            continue
+        message = encode_batch(*batch, settings["publish_format"])
+        for subscriber in current:
+            subscriber.offer(message)
+
+
+def start_publishing(address):
+    """
+    Starts listening for subscribers on an address.
+
+    Args:
+        address (str): tcp://<host>:<port> or unix://<path>.
+
+    Returns:
+        bool: True if the publisher was started, False if it was already running or
+        could not listen.
+    """
+    global publisher_thread, publish_queue, listener
+    if is_publishing():
+        return False
+    try:
+        listener = open_listener(address)
+    except (OSError, ValueError) as e:
+        print(f"Publish error: {e}")
+        return False
+    _stop.clear()
+    publish_queue = queue.Queue(PUBLISH_QUEUE_BATCHES)
+    threading.Thread(target=accept_subscribers, args=(listener,), name="publish-accept", daemon=True).start()
+    publisher_thread = threading.Thread(target=publish_batches, args=(publish_queue,), name="publisher", daemon=True)
+    publisher_thread.start()
+    return True
+
+
+def stop_publishing():
+    """
+    Disconnects the subscribers, stops listening and stops the publisher thread. A
+    Unix socket's file is removed.
+    """
+    global publisher_thread, listener
+    if publisher_thread is None:
+        return
+    _stop.set()
+    publish_queue.put(None)
+    publisher_thread.join()
+    publisher_thread = None
+    path = listener.getsockname() if listener.family == getattr(socket, "AF_UNIX", None) else None
+    listener.close()
+    listener = None
+    if path:
+        try:
+            os.unlink(path)
+        except OSError as e:
+            print(f"Publish error: {e}")
+    with _subscribers_lock:
+        for subscriber in subscribers:
+            subscriber.close()
+        subscribers.clear()
+
+
+def is_publishing():
+    """
+    Checks whether the publisher is running.
+
+    Returns:
+        bool: True while the publisher thread is running.
+    """
+    return publisher_thread is not None and publisher_thread.is_alive()
+
+
+def publish_samples(block, timestamp, source="", config=None):
+    """
+    Queues parsed samples for the subscribers. Does nothing unless the publisher is
+    running and has subscribers; never blocks.
+
+    Args:
+        block (numpy.ndarray): The samples, one row per column, not modified afterwards.
+        timestamp (float): The host time at which they arrived.
+        source (str): The session they came from.
+        config (dict): The plot configuration they were parsed with.
+    """
+    if not subscribers or not is_publishing():
+        return
+    try:
+        publish_queue.put_nowait((block, timestamp, source, config or {}))
+    except queue.Full:
+        count("publish_dropped")
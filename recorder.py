@@ -0,0 +1,162 @@
+"""
+recorder.py
+
+This module records received data to disk without slowing down reading or plotting.
+Producers only put records on a queue; a writer thread appends them to capture files
+through a large write buffer and starts a new file once the current one reaches the
+configured size or age. Data from each source (serial session) goes to its own series
+of capture files, so every capture can be replayed on its own.
+
+Capture files are a sequence of records. Each record is a header followed by its
+payload:
+    - kind (uint8): RAW_RECORD for received bytes, SAMPLES_RECORD for parsed samples.
+    - timestamp (float64): Host time (time.time()) at which the data arrived.
+    - rows (uint32): For samples, the number of columns; 0 for raw bytes.
+    - size (uint32): The payload size in bytes.
+Sample payloads are float64 arrays shaped (rows, n) in C order.
+
+Functions:
+    - start_recording: Starts the writer thread, which opens capture files as data arrives.
+    - stop_recording: Flushes and closes the capture and stops the writer thread.
+    - is_recording: Checks whether a recording is running.
+    - record_raw: Queues received bytes for recording.
+    - record_samples: Queues parsed samples for recording.
+    - write_records: Runs the writer thread.
+"""
+
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import numpy as np
+from handler_config import EXECUTABLE_PATH, settings
+
+# Directory holding the capture files
+CAPTURE_DIR = os.path.join(EXECUTABLE_PATH, "captures")
+# Writes are collected in a buffer of this size before they reach the disk
+RECORD_BUFFER_SIZE = 4 << 20
+# Record header: kind, timestamp, rows, size
+RECORD_HEADER = struct.Struct('<BdII')
+RAW_RECORD = 0
+SAMPLES_RECORD = 1
+# Runs of characters in a source name that are replaced in capture file names
+SOURCE_UNSAFE = re.compile(r'[^A-Za-z0-9.-]+')
+
+record_queue = queue.Queue()
+recorder_thread = None
+
+def start_recording():
+    """
+    Starts the writer thread, which opens a capture file for each source as its data arrives.
+
+    Returns:
+        bool: True if a new recording was started, False if one was already running.
+    """
+    global recorder_thread, record_queue
+    if is_recording():
+        return False
+    record_queue = queue.Queue()
+    recorder_thread = threading.Thread(target=write_records, args=(record_queue,), daemon=True)
+    recorder_thread.start()
+    return True
+
+def stop_recording():
+    """
+    Flushes and closes the current capture file and stops the writer thread. Records
+    queued before the call are still written.
+    """
+    global recorder_thread
+    if recorder_thread is not None:
+        record_queue.put(None)
+        recorder_thread.join()
+        recorder_thread = None
+
+def is_recording():
+    """
+    Checks whether a recording is running.
+
+    Returns:
+        bool: True while the writer thread is running.
+    """
+    return recorder_thread is not None and recorder_thread.is_alive()
+
+def record_raw(data, timestamp, source=""):
+    """
+    Queues received bytes for recording. Does nothing unless a recording is running.
+
+    Args:
+        data (bytes): The received bytes.
+        timestamp (float): The host time at which they arrived.
+        source (str): The name of the session the bytes came from.
+    """
+    if is_recording():
+        record_queue.put((source, RAW_RECORD, timestamp, 0, bytes(data)))
+
+def record_samples(samples, timestamp, source=""):
+    """
+    Queues parsed samples for recording. Does nothing unless a recording is running.
+
+    Args:
+        samples (numpy.ndarray): The samples, shaped (columns, n).
+        timestamp (float): The host time at which they arrived.
+        source (str): The name of the session the samples came from.
+    """
+    if is_recording():
+        samples = np.ascontiguousarray(samples, dtype=np.float64)
+        record_queue.put((source, SAMPLES_RECORD, timestamp, samples.shape[0], samples.tobytes()))
+
+def open_capture(sequence, source=""):
+    """
+    Opens a new capture file, named after the current date and time and the source.
+    Existing captures are never overwritten: if the name is taken, for instance by a
+    recording restarted within the same second, the sequence number is increased.
+
+    Args:
+        sequence (int): The number of the file within this recording.
+        source (str): The name of the session recorded to the file.
+
+    Returns:
+        file: The opened capture file.
+    """
+    os.makedirs(CAPTURE_DIR, exist_ok=True)
+    tag = SOURCE_UNSAFE.sub('_', source).strip('_')
+    prefix = time.strftime("capture_%Y%m%d_%H%M%S") + (f"_{tag}" if tag else "")
+    while True:
+        try:
+            return open(os.path.join(CAPTURE_DIR, f"{prefix}_{sequence:03d}.bin"), 'xb', buffering=RECORD_BUFFER_SIZE)
+        except FileExistsError:
+            sequence += 1
+
+def write_records(records):
+    """
+    Writes queued records until a None record arrives. Each source gets its own capture
+    file, opened with its first record. A new capture file is started when the current
+    one exceeds record_max_bytes or is older than record_max_seconds.
+
+    Args:
+        records (queue.Queue): The records to write, as (source, kind, timestamp, rows, payload) tuples.
+    """
+    captures = {}  # source -> [file, sequence, opened, written]
+    try:
+        while True:
+            record = records.get()
+            if record is None:
+                break
+            source, kind, timestamp, rows, payload = record
+            capture = captures.get(source)
+            if capture is not None and (capture[3] >= settings["record_max_bytes"]
+                                        or time.monotonic() - capture[2] >= settings["record_max_seconds"]):
+                capture[0].close()
+                capture = captures[source] = [open_capture(capture[1] + 1, source), capture[1] + 1, time.monotonic(), 0]
+            elif capture is None:
+                capture = captures[source] = [open_capture(0, source), 0, time.monotonic(), 0]
+            capture[0].write(RECORD_HEADER.pack(kind, timestamp, rows, len(payload)))
+            capture[0].write(payload)
+            capture[3] += RECORD_HEADER.size + len(payload)
+    except OSError as e:
+        print(f"Record error: {e}")
+    finally:
+        for capture in captures.values():
+            capture[0].close()
@@ -0,0 +1,190 @@
+"""
+replay.py
+
+This module plays back recorded captures (see recorder.py) through the live pipeline.
+A ReplayPort behaves like the serial port read_serial expects: it hands out the raw
+bytes of the capture, paced by their recorded timestamps at 1x, N x or maximum speed,
+so replayed data goes through exactly the same decode, parse and plot path as live data.
+
+The capture is memory-mapped, so even very large files are not loaded into memory.
+
+Functions:
+    - open_replay: Opens a replay port from a replay:// URL.
+
+Classes:
+    - ReplayPort: A serial port stand-in that plays back a capture file.
+"""
+
+import mmap
+import time
+from recorder import RECORD_HEADER, RAW_RECORD
+
+# Port names starting with this open a replay instead of a serial port
+REPLAY_SCHEME = "replay://"
+# Upper bound reported by in_waiting, so a single read stays reasonably sized
+READ_LIMIT = 1 << 20
+
+
+class ReplayPort:
+    """
+    A serial port stand-in that plays back the raw records of a capture file.
+
+    Args:
+        path (str): The capture file.
+        speed (float): The playback speed; 1 is real time, 0 or less plays as fast as possible.
+        timeout (float): How long read() waits for data, like serial.Serial.timeout.
+    """
+
+    def __init__(self, path, speed=1.0, timeout=1.0):
+        self.port = path
+        self.speed = float(speed)
+        self.timeout = timeout
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file cannot be mapped
+            self._map = b''
+        self._offset = 0     # Offset of the next record header
+        self._record = None  # [timestamp, read position, end] of the record being read
+        self._origin = None  # (monotonic time, capture time) playback started at
+        self.finished = False
+        self.is_open = True
+
+    def _next_record(self, offset):
+        """
+        Finds the first raw record at or after an offset.
+
+        Args:
+            offset (int): The offset of a record header.
+
+        Returns:
+            list: [timestamp, payload start, payload end], or None at the end of the capture.
+        """
+        size = len(self._map)
+        while offset + RECORD_HEADER.size <= size:
+            kind, timestamp, rows, length = RECORD_HEADER.unpack_from(self._map, offset)
+            start = offset + RECORD_HEADER.size
+            end = start + length
+            if end > size:
+                return None  # Truncated by an interrupted recording
+            if kind == RAW_RECORD and length:
+                return [timestamp, start, end]
+            offset = end
+        return None
+
+    def _wait_for(self, timestamp):
+        """
+        Returns how long until data recorded at a timestamp is due.
+
+        Args:
+            timestamp (float): The recorded host time.
+
+        Returns:
+            float: Seconds until the data is due; zero or less if it is due now.
+        """
+        if self.speed <= 0:
+            return 0.0
+        if self._origin is None:
+            self._origin = (time.monotonic(), timestamp)
+        started, first = self._origin
+        return started + (timestamp - first) / self.speed - time.monotonic()
+
+    @property
+    def in_waiting(self):
+        """
+        int: The number of bytes that are due and can be read without waiting.
+        """
+        count = 0
+        record = self._record
+        offset = self._offset
+        while count < READ_LIMIT:
+            if record is None:
+                record = self._next_record(offset)
+                if record is None:
+                    break
+                offset = record[2]
+            timestamp, position, end = record
+            if self._wait_for(timestamp) > 0:
+                break
+            count += end - position
+            record = None
+        return min(count, READ_LIMIT)
+
+    def read(self, size=1):
+        """
+        Reads up to size bytes of data that is due, waiting up to the timeout for the
+        first byte.
+
+        Args:
+            size (int): The maximum number of bytes to read.
+
+        Returns:
+            bytes: The data read; empty on timeout or at the end of the capture.
+        """
+        if not self.is_open:
+            raise ValueError("Replay port is closed")
+        data = bytearray()
+        deadline = time.monotonic() + self.timeout
+        while len(data) < size:
+            if self._record is None:
+                self._record = self._next_record(self._offset)
+                if self._record is None:
+                    self.finished = True
+                    break
+                self._offset = self._record[2]
+            timestamp, position, end = self._record
+            wait = self._wait_for(timestamp)
+            if wait > 0:
+                remaining = deadline - time.monotonic()
+                if data or remaining <= 0:
+                    break
+                time.sleep(min(wait, remaining))
+                continue
+            take = min(size - len(data), end - position)
+            data += self._map[position:position + take]
+            self._record[1] += take
+            if self._record[1] >= end:
+                self._record = None
+        if not data and self.finished:
+            # Behave like an idle port instead of returning immediately forever
+            time.sleep(max(deadline - time.monotonic(), 0))
+        return bytes(data)
+
+    def write(self, data):
+        """
+        Discards written data; a replay has no device to send to.
+
+        Args:
+            data (bytes): The data to write.
+
+        Returns:
+            int: The number of bytes "written".
+        """
+        return len(data)
+
+    def close(self):
+        """
+        Closes the capture file.
+        """
+        if self.is_open:
+            self.is_open = False
+            if isinstance(self._map, mmap.mmap):
+                self._map.close()
+            self._file.close()
+
+
+def open_replay(url):
+    """
+    Opens a replay port from a URL of the form replay://<path>[?speed=<n>], where a
+    speed of 0 or "max" plays the capture as fast as possible.
+
+    Args:
+        url (str): The replay URL.
+
+    Returns:
+        ReplayPort: The opened replay port.
+    """
+    path, _, query = url[len(REPLAY_SCHEME):].partition('?speed=')
+    speed = query.strip().lower() if query else "1"
+    return ReplayPort(path, 0 if speed == "max" else float(speed))
@@ -0,0 +1,202 @@
+"""
+rolling_stats.py
+
+This module keeps live statistics of the plotted y columns of a session, updated from
+each batch of samples as it is appended, so nothing is ever recomputed from the stored
+history:
+    - count, mean and standard deviation of every sample since the last reset, merged
+      batch by batch with Welford's (Chan's parallel) update.
+    - mean and standard deviation over the last stats_window samples, from running sums
+      that add each incoming and subtract each outgoing sample. The sums are recomputed
+      from the window once per window length, so rounding errors cannot build up.
+    - minimum and maximum over the same window, from monotonic deques. Only the
+      samples of a batch that can still become the window's extreme are pushed.
+    - rate of change over the window, per second of arrival time.
+Missing values (NaN) are left out of every statistic.
+
+Every update is O(1) per sample, amortized.
+
+Functions:
+    - format_stats: Formats the statistics of a session for display.
+
+Classes:
+    - RollingStats: Incremental statistics of the y columns of a session.
+"""
+
+from collections import deque
+import numpy as np
+
+
+class RollingStats:
+    """
+    Incremental statistics of the y columns of a session.
+
+    Args:
+        columns (int): The number of y columns.
+        window (int): The number of most recent samples the window statistics cover.
+    """
+
+    def __init__(self, columns, window):
+        self.columns = columns
+        self.window = max(int(window), 1)
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets all samples.
+        """
+        columns, window = self.columns, self.window
+        self.total = 0  # Samples seen, with or without values
+        self.count = np.zeros(columns, dtype=np.int64)
+        self.mean = np.zeros(columns)
+        self.m2 = np.zeros(columns)
+        self._values = np.full((columns, window), np.nan)
+        self._times = np.full(window, np.nan)
+        self._shift = np.full(columns, np.nan)  # Offset the window sums are kept relative to
+        self._sum = np.zeros(columns)
+        self._squares = np.zeros(columns)
+        self._present = np.zeros(columns, dtype=np.int64)
+        self._since_exact = 0
+        self._lows = [deque() for _ in range(columns)]   # (index, value), values rising
+        self._highs = [deque() for _ in range(columns)]  # (index, -value), values falling
+
+    def update(self, block):
+        """
+        Adds a batch of samples.
+
+        Args:
+            block (numpy.ndarray): The samples as stored in the plot data: x, the y
+                columns and the arrival time, one row each.
+        """
+        values = np.asarray(block[1:-1], dtype=float)
+        times = np.asarray(block[-1], dtype=float)
+        n = values.shape[1]
+        if n == 0 or values.shape[0] != self.columns:
+            return
+        self._merge(values)
+        indices = np.arange(self.total, self.total + n)
+        self.total += n
+        if n > self.window:
+            values, times, indices = values[:, -self.window:], times[-self.window:], indices[-self.window:]
+        self._slide(values, times, indices)
+        for column in range(self.columns):
+            present = ~np.isnan(values[column])
+            self._push(self._lows[column], indices[present], values[column][present])
+            self._push(self._highs[column], indices[present], -values[column][present])
+
+    def _merge(self, values):
+        """
+        Merges a batch into the all-time count, mean and sum of squared deviations.
+        """
+        present = ~np.isnan(values)
+        count = present.sum(axis=1)
+        filled = np.where(present, values, 0.0)
+        mean = filled.sum(axis=1) / np.maximum(count, 1)
+        m2 = (np.where(present, values - mean[:, None], 0.0) ** 2).sum(axis=1)
+        total = self.count + count
+        delta = mean - self.mean
+        share = count / np.maximum(total, 1)
+        self.mean = np.where(count > 0, self.mean + delta * share, self.mean)
+        self.m2 = np.where(count > 0, self.m2 + m2 + delta ** 2 * self.count * share, self.m2)
+        self.count = total
+
+    def _slide(self, values, times, indices):
+        """
+        Writes a batch into the window, updating the window sums by what comes in and
+        what drops out.
+        """
+        slots = indices % self.window
+        outgoing = self._values[:, slots]
+        first = np.isnan(self._shift)
+        if first.any():
+            starts = np.array([row[~np.isnan(row)][0] if (~np.isnan(row)).any() else np.nan for row in values])
+            self._shift = np.where(first, starts, self._shift)
+        shift = np.nan_to_num(self._shift)[:, None]
+        incoming = values - shift
+        outgoing = outgoing - shift
+        self._sum += np.nansum(incoming, axis=1) - np.nansum(outgoing, axis=1)
+        self._squares += np.nansum(incoming ** 2, axis=1) - np.nansum(outgoing ** 2, axis=1)
+        self._present += (~np.isnan(incoming)).sum(axis=1) - (~np.isnan(outgoing)).sum(axis=1)
+        self._values[:, slots] = values
+        self._times[slots] = times
+        self._since_exact += len(indices)
+        if self._since_exact >= self.window:
+            window = self._values - shift
+            self._sum = np.nansum(window, axis=1)
+            self._squares = np.nansum(window ** 2, axis=1)
+            self._present = (~np.isnan(window)).sum(axis=1)
+            self._since_exact = 0
+
+    def _push(self, extremes, indices, values):
+        """
+        Pushes a batch into a monotonic deque of window minima (negate the values for
+        maxima). Only the suffix minima of the batch, the samples smaller than every
+        later one, can ever be the window minimum, so only they are pushed.
+        """
+        if len(values):
+            later = np.minimum.accumulate(values[::-1])[::-1]
+            keep = np.append(values[:-1] < later[1:], True)
+            lowest = later[0]
+            while extremes and extremes[-1][1] >= lowest:
+                extremes.pop()
+            extremes.extend(zip(indices[keep].tolist(), values[keep].tolist()))
+        oldest = self.total - self.window
+        while extremes and extremes[0][0] < oldest:
+            extremes.popleft()
+
+    def results(self):
+        """
+        Returns the current statistics.
+
+        Returns:
+            list: One dict per y column with "count", "mean", "std", "window_mean",
+            "window_std", "min", "max" and "rate"; NaN where there are no values.
+        """
+        present = np.maximum(self._present, 1)
+        window_mean = self._sum / present
+        window_var = np.maximum(self._squares / present - window_mean ** 2, 0.0)
+        newest = (self.total - 1) % self.window
+        oldest = self.total % self.window if self.total >= self.window else 0
+        elapsed = self._times[newest] - self._times[oldest]
+        found = []
+        for column in range(self.columns):
+            has = self._present[column] > 0
+            lows, highs = self._lows[column], self._highs[column]
+            found.append({
+                "count": int(self.count[column]),
+                "mean": float(self.mean[column]) if self.count[column] else np.nan,
+                "std": float(np.sqrt(self.m2[column] / self.count[column])) if self.count[column] else np.nan,
+                "window_mean": float(window_mean[column] + self._shift[column]) if has else np.nan,
+                "window_std": float(np.sqrt(window_var[column])) if has else np.nan,
+                "min": lows[0][1] if lows else np.nan,
+                "max": -highs[0][1] if highs else np.nan,
+                "rate": float((self._values[column, newest] - self._values[column, oldest]) / elapsed)
+                        if self.total > 1 and elapsed > 0 else np.nan,
+            })
+        return found
+
+
+def format_stats(name, y_columns, results):
+    """
+    Formats the statistics of a session for display.
+
+    Args:
+        name (str): The session name.
+        y_columns (list): The plotted column indices.
+        results (list): The statistics, as returned by RollingStats.results.
+
+    Returns:
+        str: A few lines per column.
+    """
+    rows = []
+    for column, stats in zip(y_columns, results):
+        rows.append(
+            f"{name} Column{column + 1}\n"
+            f"  samples  {stats['count']:,}\n"
+            f"  mean     {stats['mean']:.6g}\n"
+            f"  std      {stats['std']:.6g}\n"
+            f"  window   mean {stats['window_mean']:.6g}, std {stats['window_std']:.6g}\n"
+            f"           min {stats['min']:.6g}, max {stats['max']:.6g}\n"
+            f"           rate {stats['rate']:.6g}/s"
+        )
+    return "\n".join(rows)
@@ -0,0 +1,187 @@
+"""
+serial_engine.py
+
+This module services many serial ports from a single thread. Each port's file
+descriptor is registered with a selector, and the engine thread sleeps in select()
+until bytes arrive on one of them, so idle ports cost no CPU at all. Whatever is
+waiting on a ready port is read at once and handed to deliver_chunk, exactly as the
+per-port read_serial threads do.
+
+Only ports with a selectable file descriptor can be registered: serial ports on
+Linux and macOS. Sessions fall back to a read_serial thread for anything else, such
+as capture replays or serial ports on Windows.
+
+Because one thread services every port, a full queue with the "block" policy pauses
+reading from all ports until the UI catches up; the data waits in the OS buffers. For
+the same reason, registered ports are read without blocking: a readiness wakeup with
+nothing to read returns at once instead of holding up every other port.
+
+A port whose read fails is dropped from the selector, closed and its stop event set,
+as the session's connection is gone; the UI then reports it as disconnected.
+
+Classes:
+    - SerialEngine: A single-threaded, selector-based reader for many ports.
+"""
+
+import selectors
+import socket
+import threading
+from serial_handler import READ_CHUNK_SIZE, deliver_chunk
+
+# How long unregister waits for the engine thread to let go of a port
+UNREGISTER_TIMEOUT = 1.0
+
+
+class SerialEngine:
+    """
+    A single-threaded, selector-based reader for many ports. The selector is only
+    touched by the engine thread; register and unregister post their changes and
+    wake the thread through a socket pair.
+    """
+
+    def __init__(self):
+        self._selector = None
+        self._wake_read = None
+        self._wake_write = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._pending = []  # (port, reader arguments or None to unregister, done event)
+
+    @staticmethod
+    def supports(port):
+        """
+        Checks whether a port can be serviced by the engine.
+
+        Args:
+            port (object): The opened port.
+
+        Returns:
+            bool: True if the port has a selectable file descriptor.
+        """
+        try:
+            return port.fileno() >= 0
+        except (AttributeError, OSError, ValueError):
+            return False
+
+    def _start(self):
+        """
+        Creates the selector and starts the engine thread on first use.
+        """
+        if self._thread is not None:
+            return
+        self._selector = selectors.DefaultSelector()
+        self._wake_read, self._wake_write = socket.socketpair()
+        self._wake_read.setblocking(False)
+        self._wake_write.setblocking(False)
+        self._selector.register(self._wake_read, selectors.EVENT_READ)
+        self._thread = threading.Thread(target=self._run, name="serial-engine", daemon=True)
+        self._thread.start()
+
+    def _post(self, port, reader):
+        """
+        Queues a registration change for the engine thread and wakes it.
+
+        Returns:
+            threading.Event: Set once the change has been applied.
+        """
+        done = threading.Event()
+        with self._lock:
+            self._start()
+            self._pending.append((port, reader, done))
+        try:
+            self._wake_write.send(b'\0')
+        except BlockingIOError:
+            pass  # Already woken
+        return done
+
+    def register(self, port, decoder, channel, stop_event, source="", listener=None):
+        """
+        Starts servicing a port.
+
+        Args:
+            port (serial.Serial): The opened port.
+            decoder (LineDecoder or FrameDecoder): Decodes the received bytes.
+            channel (BoundedChannel): Receives the decoded batches.
+            stop_event (threading.Event): Stops a blocked put when set.
+            source (str): The name the raw bytes are recorded under.
+            listener (function): Called with each list of text lines, see deliver_chunk.
+        """
+        port.timeout = 0  # Reads return what is waiting and never block the engine thread
+        self._post(port, (decoder, channel, stop_event, source, listener))
+
+    def unregister(self, port):
+        """
+        Stops servicing a port. Waits until the engine no longer reads from it, so the
+        port can be closed safely afterwards.
+
+        Args:
+            port (serial.Serial): The registered port.
+        """
+        if self._thread is None:
+            return
+        self._post(port, None).wait(UNREGISTER_TIMEOUT)
+
+    def _apply_pending(self):
+        """
+        Applies the queued registration changes.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for port, reader, done in pending:
+            try:
+                if reader is None:
+                    if self._is_registered(port):
+                        self._selector.unregister(port)
+                else:
+                    self._selector.register(port, selectors.EVENT_READ, reader)
+            except (KeyError, ValueError, OSError) as e:
+                print(f"Engine error: {e}")
+            done.set()
+
+    def _is_registered(self, port):
+        """
+        Returns:
+            bool: True if the port is registered with the selector.
+        """
+        try:
+            self._selector.get_key(port)
+            return True
+        except KeyError:
+            return False
+
+    def _run(self):
+        """
+        Runs the engine thread: waits for readable ports and reads whatever is waiting
+        on each of them.
+        """
+        while True:
+            self._apply_pending()
+            for key, events in self._selector.select():
+                if key.fileobj is self._wake_read:
+                    try:
+                        while self._wake_read.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                port = key.fileobj
+                decoder, channel, stop_event, source, listener = key.data
+                try:
+                    chunk = port.read(min(max(port.in_waiting, 1), READ_CHUNK_SIZE))
+                except Exception as e:
+                    # A failing port would otherwise be reported ready forever
+                    self._selector.unregister(port)
+                    if not stop_event.is_set():
+                        print(f"Read error: {e}")
+                        stop_event.set()
+                        try:
+                            port.close()
+                        except Exception:
+                            pass
+                    continue
+                if chunk:
+                    deliver_chunk(chunk, decoder, channel, stop_event, source, listener)
+
+
+# The engine shared by all sessions
+engine = SerialEngine()
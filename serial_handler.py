@@ -2,25 +2,51 @@
 serial_handler.py
 
 This module handles serial communication with a microcontroller. It includes functions
-to find available serial ports, connect to a serial port, disconnect from a serial port,
-send commands, and read data from the serial port.
+to find available serial ports, open a serial port, and read data from it. Connections
+themselves are managed as sessions (see session.py), each running its own read_serial
+thread.
+
+Received data is decoded either as text lines or, when the decode_mode setting is "cobs"
+or "slip", as binary frames carrying one sample each (see framing.py). Decoded batches
+are handed to the UI through a bounded channel (see channel.py), whose capacity and
+overflow policy come from the queue_capacity and queue_policy settings.
 
 Functions:
     - find_serial_ports: Lists available serial ports.
-    - connect_serial: Connects to a specified serial port with given parameters.
-    - disconnect_serial: Disconnects the current serial connection.
-    - send_command: Sends a command to the connected serial device.
-    - read_serial: Continuously reads data from the serial port and adds it to a queue.
+    - open_port: Opens a serial port, or a capture replay, with given parameters.
+    - wait_ready: Waits until a newly opened device signals that it is ready.
+    - split_lines: Splits complete lines off a receive buffer.
+    - make_decoder: Creates the decoder for the configured decode mode.
+    - deliver_chunk: Records, decodes and queues one chunk of received bytes.
+    - read_serial: Continuously reads data from a port and adds it to a channel.
+
+Classes:
+    - LineDecoder: Decodes received bytes into text lines.
+    - FrameDecoder: Decodes received bytes into samples from binary frames.
 """
 
 import serial
 import time
-import queue
+import re
 import serial.tools.list_ports
+from framing import DELIMITERS, CRC_SIZES, cobs_decode, slip_decode, strip_crc, sample_dtype, unpack_samples
+from handler_config import settings
+from recorder import record_raw
+from replay import REPLAY_SCHEME, ReplayPort, open_replay
+from net_transport import NetworkPort, is_network_url
+from pipeline_stats import count
 
-# Global variables for serial connection and data queue
-ser = None
-data_queue = queue.Queue()
+# Upper bound for a single read; whatever has arrived (up to this) is read at once
+READ_CHUNK_SIZE = 65536
+# How long the reader waits before retrying after a read error
+IDLE_WAIT = 0.1
+# Read timeout while waiting for the ready signal, so a cancel is noticed quickly
+READY_POLL = 0.05
+# How long DTR is held low to reset the device
+DTR_PULSE = 0.05
+READY_SIGNALS = ("first_line", "banner", "dtr_reset", "delay")
+# A complete line including its terminator
+LINE_PATTERN = re.compile(r'[^\n]*\n')
 
 def find_serial_ports():
     """
@@ -32,70 +58,270 @@ def find_serial_ports():
     ports = serial.tools.list_ports.comports()
     return [port.device for port in ports]
 
-def connect_serial(port, baudrate):
+def open_port(port, baudrate):
     """
-    Connects to a specified serial port with given parameters.
+    Opens a specified serial port with given parameters. A port of the form
+    replay://<capture file>[?speed=<n>] plays back a recorded capture instead, and
+    socket://<host>:<port> or rfc2217://<host>:<port> reaches a device over the
+    network (see net_transport.py). The
+    port is returned as soon as it is open; see wait_ready for the device itself. The
+    flow_control setting chooses hardware (RTS/CTS) or software (XON/XOFF) flow control.
 
     Args:
-        port (str): The serial port to connect to.
+        port (str): The serial port to open.
         baudrate (int): The baud rate for the serial connection.
 
     Returns:
-        bool: True if connection is successful, False otherwise.
+        serial.Serial, ReplayPort or NetworkPort: The opened port.
+
+    Raises:
+        serial.SerialException: If the port cannot be opened.
+        FileNotFoundError: If a replayed capture does not exist.
+    """
+    if port.startswith(REPLAY_SCHEME):
+        return open_replay(port)
+    if is_network_url(port):
+        return NetworkPort(port, baudrate)
+    opened = serial.Serial(
+        port=port,
+        baudrate=baudrate,
+        bytesize=serial.EIGHTBITS,
+        parity=serial.PARITY_NONE,
+        stopbits=serial.STOPBITS_ONE,
+        timeout=1,
+        rtscts=settings["flow_control"] == "rtscts",
+        xonxoff=settings["flow_control"] == "xonxoff"
+    )
+    return opened
+
+def split_lines(buffer, chunk):
+    """
+    Appends a chunk of received bytes to the buffer and splits off every complete line.
+    The trailing partial line, if any, stays in the buffer for the next call.
+
+    Args:
+        buffer (bytearray): The receive buffer, modified in place.
+        chunk (bytes): The newly received bytes.
+
+    Returns:
+        list: The complete lines as strings, each keeping its line terminator.
+    """
+    buffer += chunk
+    end = buffer.rfind(b'\n') + 1
+    if not end:
+        return []
+    lines = LINE_PATTERN.findall(buffer[:end].decode(errors='replace'))
+    del buffer[:end]
+    return lines
+
+class LineDecoder:
+    """
+    Decodes received bytes into text lines. Each fed chunk yields the list of lines it
+    completed.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, chunk):
+        """
+        Args:
+            chunk (bytes): The newly received bytes.
+
+        Returns:
+            list: The completed lines, or an empty list.
+        """
+        return split_lines(self.buffer, chunk)
+
+    def reset(self):
+        """
+        Discards the partial line received so far.
+        """
+        self.buffer.clear()
+
+class FrameDecoder:
+    """
+    Decodes received bytes into samples from COBS- or SLIP-delimited binary frames.
+    Each fed chunk yields the samples of the frames it completed, as one float array
+    with a row per field of the sample layout. Frames of the wrong length or with a
+    bad CRC are counted in errors and dropped.
+
+    Args:
+        framing (str): "cobs" or "slip".
+        frame_format (str): The sample layout, see framing.sample_dtype.
+        crc (str): The frame CRC, see framing.strip_crc.
+    """
+
+    def __init__(self, framing, frame_format, crc="none"):
+        self.buffer = bytearray()
+        self.delimiter = DELIMITERS[framing]
+        self.decode = cobs_decode if framing == "cobs" else slip_decode
+        self.dtype = sample_dtype(frame_format)
+        self.crc = crc
+        self.frame_size = self.dtype.itemsize + CRC_SIZES[crc]
+        self.errors = 0
+
+    def feed(self, chunk):
+        """
+        Args:
+            chunk (bytes): The newly received bytes.
+
+        Returns:
+            numpy.ndarray: The completed samples shaped (fields, n), or None.
+        """
+        self.buffer += chunk
+        end = self.buffer.rfind(self.delimiter)
+        if end < 0:
+            return None
+        frames = bytes(self.buffer[:end]).split(self.delimiter)
+        del self.buffer[:end + 1]
+
+        payloads = []
+        for frame in frames:
+            if not frame:
+                continue
+            try:
+                payload = strip_crc(self.decode(frame), self.crc)
+            except ValueError:
+                payload = None
+            if payload is None or len(payload) + CRC_SIZES[self.crc] != self.frame_size:
+                self.errors += 1
+                count("frame_errors")
+                continue
+            payloads.append(payload)
+        return unpack_samples(payloads, self.dtype) if payloads else None
+
+    def reset(self):
+        """
+        Discards the partial frame received so far.
+        """
+        self.buffer.clear()
+
+def make_decoder():
+    """
+    Creates the decoder for the configured decode mode.
+
+    Returns:
+        LineDecoder or FrameDecoder: A fresh decoder.
     """
-    global ser
+    mode = settings["decode_mode"]
+    if mode in DELIMITERS:
+        try:
+            return FrameDecoder(mode, settings["frame_format"], settings["frame_crc"])
+        except (ValueError, TypeError, KeyError) as e:
+            print(f"Frame format error: {e}")
+    return LineDecoder()
+
+def wait_ready(port, cancelled=None):
+    """
+    Waits until a newly opened device signals that it is ready, as chosen by the
+    connect_ready setting:
+        - "first_line": the first complete line, or valid frame in binary mode.
+        - "banner": the ready_banner text.
+        - "dtr_reset": resets the device with a DTR pulse, then waits for its first line.
+        - "delay": a fixed wait of ready_timeout seconds.
+    Without the signal, the wait ends after ready_timeout seconds. Replays are ready
+    at once. Everything received while waiting is returned, so it can still be shown.
+
+    Args:
+        port (serial.Serial): The opened port.
+        cancelled (threading.Event): Ends the wait early when set.
+
+    Returns:
+        tuple: Whether the signal arrived, and the bytes received while waiting.
+    """
+    mode = settings["connect_ready"]
+    timeout = float(settings["ready_timeout"])
+    if mode not in READY_SIGNALS:
+        print(f"Unknown ready signal: {mode}")
+        mode = "delay"
+    if isinstance(port, ReplayPort):
+        return True, b''
+    if mode == "delay":
+        if cancelled is not None:
+            cancelled.wait(timeout)
+        else:
+            time.sleep(timeout)
+        return True, b''
+    if mode == "dtr_reset":
+        port.dtr = False
+        time.sleep(DTR_PULSE)
+        port.reset_input_buffer()
+        port.dtr = True
+    banner = settings["ready_banner"].encode()
+    probe = make_decoder()
+    received = bytearray()
+    saved_timeout = port.timeout
+    port.timeout = READY_POLL
+    deadline = time.monotonic() + timeout
     try:
-        ser = serial.Serial(
-            port=port,
-            baudrate=baudrate,
-            bytesize=serial.EIGHTBITS,
-            parity=serial.PARITY_NONE,
-            stopbits=serial.STOPBITS_ONE,
-            timeout=1
-        )
-        time.sleep(2)  # Wait for the connection to establish
-        return True
-    except serial.SerialException as e:
-        print(f"Error: {e}")
-        return False
-    except FileNotFoundError as e:
-        print(f"FileNotFoundError: {e}")
-        return False
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        return False
-
-def disconnect_serial():
-    """
-    Disconnects the current serial connection.
-    """
-    global ser
-    if ser and ser.is_open:
-        ser.close()
-        ser = None
-
-def send_command(command):
-    """
-    Sends a command to the connected serial device.
+        while time.monotonic() < deadline and not (cancelled is not None and cancelled.is_set()):
+            chunk = port.read(min(max(port.in_waiting, 1), READ_CHUNK_SIZE))
+            if not chunk:
+                continue
+            received += chunk
+            if mode == "banner":
+                if banner and banner in received:
+                    return True, bytes(received)
+            else:
+                found = probe.feed(chunk)
+                if found is not None and len(found):
+                    return True, bytes(received)
+        return False, bytes(received)
+    finally:
+        port.timeout = saved_timeout
+
+def deliver_chunk(chunk, decoder, channel, stop_event, source="", listener=None):
+    """
+    Records, decodes and queues one chunk of received bytes. The decoded output is
+    pushed onto the channel as one (arrival time, batch) tuple. A batch is a list of
+    lines in text mode, or a (fields, n) sample array in binary mode. The raw bytes are
+    passed to the recorder before the batch is queued, so a capture stays complete
+    even when the queue policy drops batches.
 
     Args:
-        command (str): The command to send.
+        chunk (bytes): The received bytes.
+        decoder (LineDecoder or FrameDecoder): Decodes the received bytes.
+        channel (BoundedChannel): Receives the decoded batch.
+        stop_event (threading.Event): Stops a blocked put when set.
+        source (str): The name the raw bytes are recorded under.
+        listener (function): Called with each list of text lines before it is queued,
+            such as the session's command engine matching responses.
     """
-    if ser and ser.is_open:
-        ser.write((command).encode())
+    timestamp = time.time()
+    count("bytes_read", len(chunk))
+    record_raw(chunk, timestamp, source)
+    batch = decoder.feed(chunk)
+    if batch is not None and len(batch):
+        size = len(batch) if isinstance(batch, list) else batch.shape[1]
+        count("lines_read", size)
+        if listener is not None and isinstance(batch, list):
+            listener(batch)
+        channel.put((timestamp, batch), size, stop_event)
 
-def read_serial(stop_event):
+def read_serial(port, decoder, channel, stop_event, source="", listener=None):
     """
-    Continuously reads data from the serial port and adds it to a queue.
+    Continuously reads data from a port and adds it to a channel.
+
+    The read blocks on the port (up to its timeout) until data arrives and then pulls
+    everything already waiting in a single read, so a saturated link produces few
+    large batches. Each chunk is handled by deliver_chunk.
 
     Args:
+        port (serial.Serial): The open port to read from.
+        decoder (LineDecoder or FrameDecoder): Decodes the received bytes.
+        channel (BoundedChannel): Receives the decoded batches.
         stop_event (threading.Event): An event to signal when to stop reading.
+        source (str): The name the raw bytes are recorded under.
+        listener (function): Called with each list of text lines, see deliver_chunk.
     """
-    while not stop_event.is_set():
-        if ser and ser.in_waiting > 0:
-            try:
-                data = ser.readline().decode()
-                data_queue.put(data)
-            except Exception as e:
+    while not stop_event.is_set() and port.is_open:
+        try:
+            chunk = port.read(min(max(port.in_waiting, 1), READ_CHUNK_SIZE))
+        except Exception as e:
+            if not stop_event.is_set():
                 print(f"Read error: {e}")
-        time.sleep(0.1)
+            stop_event.wait(IDLE_WAIT)
+            continue
+        if chunk:
+            deliver_chunk(chunk, decoder, channel, stop_event, source, listener)
@@ -0,0 +1,186 @@
+"""
+serial_writer.py
+
+This module moves writing to a port off the UI thread. Everything a session sends,
+from single commands to whole files, is queued and written by a writer thread of the
+session, so a large send never stalls the UI.
+
+Each send is written in chunks of write_chunk_bytes, with write_chunk_gap seconds
+between chunks, so firmware with a small receive buffer is not overrun. The port
+waits until each chunk has gone out before the next one, so the pacing holds even
+when the OS buffers writes. Hardware (RTS/CTS) or software (XON/XOFF) flow control,
+chosen by the flow_control setting, is applied when the port is opened; with it, a
+device that asks to pause simply holds up the current chunk.
+
+Sends are written in the order they were queued. Each one is tracked by a WriteJob,
+which reports its progress and throughput and can be cancelled between chunks. Callers
+that need to know when their bytes actually reach the port, rather than when they were
+queued, pass callbacks that the writer thread calls as the send starts and finishes.
+
+Classes:
+    - WriteJob: One queued send and its progress.
+    - SerialWriter: Writes the queued sends of one port in a thread of its own.
+"""
+
+import queue
+import threading
+import time
+from handler_config import settings
+from pipeline_stats import count
+
+
+class WriteJob:
+    """
+    One queued send and its progress.
+
+    Args:
+        data (bytes): The bytes to send.
+        label (str): What is being sent, for progress displays.
+        on_start (function): Called with the job by the writer thread just before its
+            first chunk is written, or None.
+        on_done (function): Called with the job by the writer thread once it has been
+            written, failed or been cancelled, or None.
+    """
+
+    def __init__(self, data, label="", on_start=None, on_done=None):
+        self.data = data
+        self.label = label
+        self.on_start = on_start
+        self.on_done = on_done
+        self.total = len(data)
+        self.sent = 0
+        self.started = None
+        self.finished = None
+        self.error = None  # Why the send stopped early, if it did
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+
+    @property
+    def progress(self):
+        """
+        float: The fraction of the bytes sent so far.
+        """
+        return self.sent / self.total if self.total else 1.0
+
+    @property
+    def rate(self):
+        """
+        float: The bytes sent per second so far, or 0.0 before the first chunk.
+        """
+        if self.started is None:
+            return 0.0
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+    def cancel(self):
+        """
+        Stops the send after the chunk being written.
+        """
+        self.cancelled.set()
+
+
+class SerialWriter:
+    """
+    Writes the queued sends of one port in a thread of its own.
+
+    Args:
+        write (function): Writes bytes to the port.
+        flush (function): Waits until the written bytes have gone out, or None.
+        name (str): The port name, for the thread name.
+    """
+
+    def __init__(self, write, flush=None, name=""):
+        self.write = write
+        self.flush = flush
+        self.current = None  # The job being written
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"serial-writer {name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, data, label="", on_start=None, on_done=None):
+        """
+        Queues bytes to send.
+
+        Args:
+            data (bytes): The bytes to send.
+            label (str): What is being sent, for progress displays.
+            on_start (function): Called with the job just before it is written, or None.
+            on_done (function): Called with the job once it has finished, or None.
+
+        Returns:
+            WriteJob: The queued send.
+        """
+        job = WriteJob(data, label, on_start, on_done)
+        self._jobs.put(job)
+        return job
+
+    def jobs(self):
+        """
+        Returns the send being written and those still queued.
+
+        Returns:
+            list: The WriteJob objects, the current one first.
+        """
+        with self._jobs.mutex:
+            waiting = [job for job in self._jobs.queue if job is not None]
+        current = self.current
+        return ([current] if current is not None else []) + waiting
+
+    def cancel_all(self):
+        """
+        Cancels the send being written and every queued one.
+        """
+        for job in self.jobs():
+            job.cancel()
+
+    def close(self):
+        """
+        Cancels every send and stops the writer thread.
+        """
+        self.cancel_all()
+        self._jobs.put(None)
+
+    def _run(self):
+        """
+        Runs the writer thread: writes each queued send in paced chunks.
+        """
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            self.current = job
+            self._send(job)
+            self.current = None
+
+    def _send(self, job):
+        """
+        Writes one send in chunks of write_chunk_bytes, write_chunk_gap seconds apart,
+        and calls its callbacks.
+        """
+        chunk_size = max(int(settings["write_chunk_bytes"]), 1)
+        gap = float(settings["write_chunk_gap"])
+        job.started = time.monotonic()
+        try:
+            if job.on_start is not None:
+                job.on_start(job)
+            while job.sent < job.total and not job.cancelled.is_set():
+                chunk = job.data[job.sent:job.sent + chunk_size]
+                self.write(chunk)
+                if self.flush is not None:
+                    self.flush()
+                job.sent += len(chunk)
+                count("bytes_written", len(chunk))
+                if gap > 0 and job.sent < job.total:
+                    job.cancelled.wait(gap)
+            if job.sent < job.total:
+                job.error = "cancelled"
+        except Exception as e:
+            print(f"Write error: {e}")
+            job.error = str(e)
+        job.finished = time.monotonic()
+        job.done.set()
+        if job.on_done is not None:
+            try:
+                job.on_done(job)
+            except Exception as e:
+                print(f"Write callback error: {e}")
@@ -0,0 +1,619 @@
+"""
+session.py
+
+This module manages serial sessions, so several boards can be watched from one process.
+A session is one port with its own data queue, decoder, plot configuration and plot
+data. All sessions are consumed by the same UI loop and drawn into the same plot.
+
+With the serial_engine setting at "selector", the ports of all sessions are read by one
+shared thread (see serial_engine.py); otherwise, or for ports the engine cannot
+service, each session runs its own reader thread. With the parse_worker setting on,
+a session instead reads, decodes and parses in a worker process of its own, and its
+plot data lives in shared memory (see parse_worker.py).
+
+Besides its x and y values, every plotted sample keeps the host time at which it
+arrived, counted from when the first session was created. With more than one session,
+the plot uses this time as the x axis, so the data of all boards lines up.
+
+Each session keeps rolling statistics of its plotted columns (see rolling_stats.py),
+updated with every batch of samples it stores.
+
+Commands are sent through each session's command engine (see command_engine.py),
+which matches the device's responses to them as the reader receives them. Everything
+a session sends is written in paced chunks by a writer thread of its own (see
+serial_writer.py), so large sends never hold up the UI.
+
+A disconnected session keeps its data, and reconnecting the same port continues it;
+forget_closed_sessions removes disconnected sessions for good.
+
+Functions:
+    - start_connect: Starts connecting to a port in the background.
+    - connect_serial: Connects to a port, creating its session if needed.
+    - disconnect_serial: Disconnects one session, or all of them.
+    - send_command: Sends a command to one session, or to all connected ones.
+    - send_file: Sends the contents of a file to one session, or to all connected ones.
+    - run_commands: Sends a sequence of commands to one session and waits for the responses.
+    - get_session: Returns the session of a port.
+    - all_sessions: Returns every session, connected or not.
+    - forget_closed_sessions: Removes the disconnected sessions.
+    - set_recording: Starts or stops recording in the worker processes.
+
+Classes:
+    - Session: One port with its reader, queue and plot data.
+    - PendingConnect: A connection being made in the background.
+"""
+
+import os
+import queue
+import threading
+import time
+import serial
+import numpy as np
+from channel import BoundedChannel
+from data_buffer import RingBuffer
+from data_parser import stamp_samples
+from handler_config import plot_config, settings
+from recorder import record_samples, is_recording
+from publisher import publish_samples
+from rolling_stats import RollingStats
+from serial_handler import open_port, wait_ready, make_decoder, deliver_chunk, read_serial
+from serial_engine import engine
+from parse_worker import ParseWorker
+from pipeline_stats import count
+from command_engine import CommandEngine
+from serial_writer import SerialWriter
+
+# Sessions by port name, in the order they were created
+sessions = {}
+# Host time the common time axis counts from
+time_origin = None
+
+
+class Session:
+    """
+    One port with its own reader, data queue, decoder, plot configuration and plot
+    data. The plot data has a column for x, one per plotted y column and a last
+    column holding each sample's arrival time on the common time axis.
+
+    Args:
+        name (str): The port name.
+        baudrate (int): The baud rate for the serial connection.
+        config (dict): The plot configuration, defaults to a copy of plot_config.
+    """
+
+    def __init__(self, name, baudrate=0, config=None):
+        global time_origin
+        if time_origin is None:
+            time_origin = time.time()
+        config = plot_config if config is None else config
+        self.name = name
+        self.baudrate = baudrate
+        self.port = None
+        self.decoder = None
+        self.thread = None
+        self.worker = None
+        self.worker_frame_errors = 0
+        self.stop_event = threading.Event()
+        self.data_queue = BoundedChannel(settings["queue_capacity"], settings["queue_policy"])
+        self.plot_config = {"x_column": config.get("x_column"), "y_columns": list(config.get("y_columns", []))}
+        self.data_store = None
+        self.last_arrival = None
+        self.followed_total = 0
+        self.stats = None
+        self.writer = None
+        self.commands = CommandEngine(self.write)
+        self.reset_store()
+
+    @property
+    def is_open(self):
+        """
+        bool: Whether the session is connected.
+        """
+        if self.worker is not None:
+            return self.worker.is_alive
+        return bool(self.port is not None and self.port.is_open)
+
+    @property
+    def frame_errors(self):
+        """
+        int: The number of binary frames dropped because they were malformed or failed their CRC.
+        """
+        if self.worker is not None:
+            return self.worker_frame_errors
+        return getattr(self.decoder, "errors", 0)
+
+    def start(self, port, preamble=b''):
+        """
+        Starts reading from an opened port, through the shared engine if the
+        serial_engine setting allows and the port supports it, otherwise in a reader
+        thread of its own. The decoder and the queue are set up from the current
+        settings.
+
+        Args:
+            port (serial.Serial): The opened port.
+            preamble (bytes): Bytes already read from the port, handled first.
+        """
+        self.port = port
+        self.decoder = make_decoder()
+        if hasattr(port, "on_reconnect"):
+            port.on_reconnect = self.decoder.reset  # A network port's new link starts afresh
+        try:
+            self.data_queue.configure(settings["queue_capacity"], settings["queue_policy"])
+        except ValueError as e:
+            print(f"Queue config error: {e}")
+        self.stop_event = threading.Event()
+        self.writer = SerialWriter(port.write, getattr(port, "flush", None), self.name)
+        reader = (port, self.decoder, self.data_queue, self.stop_event, self.name, self.commands.feed)
+        if preamble:
+            deliver_chunk(preamble, *reader[1:])
+        if settings["serial_engine"] == "selector" and engine.supports(port):
+            self.thread = None
+            engine.register(*reader)
+        else:
+            self.thread = threading.Thread(target=read_serial, args=reader, daemon=True)
+            self.thread.start()
+
+    def new_worker(self, baudrate):
+        """
+        Creates, without starting it, a worker process that will open the port and
+        parse everything it receives into shared memory. The current plot data is
+        carried over.
+
+        Args:
+            baudrate (int): The baud rate for the serial connection.
+
+        Returns:
+            ParseWorker: The worker.
+        """
+        return ParseWorker(self.name, baudrate, self.plot_config, time_origin, is_recording(), self.data_store)
+
+    def attach_worker(self, worker):
+        """
+        Makes a started worker process the reader of this session.
+
+        Args:
+            worker (ParseWorker): The started worker.
+        """
+        self.worker = worker
+        self.worker_frame_errors = 0
+        self.data_store = worker.data_store
+        self.writer = SerialWriter(lambda data: worker.request("send", data), name=self.name)
+
+    def start_worker(self, baudrate):
+        """
+        Starts a worker process for the port and waits until it is connected.
+
+        Args:
+            baudrate (int): The baud rate for the serial connection.
+
+        Returns:
+            str: None on success, otherwise the reason the port could not be opened.
+        """
+        worker = self.new_worker(baudrate)
+        error = worker.start()
+        if error is not None:
+            worker.close()
+            return error
+        self.attach_worker(worker)
+        return None
+
+    def drain_worker(self):
+        """
+        Collects what the worker process reported since the last call. Its statistics
+        are added to the statistics of this process and its errors are printed.
+
+        Returns:
+            tuple: The received lines and the arrival times of the parsed batches.
+        """
+        lines = []
+        arrivals = []
+        for message in self.worker.drain():
+            if message[0] == "batch":
+                arrivals.append(message[1])
+                if message[2]:
+                    self.commands.feed(message[2], message[3])
+                    lines.extend(message[2])
+            elif message[0] == "stats":
+                for name, amount in message[1].items():
+                    count(name, amount)
+                self.worker_frame_errors += message[1].get("frame_errors", 0)
+            elif message[0] == "error":
+                print(message[1])
+        return lines, arrivals
+
+    def close(self):
+        """
+        Stops reading and closes the port. The plot data is kept; commands still
+        awaiting a response fail.
+        """
+        self.commands.close()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.worker is not None:
+            self.data_store = self.worker.close()
+            self.worker = None
+            return
+        self.stop_event.set()
+        if self.port is not None and self.thread is None:
+            engine.unregister(self.port)
+        if self.is_open:
+            self.port.close()
+        self.port = None
+
+    def write(self, data, label="", on_start=None, on_done=None):
+        """
+        Queues bytes for the writer thread, which sends them to the connected device in
+        paced chunks after everything queued before.
+
+        Args:
+            data (bytes): The bytes to send.
+            label (str): What is being sent, for progress displays.
+            on_start (function): Called with the WriteJob just before it is written, or None.
+            on_done (function): Called with the WriteJob once it has finished, or None.
+
+        Returns:
+            WriteJob: The queued send, or None if the session is not connected.
+        """
+        writer = self.writer
+        if writer is None:
+            return None
+        return writer.submit(data, label, on_start, on_done)
+
+    def send(self, command):
+        """
+        Sends a command to the connected device through the command engine.
+
+        Args:
+            command (str): The command to send.
+
+        Returns:
+            Command: The command, which finishes once its response has arrived.
+        """
+        return self.commands.submit(command)
+
+    def configure_plot(self, config):
+        """
+        Changes the plotted columns and empties the plot data. A worker process is
+        restarted, since it parses for a fixed configuration.
+
+        Args:
+            config (dict): The plot configuration.
+        """
+        restart = self.worker is not None and self.worker.is_alive
+        if self.worker is not None:
+            self.close()
+        self.plot_config = {"x_column": config.get("x_column"), "y_columns": list(config.get("y_columns", []))}
+        self.reset_store()
+        if restart:
+            error = self.start_worker(self.baudrate)
+            if error is not None:
+                print(f"Error: {error}")
+
+    def reset_store(self):
+        """
+        Empties the plot data. The buffer is only reallocated when the number of plotted
+        columns or the configured capacity changed, otherwise it is cleared in place. A
+        worker process is asked to clear its shared buffer itself. The rolling statistics
+        start over as well.
+        """
+        columns = len(self.plot_config["y_columns"])
+        window = int(settings["stats_window"])
+        if self.stats is None or self.stats.columns != columns or self.stats.window != window:
+            self.stats = RollingStats(columns, window)
+        else:
+            self.stats.reset()
+        if self.worker is not None:
+            self.worker.request("clear")
+            return
+        columns = 2 + len(self.plot_config["y_columns"])
+        capacity = int(settings["plot_capacity"])
+        store = self.data_store
+        if store is None or store.columns != columns or store.capacity != capacity:
+            self.data_store = RingBuffer(columns, capacity)
+        else:
+            store.clear()
+        self.last_arrival = None
+
+    def append(self, x, y, timestamp):
+        """
+        Appends parsed samples to the plot data and passes them to the rolling statistics,
+        the recorder and the publisher. Samples without an x value are placed at their
+        sample index. The samples are spread evenly over the time since the previous
+        append, ending at their arrival time.
+
+        Args:
+            x (numpy.ndarray): The x values, NaN where missing.
+            y (numpy.ndarray): The y values, one row per plotted column.
+            timestamp (float): The host time at which the newest of the samples arrived.
+
+        Returns:
+            numpy.ndarray: The appended samples, one row per column of the plot data.
+        """
+        block = stamp_samples(x, y, timestamp, self.last_arrival, time_origin, self.data_store.total)
+        self.data_store.append(block)
+        self.last_arrival = timestamp
+        self.stats.update(block)
+        record_samples(block[:-1], timestamp, self.name)
+        publish_samples(block, timestamp, self.name, self.plot_config)
+        return block
+
+    def follow_worker_samples(self, timestamp):
+        """
+        Passes the samples a worker process appended since the last call to the rolling
+        statistics and the publisher. Samples read while the worker was in the middle
+        of an append are left for the next call.
+
+        Args:
+            timestamp (float): The host time at which the newest of the samples arrived.
+        """
+        store = self.data_store
+        version = store.version
+        total = store.total
+        if version % 2:
+            return
+        if total < self.followed_total:
+            self.followed_total = 0  # Cleared since the last call
+            self.stats.reset()
+        new = min(total - self.followed_total, len(store))
+        if new <= 0:
+            return
+        block = np.array([store.column(i)[-new:] for i in range(store.columns)])
+        if store.version != version:
+            return
+        self.followed_total = total
+        self.stats.update(block)
+        publish_samples(block, timestamp, self.name, self.plot_config)
+
+class PendingConnect:
+    """
+    A connection being made in a background thread, so the UI stays responsive while
+    the port opens and the device gets ready (see serial_handler.wait_ready). The
+    session is only started, and registered if new, when poll() is called from the UI
+    thread and finds the connection made.
+
+    Args:
+        port (str): The serial port to connect to.
+        baudrate (int): The baud rate for the serial connection.
+    """
+
+    def __init__(self, port, baudrate):
+        self.port = port
+        self.baudrate = baudrate
+        self.status = f"Opening {port}"
+        self.result = None  # None while connecting, then True or False
+        self.session = sessions.get(port) or Session(port, baudrate)
+        self._messages = queue.Queue()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._connect, daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        """
+        Opens the port and waits for the device, in the background thread.
+        """
+        try:
+            if settings["parse_worker"]:
+                self._messages.put(("status", f"Starting worker for {self.port}"))
+                worker = self.session.new_worker(self.baudrate)
+                error = worker.start()
+                if error is not None:
+                    worker.close()
+                    self._messages.put(("failed", f"Error: {error}"))
+                else:
+                    self._messages.put(("worker", worker))
+                return
+            opened = open_port(self.port, self.baudrate)
+            self._messages.put(("status", f"Waiting for {self.port}"))
+            ready, preamble = wait_ready(opened, self._cancelled)
+            self._messages.put(("opened", (opened, preamble, ready)))
+        except serial.SerialException as e:
+            self._messages.put(("failed", f"Error: {e}"))
+        except FileNotFoundError as e:
+            self._messages.put(("failed", f"FileNotFoundError: {e}"))
+        except Exception as e:
+            self._messages.put(("failed", f"Unexpected error: {e}"))
+
+    def cancel(self):
+        """
+        Gives up on the connection. A port that is opened anyway is closed again.
+        """
+        self._cancelled.set()
+
+    def poll(self):
+        """
+        Applies the progress of the background thread. Must be called from the UI thread.
+
+        Returns:
+            bool: None while still connecting, then True if connected, False otherwise.
+        """
+        while self.result is None:
+            finished = not self._thread.is_alive()
+            try:
+                kind, value = self._messages.get_nowait()
+            except queue.Empty:
+                if finished:
+                    self.status = "Cancelled"
+                    self.result = False
+                break
+            if kind == "status":
+                self.status = value
+            elif kind == "failed":
+                print(value)
+                self.status = value
+                self.result = False
+            elif self._cancelled.is_set():
+                if kind == "worker":
+                    value.close()
+                else:
+                    value[0].close()
+                self.status = "Cancelled"
+                self.result = False
+            else:
+                if kind == "worker":
+                    self.session.attach_worker(value)
+                    self.status = f"Connected to {self.port}"
+                else:
+                    opened, preamble, ready = value
+                    self.session.start(opened, preamble)
+                    self.status = f"Connected to {self.port}" + ("" if ready else " (no ready signal)")
+                self.session.baudrate = self.baudrate
+                sessions.setdefault(self.port, self.session)
+                self.result = True
+        return self.result
+
+    def wait(self):
+        """
+        Waits for the connection to be made or to fail. Must be called from the UI thread.
+
+        Returns:
+            bool: True if connected, False otherwise.
+        """
+        self._thread.join()
+        return self.poll()
+
+
+def start_connect(port, baudrate):
+    """
+    Starts connecting to a port in the background, creating its session on first use.
+    A port of the form replay://<capture file>[?speed=<n>] plays back a recorded
+    capture instead.
+
+    Args:
+        port (str): The serial port to connect to.
+        baudrate (int): The baud rate for the serial connection.
+
+    Returns:
+        PendingConnect: The connection being made; poll it from the UI thread.
+    """
+    return PendingConnect(port, baudrate)
+
+def connect_serial(port, baudrate):
+    """
+    Connects to a specified port with given parameters, creating its session on first
+    use, and waits until the device is ready.
+
+    Args:
+        port (str): The serial port to connect to.
+        baudrate (int): The baud rate for the serial connection.
+
+    Returns:
+        bool: True if connection is successful, False otherwise.
+    """
+    session = sessions.get(port)
+    if session is not None and session.is_open:
+        return True
+    return start_connect(port, baudrate).wait()
+
+def disconnect_serial(port=None):
+    """
+    Disconnects the session of a port, or every session when no port is given.
+
+    Args:
+        port (str): The port to disconnect, or None for all.
+    """
+    for session in list(sessions.values()):
+        if port is None or session.name == port:
+            session.close()
+
+def send_command(command, port=None):
+    """
+    Sends a command to the session of a port, or to every connected session when no
+    port is given.
+
+    Args:
+        command (str): The command to send.
+        port (str): The port to send to, or None for all.
+    """
+    for session in list(sessions.values()):
+        if session.is_open and (port is None or session.name == port):
+            session.send(command)
+
+def send_file(path, port=None):
+    """
+    Queues the contents of a file for the session of a port, or for every connected
+    session when no port is given. The file is streamed by the writer threads as is,
+    without waiting for responses.
+
+    Args:
+        path (str): The file to send.
+        port (str): The port to send to, or None for all.
+
+    Returns:
+        list: The queued WriteJob objects.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    label = os.path.basename(path)
+    jobs = []
+    for session in list(sessions.values()):
+        if session.is_open and (port is None or session.name == port):
+            job = session.write(data, label)
+            if job is not None:
+                jobs.append(job)
+    return jobs
+
+def run_commands(commands, port):
+    """
+    Sends a sequence of commands to the session of a port, with up to command_window
+    of them awaiting their response at once, and waits until all have finished. Must
+    not be called from the UI thread of a session with a worker process, whose
+    responses are only matched there.
+
+    Args:
+        commands (list): The commands to send.
+        port (str): The port to send to.
+
+    Returns:
+        list: The finished Command objects in the order given, each with its response
+        lines and round-trip time, or its error.
+    """
+    session = sessions.get(port)
+    if session is None or not session.is_open:
+        return []
+    return session.commands.run(commands)
+
+def get_session(port):
+    """
+    Returns the session of a port.
+
+    Args:
+        port (str): The port name.
+
+    Returns:
+        Session: The session, or None if the port was never connected.
+    """
+    return sessions.get(port)
+
+def all_sessions():
+    """
+    Returns every session, connected or not, in the order they were created.
+
+    Returns:
+        list: The sessions.
+    """
+    return list(sessions.values())
+
+def forget_closed_sessions():
+    """
+    Removes the disconnected sessions and their data. Once no session is left, the
+    common time axis starts over with the next session.
+    """
+    global time_origin
+    for name, session in list(sessions.items()):
+        if not session.is_open:
+            del sessions[name]
+    if not sessions:
+        time_origin = None
+
+def set_recording(active):
+    """
+    Starts or stops recording in the worker processes, which record their own data.
+    Sessions read in this process are recorded by the recorder of this process.
+
+    Args:
+        active (bool): Whether to record.
+    """
+    for session in sessions.values():
+        if session.worker is not None:
+            session.worker.request("record", active)
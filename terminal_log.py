@@ -0,0 +1,80 @@
+"""
+terminal_log.py
+
+This module keeps the full terminal history on disk. The terminal widget only shows the
+most recent lines, so everything displayed is also appended to a log file, created per
+session next to the configuration file. If the log cannot be opened or written, the
+error is reported once and logging pauses until the terminal_log setting is turned
+off and on again.
+
+Functions:
+    - open_log: Opens a new log file for this session.
+    - write_log: Appends text to the log file.
+    - close_log: Flushes and closes the log file.
+"""
+
+import os
+import time
+from handler_config import EXECUTABLE_PATH, settings
+
+# Directory holding the terminal logs
+LOG_DIR = os.path.join(EXECUTABLE_PATH, "logs")
+# Writes are collected in a buffer of this size before they reach the disk
+LOG_BUFFER_SIZE = 1 << 20
+
+log_file = None
+log_failed = False  # Set after an error, so it is not retried and reported for every write
+
+def open_log():
+    """
+    Opens a new log file for this session, named after the current date and time.
+
+    Returns:
+        file: The opened log file, or None if it could not be created.
+    """
+    global log_file
+    close_log()
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        path = os.path.join(LOG_DIR, time.strftime("terminal_%Y%m%d_%H%M%S.log"))
+        log_file = open(path, 'a', encoding='utf-8', buffering=LOG_BUFFER_SIZE)
+    except OSError as e:
+        print(f"Log error: {e}")
+        log_file = None
+    return log_file
+
+def write_log(text):
+    """
+    Appends text to the log file, opening it on first use. Does nothing when the
+    terminal_log setting is off, or after the log failed.
+
+    Args:
+        text (str): The text to append.
+    """
+    global log_failed
+    if not settings["terminal_log"]:
+        log_failed = False
+        return
+    if log_failed:
+        return
+    if log_file is None and open_log() is None:
+        log_failed = True
+        return
+    try:
+        log_file.write(text)
+    except OSError as e:
+        print(f"Log error: {e}")
+        log_failed = True
+        close_log()
+
+def close_log():
+    """
+    Flushes and closes the log file.
+    """
+    global log_file
+    if log_file is not None:
+        try:
+            log_file.close()
+        except OSError as e:
+            print(f"Log error: {e}")
+        log_file = None
@@ -0,0 +1,72 @@
+"""
+Tests of the bounded channel's overflow policies.
+"""
+
+import threading
+import time
+import pytest
+from channel import BoundedChannel
+
+
+def test_drop_oldest():
+    channel = BoundedChannel(5, "drop_oldest")
+    for item, weight in (("a", 2), ("b", 2), ("c", 2)):
+        assert channel.put(item, weight)
+    assert channel.drain() == ["b", "c"]
+    assert channel.dropped == 2 and channel.size == 0
+
+
+def test_drop_newest():
+    channel = BoundedChannel(5, "drop_newest")
+    assert channel.put("a", 2) and channel.put("b", 2)
+    assert not channel.put("c", 2)
+    assert channel.drain() == ["a", "b"]
+    assert channel.dropped == 2
+
+
+def test_oversized_item_enters_empty_channel():
+    channel = BoundedChannel(5, "drop_newest")
+    assert channel.put("big", 50)
+    assert not channel.put("small", 1)
+    assert channel.get() == "big"
+    assert channel.put("small", 1)
+
+
+def test_block_waits_for_room():
+    channel = BoundedChannel(2, "block")
+    channel.put("a", 2)
+    done = threading.Event()
+
+    def put():
+        if channel.put("b", 1):
+            done.set()
+
+    thread = threading.Thread(target=put)
+    thread.start()
+    time.sleep(0.2)
+    assert not done.is_set()
+    assert channel.get() == "a"
+    thread.join(5)
+    assert done.is_set() and channel.drain() == ["b"]
+    assert channel.dropped == 0
+
+
+def test_block_gives_up_when_stopped():
+    channel = BoundedChannel(1, "block")
+    channel.put("a")
+    stop = threading.Event()
+    stop.set()
+    assert not channel.put("b", stop_event=stop)
+    assert channel.dropped == 1
+
+
+def test_wait():
+    channel = BoundedChannel(1)
+    assert not channel.wait(0.01)
+    channel.put("a")
+    assert channel.wait(0.01)
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        BoundedChannel(1, "drop_random")
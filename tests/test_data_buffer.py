@@ -0,0 +1,90 @@
+"""
+Tests of the ring buffer and its pyramid against the stored samples, after the
+buffer has wrapped around.
+"""
+
+import numpy as np
+import pytest
+from data_buffer import PYRAMID_BASE, PYRAMID_FACTOR, RingBuffer
+
+CAPACITY = 100000
+SAMPLES = 250000
+
+
+@pytest.fixture(scope="module")
+def stored():
+    """
+    All samples, and a wrapped ring buffer with x = sample index, a noisy column with gaps and a sine,
+    appended in uneven batches.
+    """
+    rng = np.random.default_rng(1)
+    x = np.arange(SAMPLES, dtype=float)
+    noisy = rng.normal(size=SAMPLES)
+    noisy[rng.random(SAMPLES) < 0.05] = np.nan
+    noisy[200000:200000 + 3 * PYRAMID_BASE] = np.nan  # Whole blocks without values
+    block = np.vstack((x, noisy, np.sin(x / 500), x))
+    ring = RingBuffer(4, CAPACITY)
+    start = 0
+    while start < SAMPLES:
+        size = int(rng.integers(1, 10000))
+        ring.append(block[:, start:start + size])
+        start += size
+    return block, ring
+
+
+def test_keeps_newest_samples(stored):
+    samples, ring = stored
+    assert ring.first_index == SAMPLES - CAPACITY
+    np.testing.assert_array_equal(ring.column(0), samples[0, -CAPACITY:])
+
+
+@pytest.mark.parametrize("level", [0, 1, 2])
+@pytest.mark.parametrize("column", [0, 1])
+def test_blocks_and_means(stored, level, column):
+    samples, ring = stored
+    size = PYRAMID_BASE * PYRAMID_FACTOR ** level
+    begin = -(-ring.first_index // size)
+    end = SAMPLES // size
+    values = samples[1 + column, begin * size:end * size].reshape(-1, size)
+    low, high, low_at, high_at = ring.pyramid.blocks(level, column, begin, end)
+    present = ~np.isnan(values)
+    empty = ~present.any(axis=1)
+    assert empty.any() == (level == 0 and column == 0)  # Only the gap in the noisy column is a whole block
+    np.testing.assert_array_equal(np.isnan(low), empty)
+    np.testing.assert_array_equal(low[~empty], np.nanmin(values[~empty], axis=1))
+    np.testing.assert_array_equal(high[~empty], np.nanmax(values[~empty], axis=1))
+    np.testing.assert_array_equal(samples[1 + column, low_at[~empty]], low[~empty])
+    np.testing.assert_array_equal(samples[1 + column, high_at[~empty]], high[~empty])
+    positions, means = ring.pyramid.means(level, column, begin, end)
+    np.testing.assert_array_equal(positions, np.arange(begin, end) * size + size // 2)
+    np.testing.assert_array_equal(np.isnan(means), empty)
+    np.testing.assert_allclose(means[~empty], np.nanmean(values[~empty], axis=1))
+
+
+@pytest.mark.parametrize("width", [50, 333, 1000])
+@pytest.mark.parametrize("first, last", [(None, SAMPLES), (175000, 240000), (151234, 249999)])
+def test_overview_minmax(stored, width, first, last):
+    samples, ring = stored
+    first = ring.first_index if first is None else first
+    x, y = ring.overview(0, 2, first, last, width)
+    assert np.all(np.diff(x) >= 0)
+    assert len(x) <= 4 * width + 2 * PYRAMID_BASE * PYRAMID_FACTOR
+    np.testing.assert_array_equal(y, samples[2, x.astype(int)])
+    values = samples[2, first:last]
+    assert y.min() == values.min() and y.max() == values.max()
+
+
+@pytest.mark.parametrize("width", [50, 1000])
+def test_overview_mean(stored, width):
+    samples, ring = stored
+    first, last = ring.first_index, SAMPLES
+    x, y = ring.overview(0, 1, first, last, width, "mean")
+    assert np.all(np.diff(x) > 0)
+    assert len(x) < 2 * width + 2 * PYRAMID_BASE * PYRAMID_FACTOR
+    values = samples[1, first:last]
+    assert np.nanmin(values) <= np.nanmin(y) and np.nanmax(y) <= np.nanmax(values)
+
+
+def test_overview_needs_enough_samples(stored):
+    _, ring = stored
+    assert ring.overview(0, 1, SAMPLES - 10, SAMPLES, 1000) is None
@@ -0,0 +1,55 @@
+"""
+Tests of batch parsing against the per-field rule it replaces: the first number in
+each tab-separated field, NaN where a field is missing or has no number.
+"""
+
+import re
+import numpy as np
+import pytest
+from data_parser import parse_batch, project_samples
+
+LINES = [
+    "1\t2.5\t-3\n",
+    "t=4\tv:+5.\t.75e\n",
+    "7\t\tx\n",
+    "8\n",
+    "\n",
+    "9\t10\t11\t12\textra\n",
+    "a\tb\tc\n",
+]
+
+
+def reference(lines, column):
+    """
+    Parses one column the way the original parser did, one field at a time.
+    """
+    values = []
+    for line in lines:
+        fields = line.rstrip("\n").split("\t")
+        found = re.search(r'[-+]?\d*\.?\d+', fields[column]) if column < len(fields) else None
+        values.append(float(found.group()) if found else np.nan)
+    return np.array(values)
+
+
+@pytest.mark.parametrize("x_column, y_columns", [(0, [1, 2]), (None, [2, 0]), (3, [1, 1, 5]), (0, [])])
+def test_parse_batch_matches_reference(x_column, y_columns):
+    x, y = parse_batch(LINES, {"x_column": x_column, "y_columns": y_columns})
+    if x_column is None:
+        assert np.isnan(x).all()
+    else:
+        np.testing.assert_array_equal(x, reference(LINES, x_column))
+    assert y.shape == (len(y_columns), len(LINES))
+    for row, column in zip(y, y_columns):
+        np.testing.assert_array_equal(row, reference(LINES, column))
+
+
+def test_parse_empty_batch():
+    x, y = parse_batch([], {"x_column": 0, "y_columns": [1]})
+    assert x.shape == (0,) and y.shape == (1, 0)
+
+
+def test_project_samples():
+    samples = np.arange(6, dtype=float).reshape(2, 3)
+    x, y = project_samples(samples, {"x_column": 1, "y_columns": [0, 4]})
+    np.testing.assert_array_equal(x, [3, 4, 5])
+    np.testing.assert_array_equal(y, [[0, 1, 2], [np.nan] * 3])
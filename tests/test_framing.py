@@ -0,0 +1,74 @@
+"""
+Tests of binary framing: COBS and SLIP round trips, frame CRCs, struct layouts and
+the frame decoder fed in arbitrary chunks.
+"""
+
+import binascii
+import struct
+import zlib
+import numpy as np
+import pytest
+from framing import cobs_decode, cobs_encode, sample_dtype, slip_decode, slip_encode, strip_crc
+from serial_handler import FrameDecoder
+
+FRAMES = [b"", b"\x00", b"\x00\x00", b"abc", b"a\x00b\x00", bytes(range(256)), b"\x11" * 254, b"\x11" * 600]
+
+
+@pytest.mark.parametrize("frame", FRAMES)
+def test_cobs_round_trip(frame):
+    encoded = cobs_encode(frame)
+    assert b"\x00" not in encoded
+    assert cobs_decode(encoded) == frame
+
+
+def test_cobs_rejects_invalid_frame():
+    with pytest.raises(ValueError):
+        cobs_decode(b"\x05ab")
+
+
+@pytest.mark.parametrize("frame", FRAMES + [b"\xc0\xdb\xdc\xdd"])
+def test_slip_round_trip(frame):
+    encoded = slip_encode(frame)
+    assert b"\xc0" not in encoded
+    assert slip_decode(encoded) == frame
+
+
+def test_crc():
+    payload = b"sample"
+    crc16 = payload + binascii.crc_hqx(payload, 0xFFFF).to_bytes(2, 'little')
+    crc32 = payload + zlib.crc32(payload).to_bytes(4, 'little')
+    assert strip_crc(payload, "none") == payload
+    assert strip_crc(crc16, "crc16") == payload
+    assert strip_crc(crc32, "crc32") == payload
+    assert strip_crc(b"x" + crc16[1:], "crc16") is None
+    assert strip_crc(b"x", "crc32") is None
+
+
+@pytest.mark.parametrize("frame_format", ["<Iff", ">hxd", "=bq", "@bq", "lL", "<3H", "<u4,<f4"])
+def test_sample_dtype_matches_struct(frame_format):
+    dtype = sample_dtype(frame_format)
+    if ',' in frame_format:
+        assert dtype.itemsize == 8
+        return
+    values = tuple(range(1, len(dtype.names) + 1))
+    record = np.frombuffer(struct.pack(frame_format, *values), dtype=dtype)[0]
+    assert dtype.itemsize == struct.calcsize(frame_format)
+    assert tuple(record[name] for name in dtype.names) == values
+
+
+@pytest.mark.parametrize("framing, encode, end", [("cobs", cobs_encode, b"\x00"), ("slip", slip_encode, b"\xc0")])
+def test_frame_decoder(framing, encode, end):
+    decoder = FrameDecoder(framing, "<Hf", "crc16")
+    samples = [(i, i / 4) for i in range(50)]
+    stream = b""
+    for i, sample in enumerate(samples):
+        payload = struct.pack("<Hf", *sample)
+        payload += binascii.crc_hqx(payload, 0xFFFF).to_bytes(2, 'little')
+        if i == 10:
+            stream += encode(b"\xff" + payload[1:]) + end  # Bad CRC
+        stream += encode(payload) + end
+    stream += encode(b"short") + end
+    decoded = [decoder.feed(stream[i:i + 7]) for i in range(0, len(stream), 7)]
+    columns = np.hstack([block for block in decoded if block is not None])
+    np.testing.assert_array_equal(columns, np.array(samples).T)
+    assert decoder.errors == 2
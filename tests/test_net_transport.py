@@ -0,0 +1,123 @@
+"""
+Loopback tests of NetworkPort over socket:// URLs: reading, reconnecting after the
+server drops the link, and giving up on a write the peer does not take.
+"""
+
+import socket
+import threading
+import time
+import pytest
+import serial
+import net_transport
+from handler_config import settings
+from net_transport import NetworkPort
+from serial_handler import LineDecoder
+
+# Seconds to wait for the port or the server
+TIMEOUT = 5.0
+
+
+@pytest.fixture
+def server():
+    """
+    A listening socket on a free local port.
+    """
+    listener = socket.create_server(("127.0.0.1", 0))
+    listener.settimeout(TIMEOUT)
+    yield listener
+    listener.close()
+
+
+@pytest.fixture(autouse=True)
+def fast_reconnect(monkeypatch):
+    """
+    Retries dropped links within a fraction of a second.
+    """
+    monkeypatch.setitem(settings, "reconnect_initial", 0.05)
+    monkeypatch.setitem(settings, "reconnect_max", 0.1)
+
+
+def url(listener):
+    return f"socket://127.0.0.1:{listener.getsockname()[1]}"
+
+
+def read_lines(port, decoder, wanted):
+    """
+    Reads from the port until wanted lines have been decoded.
+    """
+    lines = []
+    deadline = time.monotonic() + TIMEOUT
+    while len(lines) < wanted:
+        assert time.monotonic() < deadline, f"only got {lines}"
+        lines += decoder.feed(port.read(4096))
+    return lines
+
+
+def test_read_and_write(server):
+    port = NetworkPort(url(server), 115200, timeout=0.05)
+    connection, _ = server.accept()
+    port.write(b"ping\n")
+    assert connection.recv(16) == b"ping\n"
+    connection.sendall(b"1 2\n3 4\n")
+    assert read_lines(port, LineDecoder(), 2) == ["1 2\n", "3 4\n"]
+    connection.close()
+    port.close()
+
+
+def test_reconnect_discards_partial_line(server):
+    sent = threading.Event()
+
+    def serve():
+        first, _ = server.accept()
+        first.sendall(b"1 2\n5")  # The link drops in the middle of a line
+        first.close()
+        second, _ = server.accept()
+        second.sendall(b"5 6\n")
+        sent.wait(TIMEOUT)
+        second.close()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    port = NetworkPort(url(server), 115200, timeout=0.05)
+    decoder = LineDecoder()
+    port.on_reconnect = decoder.reset
+    assert read_lines(port, decoder, 2) == ["1 2\n", "5 6\n"]
+    assert port.reconnects == 1 and port.connected
+    sent.set()
+    thread.join(TIMEOUT)
+    port.close()
+
+
+def test_write_fails_while_disconnected(server):
+    port = NetworkPort(url(server), 115200, timeout=0.05)
+    connection, _ = server.accept()
+    connection.close()
+    deadline = time.monotonic() + TIMEOUT
+    while port.connected:
+        assert time.monotonic() < deadline, "the dropped link went unnoticed"
+        port.read(1)
+    server.close()  # Nothing to reconnect to
+    with pytest.raises(serial.SerialException):
+        port.write(b"lost\n")
+    port.close()
+
+
+def test_stalled_write_drops_link(server, monkeypatch):
+    monkeypatch.setattr(net_transport, "WRITE_TIMEOUT", 0.2)
+    monkeypatch.setitem(settings, "socket_buffer_bytes", 4096)
+    port = NetworkPort(url(server), 115200, timeout=0.05)
+    connection, _ = server.accept()  # Never reads, so the kernel buffers fill up
+    started = time.monotonic()
+    with pytest.raises(serial.SerialException):
+        port.write(bytes(64 << 20))
+    assert time.monotonic() - started < TIMEOUT
+    assert not port.connected
+    connection.close()
+    port.close()
+
+
+def test_unreachable_url_fails_to_open(server):
+    address = url(server)
+    server.close()
+    with pytest.raises(serial.SerialException):
+        NetworkPort(address, 115200)
@@ -0,0 +1,103 @@
+"""
+Loopback tests of the publisher: a client subscribes over a local socket and decodes
+the batches in both message formats.
+"""
+
+import json
+import os
+import socket
+import time
+import numpy as np
+import pytest
+import publisher
+from handler_config import settings
+
+# Seconds to wait for the publisher threads
+TIMEOUT = 5.0
+
+
+@pytest.fixture
+def publishing():
+    """
+    Stops the publisher after the test, whatever it left running.
+    """
+    yield
+    publisher.stop_publishing()
+
+
+def subscribe(address):
+    """
+    Starts publishing on an address and connects a client to it.
+
+    Returns:
+        socket.socket: The client, once the publisher has accepted it.
+    """
+    assert publisher.start_publishing(address)
+    if address.startswith("tcp://"):
+        client = socket.create_connection(publisher.listener.getsockname())
+    else:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(address[len("unix://"):])
+    client.settimeout(TIMEOUT)
+    deadline = time.monotonic() + TIMEOUT
+    while not publisher.subscribers:
+        assert time.monotonic() < deadline, "the publisher did not accept the client"
+        time.sleep(0.01)
+    return client
+
+
+def receive(client, size):
+    """
+    Reads exactly size bytes from the client.
+    """
+    data = b""
+    while len(data) < size:
+        chunk = client.recv(size - len(data))
+        assert chunk, "the publisher closed the connection"
+        data += chunk
+    return data
+
+
+def test_ndjson(publishing, monkeypatch):
+    monkeypatch.setitem(settings, "publish_format", "ndjson")
+    client = subscribe("tcp://127.0.0.1:0")
+    block = np.array([[0.0, 1.0], [2.5, np.nan], [10.0, 11.0]])
+    publisher.publish_samples(block, 123.5, "COM1", {"x_column": 0, "y_columns": [1]})
+    reader = client.makefile('rb')
+    message = json.loads(reader.readline())
+    assert message == {
+        "source": "COM1",
+        "time": 123.5,
+        "x_column": 0,
+        "y_columns": [1],
+        "data": [[0.0, 1.0], [2.5, None], [10.0, 11.0]],
+    }
+    client.close()
+
+
+def test_binary(publishing, monkeypatch):
+    monkeypatch.setitem(settings, "publish_format", "binary")
+    client = subscribe("tcp://127.0.0.1:0")
+    block = np.arange(12, dtype=float).reshape(3, 4)
+    for source in ("COM1", "udp"):
+        publisher.publish_samples(block + len(source), 7.25, source)
+    for source in ("COM1", "udp"):
+        magic, length, columns, samples, timestamp = publisher.BINARY_HEADER.unpack(
+            receive(client, publisher.BINARY_HEADER.size))
+        assert (magic, columns, samples, timestamp) == (publisher.BINARY_MAGIC, 3, 4, 7.25)
+        assert receive(client, length).decode() == source
+        data = np.frombuffer(receive(client, 8 * columns * samples), dtype='<f8').reshape(columns, samples)
+        np.testing.assert_array_equal(data, block + len(source))
+    client.close()
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="no Unix sockets")
+def test_unix_socket_is_removed(publishing, monkeypatch, tmp_path):
+    monkeypatch.setitem(settings, "publish_format", "ndjson")
+    path = str(tmp_path / "samples.sock")
+    client = subscribe(f"unix://{path}")
+    publisher.publish_samples(np.zeros((2, 1)), 1.0, "COM1")
+    assert json.loads(client.makefile('rb').readline())["data"] == [[0.0], [0.0]]
+    client.close()
+    publisher.stop_publishing()
+    assert not os.path.exists(path)
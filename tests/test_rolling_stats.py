@@ -0,0 +1,63 @@
+"""
+Tests of the incremental statistics against NumPy over the same samples.
+"""
+
+import numpy as np
+import pytest
+from rolling_stats import RollingStats, format_stats
+
+WINDOW = 500
+
+
+def feed(stats, samples, sizes):
+    """
+    Feeds samples shaped (x, ys, time) to stats in batches of the given sizes, cycled.
+    """
+    start, turn = 0, 0
+    while start < samples.shape[1]:
+        size = sizes[turn % len(sizes)]
+        stats.update(samples[:, start:start + size])
+        start += size
+        turn += 1
+
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(2)
+    count = 5000
+    noisy = 1e6 + rng.normal(size=count)  # Far from zero, to catch cancellation
+    noisy[rng.random(count) < 0.1] = np.nan
+    ramp = np.arange(count) * 0.5
+    times = np.arange(count) * 0.01
+    return np.vstack((np.arange(count), noisy, ramp, times))
+
+
+@pytest.mark.parametrize("sizes", [[1], [7, 300, 1], [WINDOW], [WINDOW + 1], [2000]])
+def test_matches_numpy(samples, sizes):
+    stats = RollingStats(2, WINDOW)
+    feed(stats, samples, sizes)
+    for values, result in zip(samples[1:-1], stats.results()):
+        recent = values[-WINDOW:]
+        assert result["count"] == np.count_nonzero(~np.isnan(values))
+        assert result["mean"] == pytest.approx(np.nanmean(values), rel=1e-12)
+        assert result["std"] == pytest.approx(np.nanstd(values), rel=1e-6)
+        assert result["window_mean"] == pytest.approx(np.nanmean(recent), rel=1e-12)
+        assert result["window_std"] == pytest.approx(np.nanstd(recent), rel=1e-6)
+        assert result["min"] == np.nanmin(recent)
+        assert result["max"] == np.nanmax(recent)
+    assert stats.results()[1]["rate"] == pytest.approx(50.0)
+
+
+def test_empty_and_reset(samples):
+    stats = RollingStats(2, WINDOW)
+    assert all(np.isnan(result["mean"]) and np.isnan(result["min"]) for result in stats.results())
+    feed(stats, samples, [100])
+    stats.reset()
+    assert [result["count"] for result in stats.results()] == [0, 0]
+
+
+def test_format_stats(samples):
+    stats = RollingStats(2, WINDOW)
+    feed(stats, samples, [1000])
+    text = format_stats("COM1", [1, 4], stats.results())
+    assert text.startswith("COM1 Column2\n") and "COM1 Column5\n" in text
@@ -0,0 +1,48 @@
+"""
+Guards the cold start: importing main, and building the main window, must not load
+matplotlib, and importing main may take only a little longer than importing the
+libraries it cannot do without.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import pytest
+from benchmark import time_startup
+
+# Runs per measurement; the median is compared
+RUNS = 3
+# Seconds main may take to import beyond numpy, pyserial and tkinter. Loading
+# matplotlib eagerly alone adds several times this.
+STARTUP_MARGIN = 0.1
+BASELINE_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import numpy, serial, tkinter
+print(json.dumps({"import_seconds": time.perf_counter() - start}))
+"""
+
+
+def baseline_import_seconds():
+    """
+    Returns the time a fresh interpreter takes to import numpy, pyserial and tkinter.
+    """
+    finished = subprocess.run([sys.executable, "-c", BASELINE_SCRIPT], capture_output=True, text=True, check=True)
+    return json.loads(finished.stdout)["import_seconds"]
+
+
+def test_import_main_does_not_load_matplotlib():
+    assert not time_startup(False)["matplotlib_loaded"]
+
+
+def test_import_main_stays_within_margin():
+    main = statistics.median(time_startup(False)["import_seconds"] for _ in range(RUNS))
+    baseline = statistics.median(baseline_import_seconds() for _ in range(RUNS))
+    assert main <= baseline + STARTUP_MARGIN, f"import main took {main:.3f} s, its libraries {baseline:.3f} s"
+
+
+@pytest.mark.skipif(sys.platform.startswith("linux") and not os.environ.get("DISPLAY"), reason="needs a display")
+def test_main_window_does_not_load_matplotlib():
+    assert not time_startup(True)["matplotlib_loaded"]
@@ -12,33 +12,64 @@ Attributes:
     command_entry (tk.Entry): The entry widget for sending commands.
     data_display (tk.Widget): The widget to display received data.
     graph_button (tk.Button): The button to open the graph window.
+    record_button (tk.Button): The button to start/stop recording captures.
     graph_window (tk.Toplevel): The window displaying the graph.
     x_column_entry (tk.Entry): The entry widget for the x-axis column configuration.
     y_columns_entry (tk.Entry): The entry widget for the y-axis columns configuration.
-    x_coords (list): The list of x coordinates for plotting.
-    y_coords (list of lists): The list of y coordinate lists for plotting.
     lines (list): The list of line objects in the plot.
     ax (matplotlib.axes.Axes): The axis object for the plot.
     fig (matplotlib.figure.Figure): The figure object for the plot.
     canvas (FigureCanvasTkAgg): The canvas for displaying the Matplotlib figure in Tkinter.
+    column_stats (tk.Label): The panel next to the plot showing the rolling statistics of its columns.
+    column_stats_time (float): The monotonic time the column statistics were last shown.
+    plot_dirty (bool): Whether data arrived since the plot was last redrawn.
+    last_frame_time (float): The monotonic time of the last plot redraw.
+    decimation_key (tuple): What the plotted lines were last decimated for (data versions, layout, width, view).
+    line_layout (tuple): The sessions and columns the plotted lines were created for.
+    pending_arrivals (list): Arrival times of the plotted batches not yet drawn on screen.
+    display_phase (int): Received lines since the last one shown, when only every Nth line is displayed.
+    port_watcher (PortWatcher): Lists the serial ports in the background.
+    port_list (list): The serial ports currently offered in the port selector.
+    lost_devices (dict): Baud rates of unplugged devices to reconnect, by device identity.
+    stats_window (tk.Toplevel): The window showing pipeline statistics.
+    stats_label (tk.Label): The label holding the statistics text.
+    stats_previous (dict): The statistics snapshot shown last, used to compute rates.
 """
 
 port_selector = None
 baudrate_entry = None
 connect_button = None
+connect_status = None
 command_entry = None
 data_display = None
 graph_button = None
+record_button = None
 graph_window = None
 text_button = None
 text_window = None
 x_column_entry = None
 y_columns_entry = None
-x_coords = []
-y_coords = []
 lines = []
 ax = None
 fig = None
 canvas = None
+column_stats = None
+column_stats_time = 0.0
+plot_dirty = False
+last_frame_time = 0.0
+decimation_key = None
+line_layout = None
+pending_arrivals = []
+display_phase = 0
+port_watcher = None
+port_list = []
+lost_devices = {}
+pending_connects = {}
+write_button = None
+write_status = None
+write_jobs = []
+stats_window = None
+stats_label = None
+stats_previous = None
 final_text = None
 global_config = None
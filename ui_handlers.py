@@ -1,62 +1,228 @@
 """
 This module handles the user interface actions for the Microcontroller Interface application.
-It includes functions to manage serial connection, send commands, display data, handle graph
+It includes functions to manage serial sessions, send commands, display data, handle graph
 toggle, and update plot configuration.
 
 Functions:
     - connect_button_action: Handles connect/disconnect button action.
+    - refresh_connect_button: Shows the connection state of the selected port.
+    - begin_connect: Starts connecting to a port in the background.
+    - poll_connects: Applies the progress of the connections being made.
+    - watch_ports: Starts the port watcher and applies its changes periodically.
+    - apply_port_changes: Updates the port selector and sessions after ports came or went.
+    - display_notice: Displays a status message in the data display.
+    - command_target: Returns the port that commands are sent to.
     - send_command_ui: Sends a command from the command entry.
     - send_permanent_command_ui: Sends a command from a permanent command entry.
     - display_user_command: Displays a user's command in the data display.
-    - display_data: Displays incoming data in the data display.
+    - display_data: Displays a batch of incoming data in the data display.
+    - trim_display: Removes the oldest lines beyond the configured limit from the data display.
     - reset_data: Resets the data and clears the data display.
     - toggle_graph: Toggles the visibility of the graph window.
+    - record_button_action: Starts or stops recording captures.
+    - replay_button_action: Selects a capture file to replay.
+    - send_file_button_action: Streams a file to the device, or cancels the upload.
+    - track_writes: Shows the progress of queued sends until they have finished.
+    - refresh_write_status: Periodically updates the progress of the queued sends.
+    - stats_button_action: Opens or closes the pipeline statistics window.
+    - refresh_stats_window: Periodically updates the pipeline statistics window.
     - update_plot_config_ui: Updates the plot configuration based on UI inputs.
-    - update_plot: Updates the plot with new data from the data queue.
+    - frame_interval: Returns the minimum time between two plot redraws.
+    - consume_session: Displays and stores the data queued by one session.
+    - report_commands: Checks a session's commands for overdue responses.
+    - report_lost: Closes a session whose port failed while being read.
+    - update_plot: Updates the plot with new data from the data queues.
 """
 
-from handler_config import plot_config, permanent_command_entries
+from handler_config import plot_config, permanent_command_entries, settings
 from plot_handler import (
     create_plot_window, 
     close_plot_window, 
+    is_graph_visible, 
     update_graph, 
+    update_column_stats, 
     update_plot_config, 
-    recreate_plot_window, 
-    parse_data
+    recreate_plot_window
 )
-from serial_handler import send_command, data_queue
+from session import start_connect, send_command, send_file, get_session, all_sessions, forget_closed_sessions, set_recording
+from port_watcher import PortWatcher, port_identity, matches_device
+from data_parser import parse_batch, project_samples
+from terminal_log import write_log
+from recorder import CAPTURE_DIR, start_recording, stop_recording
+from replay import REPLAY_SCHEME
+from pipeline_stats import set_gauge, observe, observe_latency, snapshot, format_snapshot
+import numpy as np
 import tkinter as tk
+from tkinter import filedialog
+import queue
+import time
 import ui_context as ctx
 
-def connect_button_action(connect_serial, disconnect_serial):
+# How often the statistics window and the column statistics are refreshed
+STATS_REFRESH_MS = 500
+# How often the port watcher's changes are applied
+PORT_CHANGES_POLL_MS = 200
+# Shown in the port selector while the ports are being listed
+PORT_SCAN_TEXT = "Searching ports..."
+NO_PORTS_TEXT = "No ports available"
+# How often the connections being made are checked
+CONNECT_POLL_MS = 50
+# How often the progress of queued sends is refreshed
+WRITE_STATUS_MS = 200
+
+def connect_button_action(start_connect, disconnect_serial):
     """
-    Handles the connect/disconnect button action. Connects to or disconnects from the serial port
-    based on the current state of the button.
+    Handles the connect/disconnect button action. Starts connecting to, or disconnects
+    from, the port in the port selector; other sessions stay connected either way. A
+    connection still being made is cancelled instead.
 
     Args:
-        connect_serial (function): Function to connect to the serial port.
+        start_connect (function): Function to start connecting to the serial port.
         disconnect_serial (function): Function to disconnect from the serial port.
     """
-    if ctx.connect_button.config('text')[-1] == 'Connect':
-        selected_port = ctx.port_selector.get()
-        selected_baudrate = int(ctx.baudrate_entry.get())
-        if selected_port:
-            if connect_serial(selected_port, selected_baudrate):
-                ctx.port_selector.config(state='disabled')
-                ctx.baudrate_entry.config(state='disabled')
-                ctx.connect_button.config(text='Disconnect')
-    else:
-        disconnect_serial()
-        ctx.port_selector.config(state='normal')
-        ctx.baudrate_entry.config(state='normal')
-        ctx.connect_button.config(text='Connect')
+    selected_port = ctx.port_selector.get()
+    session = get_session(selected_port)
+    pending = ctx.pending_connects.get(selected_port)
+    if pending is not None:
+        pending.cancel()
+        ctx.connect_status.config(text=f"Cancelling {selected_port}")
+    elif session is not None and session.is_open:
+        disconnect_serial(selected_port)
+    elif selected_port:
+        begin_connect(selected_port, int(ctx.baudrate_entry.get()), start_connect)
+    refresh_connect_button()
+
+def refresh_connect_button(*args):
+    """
+    Shows the connection state of the port in the port selector on the connect button
+    and locks the baud rate while that port is connected or connecting.
+    """
+    session = get_session(ctx.port_selector.get())
+    connected = session is not None and session.is_open
+    connecting = ctx.port_selector.get() in ctx.pending_connects
+    ctx.baudrate_entry.config(state='disabled' if connected or connecting else 'normal')
+    ctx.connect_button.config(text='Cancel' if connecting else 'Disconnect' if connected else 'Connect')
+
+def begin_connect(port, baudrate, start_connect=start_connect):
+    """
+    Starts connecting to a port in the background and has its progress shown next to
+    the connect button until it is connected or has failed.
+
+    Args:
+        port (str): The serial port to connect to.
+        baudrate (int): The baud rate for the serial connection.
+        start_connect (function): Function to start connecting to the serial port.
+    """
+    if port in ctx.pending_connects:
+        return
+    pending = start_connect(port, baudrate)
+    ctx.pending_connects[port] = pending
+    ctx.connect_status.config(text=pending.status)
+    if len(ctx.pending_connects) == 1:
+        ctx.connect_button.after(CONNECT_POLL_MS, poll_connects)
+
+def poll_connects():
+    """
+    Applies the progress of the connections being made, and keeps polling while any
+    of them is still in progress.
+    """
+    for port, pending in list(ctx.pending_connects.items()):
+        result = pending.poll()
+        ctx.connect_status.config(text=pending.status)
+        if result is None:
+            continue
+        del ctx.pending_connects[port]
+        if result:
+            display_notice(pending.status)
+    refresh_connect_button()
+    if ctx.pending_connects:
+        ctx.connect_button.after(CONNECT_POLL_MS, poll_connects)
+
+def watch_ports(root):
+    """
+    Starts the port watcher, which lists the serial ports in the background, and
+    applies the changes it finds to the UI periodically.
+
+    Args:
+        root (tk.Tk): The Tkinter root window.
+    """
+    ctx.port_watcher = PortWatcher(settings["port_scan_seconds"])
+    ctx.port_watcher.start()
+
+    def poll():
+        apply_port_changes()
+        root.after(PORT_CHANGES_POLL_MS, poll)
+
+    root.after(PORT_CHANGES_POLL_MS, poll)
+
+def apply_port_changes():
+    """
+    Applies the port watcher's changes: the port selector gains and loses the ports
+    that came and went, keeping the current choice. A connected port that disappears
+    is disconnected. With the auto_reconnect setting on, a device that comes back is
+    reconnected. A device listed in the reconnect_devices setting is connected
+    whenever it appears, whatever auto_reconnect says.
+    """
+    while True:
+        try:
+            added, removed = ctx.port_watcher.changes.get_nowait()
+        except queue.Empty:
+            break
+        for info in removed:
+            if info.device in ctx.port_list:
+                ctx.port_list.remove(info.device)
+            session = get_session(info.device)
+            if session is not None and session.is_open:
+                session.close()
+                display_notice(f"{info.device} was unplugged")
+                if port_identity(info) is not None:
+                    ctx.lost_devices[port_identity(info)] = session.baudrate
+        for info in added:
+            ctx.port_list.append(info.device)
+            identity = port_identity(info)
+            wanted = (settings["auto_reconnect"] and identity in ctx.lost_devices) or any(
+                matches_device(info, device) for device in settings["reconnect_devices"])
+            session = get_session(info.device)
+            if wanted and (session is None or not session.is_open):
+                baudrate = ctx.lost_devices.pop(identity, None) or int(ctx.baudrate_entry.get())
+                begin_connect(info.device, baudrate)
+        ctx.port_list.sort()
+        ctx.port_selector.config(values=ctx.port_list)
+        if ctx.port_selector.get() in (PORT_SCAN_TEXT, NO_PORTS_TEXT):
+            ctx.port_selector.set(ctx.port_list[0] if ctx.port_list else NO_PORTS_TEXT)
+        refresh_connect_button()
+
+def display_notice(text):
+    """
+    Displays a status message, such as a port coming or going, in the data display.
+
+    Args:
+        text (str): The message.
+    """
+    notice = f"--- {text} ---\n"
+    ctx.data_display.insert(tk.END, notice, 'notice')
+    trim_display()
+    ctx.data_display.see(tk.END)
+    write_log(notice)
+
+def command_target():
+    """
+    Returns the port that commands are sent to: the port in the port selector if it is
+    connected, otherwise None, which sends to every connected session.
+
+    Returns:
+        str: The port name, or None.
+    """
+    selected_port = ctx.port_selector.get()
+    session = get_session(selected_port)
+    return selected_port if session is not None and session.is_open else None
 
 def send_command_ui():
     """
     Sends a command from the command entry widget to the serial device.
     """
     command = ctx.command_entry.get()
-    send_command(command)
+    send_command(command, command_target())
     display_user_command(command)
     ctx.command_entry.delete(0, tk.END)
 
@@ -68,7 +234,7 @@ def send_permanent_command_ui(entry):
         entry (tk.Entry): The entry widget containing the command.
     """
     command = entry.get()
-    send_command(command)
+    send_command(command, command_target())
     display_user_command(command)
 
 def display_user_command(command):
@@ -80,43 +246,185 @@ def display_user_command(command):
     """
     user_command = f"user > {command}\n"
     ctx.data_display.insert(tk.END, user_command, 'user')
+    trim_display()
     ctx.data_display.see(tk.END)
+    write_log(user_command)
 
-def display_data(data):
+def display_data(lines, source=None):
     """
-    Displays incoming data in the data display.
+    Displays a batch of incoming data in the data display with a single insert and a
+    single scroll. With the display_every setting above 1, only every Nth received line
+    is shown, counting across batches; the full text still goes to the terminal log.
 
     Args:
-        data (str): The data to display.
+        lines (list): The received lines to display.
+        source (str): The session the lines came from; when given, each line is prefixed with it.
     """
-    ctx.data_display.insert(tk.END, data)
-    ctx.data_display.see(tk.END)
+    if source is not None:
+        lines = [f"[{source}] {line}" for line in lines]
+    data = ''.join(lines)
+    every = max(int(settings["display_every"]), 1)
+    if every > 1:
+        shown = ''.join(lines[-ctx.display_phase % every::every])
+        ctx.display_phase = (ctx.display_phase + len(lines)) % every
+    else:
+        shown = data
+    if shown:
+        ctx.data_display.insert(tk.END, shown)
+        trim_display()
+        ctx.data_display.see(tk.END)
+    write_log(data)
+
+def trim_display():
+    """
+    Removes the oldest lines from the data display so that at most display_max_lines
+    lines remain.
+    """
+    line_count = int(ctx.data_display.index('end-1c').split('.')[0])
+    excess = line_count - int(settings["display_max_lines"])
+    if excess > 0:
+        ctx.data_display.delete('1.0', f'{excess + 1}.0')
 
 def reset_data():
     """
-    Resets the data and clears the data display and plot.
+    Resets the data and clears the data display and plot. Disconnected sessions are
+    removed altogether.
     """
-    ctx.x_coords.clear()
-    ctx.y_coords.clear()
+    forget_closed_sessions()
+    for session in all_sessions():
+        session.reset_store()
     ctx.data_display.delete('1.0', tk.END)
     if ctx.graph_window and ctx.graph_window.winfo_exists():
-        update_graph(ctx.x_coords, ctx.y_coords, ctx.lines, ctx.ax, ctx.fig)
+        update_graph(all_sessions(), ctx.lines, ctx.ax, ctx.fig)
 
 def toggle_graph():
     """
     Toggles the visibility of the graph window.
     """
     if ctx.graph_window is None or not ctx.graph_window.winfo_exists():
-        ctx.graph_window, ctx.canvas, ctx.lines, ctx.ax, ctx.fig = create_plot_window(ctx.x_coords, ctx.y_coords)
+        ctx.graph_window, ctx.canvas, ctx.lines, ctx.ax, ctx.fig = create_plot_window(all_sessions())
         ctx.graph_button.config(text="Hide Graph")
     else:
         close_plot_window(ctx.graph_window, ctx.canvas)
         ctx.graph_window = None
         ctx.graph_button.config(text="Show Graph")
 
+def record_button_action():
+    """
+    Starts or stops recording received data to capture files.
+    """
+    if ctx.record_button.config('text')[-1] == 'Record':
+        start_recording()
+        set_recording(True)
+        ctx.record_button.config(text='Stop Recording')
+    else:
+        set_recording(False)
+        stop_recording()
+        ctx.record_button.config(text='Record')
+
+def replay_button_action():
+    """
+    Asks for a capture file and puts its replay URL into the port selector. The speed
+    in the URL can be edited before connecting: 1 is real time, "max" is as fast as
+    possible.
+    """
+    path = filedialog.askopenfilename(
+        title="Replay Capture",
+        initialdir=CAPTURE_DIR,
+        filetypes=[("Captures", "*.bin"), ("All files", "*")]
+    )
+    if path:
+        ctx.port_selector.set(f"{REPLAY_SCHEME}{path}?speed=1")
+        refresh_connect_button()
+
+def send_file_button_action():
+    """
+    Asks for a file and streams it to the device in paced chunks, without blocking
+    the UI. While an upload is running, the button cancels it instead.
+    """
+    if ctx.write_jobs:
+        for job in ctx.write_jobs:
+            job.cancel()
+        return
+    path = filedialog.askopenfilename(title="Send File")
+    if not path:
+        return
+    try:
+        jobs = send_file(path, command_target())
+    except OSError as e:
+        print(f"File error: {e}")
+        return
+    if jobs:
+        track_writes(jobs)
+
+def track_writes(jobs):
+    """
+    Shows the progress and throughput of queued sends until they have finished.
+
+    Args:
+        jobs (list): The WriteJob objects to follow.
+    """
+    if not ctx.write_jobs:
+        ctx.write_status.after(WRITE_STATUS_MS, refresh_write_status)
+    ctx.write_jobs.extend(jobs)
+    ctx.write_button.config(text='Cancel Send')
+    refresh_write_status(schedule=False)
+
+def refresh_write_status(schedule=True):
+    """
+    Updates the progress and throughput of the followed sends, and displays a notice
+    for each one that has finished.
+
+    Args:
+        schedule (bool): Whether to schedule the next refresh while sends remain.
+    """
+    for job in [job for job in ctx.write_jobs if job.done.is_set()]:
+        ctx.write_jobs.remove(job)
+        outcome = "Sent" if job.error is None else f"Stopped ({job.error})"
+        display_notice(f"{outcome} {job.label}: {job.sent:,} of {job.total:,} bytes at {job.rate / 1000:.1f} kB/s")
+    if not ctx.write_jobs:
+        ctx.write_status.config(text="")
+        ctx.write_button.config(text='Send File...')
+        return
+    sent = sum(job.sent for job in ctx.write_jobs)
+    total = sum(job.total for job in ctx.write_jobs)
+    rate = sum(job.rate for job in ctx.write_jobs)
+    ctx.write_status.config(text=f"{sent / total:.0%}\n{rate / 1000:.1f} kB/s")
+    if schedule:
+        ctx.write_status.after(WRITE_STATUS_MS, refresh_write_status)
+
+def stats_button_action():
+    """
+    Opens the pipeline statistics window, or closes it if it is open.
+    """
+    if ctx.stats_window is not None and ctx.stats_window.winfo_exists():
+        ctx.stats_window.destroy()
+        ctx.stats_window = None
+        return
+    ctx.stats_window = tk.Toplevel()
+    ctx.stats_window.title("Pipeline Statistics")
+    ctx.stats_label = tk.Label(ctx.stats_window, font=("Courier", 10), justify=tk.LEFT, anchor='nw')
+    ctx.stats_label.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+    ctx.stats_previous = snapshot()
+    ctx.stats_window.after(STATS_REFRESH_MS, refresh_stats_window)
+
+def refresh_stats_window():
+    """
+    Updates the pipeline statistics window and schedules the next update while the
+    window is open.
+    """
+    if ctx.stats_window is None or not ctx.stats_window.winfo_exists():
+        return
+    current = snapshot(ctx.stats_previous)
+    ctx.stats_label.config(text=format_snapshot(current))
+    ctx.stats_previous = current
+    ctx.stats_window.after(STATS_REFRESH_MS, refresh_stats_window)
+
 def update_plot_config_ui():
     """
-    Updates the plot configuration based on the values from the UI entries.
+    Updates the plot configuration based on the values from the UI entries. The new
+    configuration becomes the default for new sessions and is applied to the session of
+    the selected port, or to every session if that port is not connected.
     """
     x_column = ctx.x_column_entry.get()
     y_columns = ctx.y_columns_entry.get().split(',')
@@ -135,41 +443,145 @@ def update_plot_config_ui():
         ctx.graph_window = None
         ctx.graph_button.config(text="Show Graph")
     
+    target = command_target()
+    for session in all_sessions():
+        if target is None or session.name == target:
+            session.configure_plot(plot_config)
     reset_data()  # Reset data before updating plot
     update_plot_config()  # Update plot configuration
 
+def frame_interval():
+    """
+    Returns the minimum time between two plot redraws.
+
+    Returns:
+        float: The frame interval in seconds, derived from the max_fps setting.
+    """
+    return 1.0 / max(float(settings["max_fps"]), 1.0)
+
+def consume_session(session, prefix):
+    """
+    Displays and stores the data queued by one session. Each queue item holds the
+    arrival time and the batch received in one serial read: a list of text lines, or
+    an array of binary samples. Batches the queue policy dropped while the UI was busy
+    are never seen here; they are counted in the queue_dropped gauge.
+
+    A session with a worker process has already parsed and stored its data; only its
+    lines are left to display, and its new samples to pass on to the statistics and the
+    publisher.
+
+    Args:
+        session (Session): The session to consume.
+        prefix (bool): Whether displayed lines are prefixed with the session name.
+
+    Returns:
+        list: The arrival times of the consumed batches.
+    """
+    if session.worker is not None:
+        lines, arrivals = session.drain_worker()
+        if lines:
+            display_data(lines, session.name if prefix else None)
+        if arrivals:
+            session.follow_worker_samples(arrivals[-1])
+        return arrivals
+    lines = []
+    samples = []
+    arrivals = []
+    for timestamp, batch in session.data_queue.drain():
+        arrivals.append(timestamp)
+        if isinstance(batch, list):
+            lines.extend(batch)
+        else:
+            samples.append(batch)
+    try:
+        if lines:
+            display_data(lines, session.name if prefix else None)
+            parse_start = time.perf_counter()
+            x, y = parse_batch(lines, session.plot_config)
+            observe("parse", time.perf_counter() - parse_start)
+            session.append(x, y, arrivals[-1])
+        if samples:
+            session.append(*project_samples(np.hstack(samples), session.plot_config), arrivals[-1])
+    except ValueError as e:
+        print(f"ValueError: {e}")
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+    return arrivals
+
+def report_commands(session):
+    """
+    Checks the commands of a session for overdue responses, and displays a notice for
+    each command that timed out. Round-trip times are in the statistics window.
+
+    Args:
+        session (Session): The session whose commands to check.
+    """
+    session.commands.poll()
+    for command in session.commands.take_finished():
+        if command.error == "timeout":
+            display_notice(f"No response to {command.text.strip()} within {command.timeout:g} s")
+
+def report_lost(session):
+    """
+    Closes a session whose port failed while it was being read, such as a port the
+    shared engine had to drop, and displays a notice for it.
+
+    Args:
+        session (Session): The session to check.
+    """
+    if session.worker is None and session.port is not None and not session.is_open:
+        session.close()
+        display_notice(f"{session.name} failed and was disconnected")
+        refresh_connect_button()
+
 def update_plot(root):
     """
-    Updates the plot with new data from the data queue.
+    Updates the plot with new data from the data queues of all sessions.
+
+    All queued batches are drained and appended to the plot data of their session
+    first; the plot is then redrawn at most once per tick, no more often than the
+    max_fps setting allows, and not at all while the plot window is hidden. The
+    column statistics next to it are refreshed as often as the statistics window.
 
     Args:
         root (tk.Tk): The Tkinter root window.
     """
     if root.winfo_exists():
-        while not data_queue.empty():
-            data = data_queue.get()
-            display_data(data)
+        sessions = all_sessions()
+        set_gauge("queue_depth", sum(session.data_queue.size for session in sessions))
+        set_gauge("queue_dropped", sum(session.data_queue.dropped for session in sessions))
+        arrivals = []
+        for session in sessions:
+            arrivals.extend(consume_session(session, len(sessions) > 1))
+            report_commands(session)
+            report_lost(session)
+        if arrivals:
+            ctx.plot_dirty = True
+            if is_graph_visible():
+                # Measured once the plot showing them has been drawn
+                ctx.pending_arrivals.extend(arrivals)
+            else:
+                observe_latency(time.time() - np.array(arrivals))
+        if any(session.worker is not None for session in sessions):
+            # Worker processes append to shared memory; update_graph skips unchanged data
+            ctx.plot_dirty = True
+
+        interval = frame_interval()
+        now = time.monotonic()
+        if ctx.plot_dirty and now - ctx.last_frame_time >= interval * 0.9 and is_graph_visible():
+            complete = True
             try:
-                x, y_values = parse_data(data)
-                if x is not None:
-                    ctx.x_coords.append(x)
-                else:
-                    ctx.x_coords.append(len(ctx.x_coords))
-
-                for i, y in enumerate(y_values):
-                    if len(ctx.y_coords) <= i:
-                        ctx.y_coords.append([])
-                    ctx.y_coords[i].append(y)
-
-                if ctx.graph_window and ctx.graph_window.winfo_exists():
-                    update_graph(ctx.x_coords, ctx.y_coords, ctx.lines, ctx.ax, ctx.fig)
-            except ValueError as e:
-                print(f"ValueError: {e}")
-            except IndexError as e:
-                print(f"IndexError: {e}")
+                draw_start = time.perf_counter()
+                complete = update_graph(sessions, ctx.lines, ctx.ax, ctx.fig)
+                observe("update_graph", time.perf_counter() - draw_start)
             except Exception as e:
-                print(f"Unexpected error: {e}")
-        root.after(100, lambda: update_plot(root))
+                print(f"Plot error: {e}")
+            ctx.plot_dirty = not complete
+            ctx.last_frame_time = now
+        if now - ctx.column_stats_time >= STATS_REFRESH_MS / 1000 and is_graph_visible():
+            update_column_stats(sessions)
+            ctx.column_stats_time = now
+        root.after(int(interval * 1000), lambda: update_plot(root))
         
 def text_button_action():
     """
@@ -210,7 +622,7 @@ def send_text_command():
     text = ctx.text_entry.get("1.0", tk.END).strip()  # Get all text from the Text widget
     command = text.replace("\n", "\n, ")  # Format the text with newlines and commas
 
-    send_command(command)  # Send the command via USART
+    send_command(command, command_target())  # Send the command via USART
     display_user_command(command)
 
     if ctx.clear_text_var.get():
@@ -18,30 +18,32 @@ from ui_handlers import (
     toggle_graph, 
     update_plot_config_ui, 
     send_permanent_command_ui,
-    text_button_action
+    text_button_action,
+    refresh_connect_button,
+    watch_ports,
+    PORT_SCAN_TEXT,
+    record_button_action,
+    replay_button_action,
+    stats_button_action,
+    send_file_button_action
 )
 from handler_config import permanent_command_entries, read_config, plot_config
-from serial_handler import find_serial_ports
 import ui_context as ctx
 
-def setup_ui(root, connect_serial, disconnect_serial):
+def setup_ui(root, start_connect, disconnect_serial):
     """
     Initializes and configures the UI components for the application.
 
     Args:
         root (tk.Tk): The root Tkinter window.
-        connect_serial (function): Function to connect to the serial port.
+        start_connect (function): Function to start connecting to the serial port.
         disconnect_serial (function): Function to disconnect from the serial port.
 
     Returns:
         tuple: The x column entry widget and y columns entry widget.
     """
-    global x_coords, y_coords, lines, ax, fig, canvas
-
     ctx.graph_window = None
-    x_coords = []
-    y_coords = []
-    lines = []
+    ctx.lines = []
 
     permanent_command_entries.clear()
 
@@ -52,13 +54,14 @@ def setup_ui(root, connect_serial, disconnect_serial):
     frame = tk.Frame(root)
     frame.pack(padx=10, pady=10)
 
-    ports = find_serial_ports()
-    ctx.port_selector = ttk.Combobox(frame, values=ports)
-    if(ports):
-        ctx.port_selector.set(ports[0])
-    else:
-        ctx.port_selector.set("No ports available")
+    # The ports are listed in the background so the window appears right away
+    ctx.port_selector = ttk.Combobox(frame, values=[])
+    ctx.port_selector.set(PORT_SCAN_TEXT)
     ctx.port_selector.pack(side=tk.LEFT, padx=5)
+    watch_ports(root)
+    # Each port has its own session; the connect button follows the selected one
+    ctx.port_selector.bind('<<ComboboxSelected>>', refresh_connect_button)
+    ctx.port_selector.bind('<KeyRelease>', refresh_connect_button)
 
     baudrate_label = tk.Label(frame, text="Baud Rate:")
     baudrate_label.pack(side=tk.LEFT)
@@ -67,9 +70,13 @@ def setup_ui(root, connect_serial, disconnect_serial):
     ctx.baudrate_entry.insert(0, str(default_baudrate))
     ctx.baudrate_entry.pack(side=tk.LEFT, padx=5)
 
-    ctx.connect_button = tk.Button(frame, text="Connect", command=lambda: connect_button_action(connect_serial, disconnect_serial))
+    ctx.connect_button = tk.Button(frame, text="Connect", command=lambda: connect_button_action(start_connect, disconnect_serial))
     ctx.connect_button.pack(side=tk.LEFT, padx=5)
 
+    # Progress of the connections being made in the background
+    ctx.connect_status = tk.Label(frame, text="", fg='gray')
+    ctx.connect_status.pack(side=tk.LEFT, padx=5)
+
     command_label = tk.Label(frame, text="Enter command:")
     command_label.pack(side=tk.LEFT)
 
@@ -94,10 +101,27 @@ def setup_ui(root, connect_serial, disconnect_serial):
     ctx.text_button = tk.Button(button_frame, text="Open Text", command=text_button_action)
     ctx.text_button.pack(side=tk.TOP, pady=5)
 
+    ctx.record_button = tk.Button(button_frame, text="Record", command=record_button_action)
+    ctx.record_button.pack(side=tk.TOP, pady=5)
+
+    replay_button = tk.Button(button_frame, text="Replay...", command=replay_button_action)
+    replay_button.pack(side=tk.TOP, pady=5)
+
+    stats_button = tk.Button(button_frame, text="Stats", command=stats_button_action)
+    stats_button.pack(side=tk.TOP, pady=5)
+
+    ctx.write_button = tk.Button(button_frame, text="Send File...", command=send_file_button_action)
+    ctx.write_button.pack(side=tk.TOP, pady=5)
+
+    # Progress and throughput of a file being sent
+    ctx.write_status = tk.Label(button_frame, text="", fg='gray')
+    ctx.write_status.pack(side=tk.TOP)
+
     ctx.data_display = scrolledtext.ScrolledText(data_frame, width=80, height=20)
     ctx.data_display.pack(side=tk.LEFT, padx=5, fill=tk.BOTH, expand=True)
 
     ctx.data_display.tag_config('user', foreground='blue')
+    ctx.data_display.tag_config('notice', foreground='gray')
 
     permanent_frame = tk.Frame(data_frame)
     permanent_frame.pack(side=tk.RIGHT, padx=5, fill=tk.Y)